@@ -45,6 +45,120 @@ class ClientConfig:
 
     file_seg_duration = 25  # 转录文件时分段长度
     file_seg_overlap = 2  # 转录文件时分段重叠
+    token_json = False  # 是否在二进制 .tokens.bin 之外同时写入 json 格式的分词时间戳
+
+
+# AI 总结配置
+class SummaryConfig:
+    model = 'gpt-3.5-turbo'  # 使用的模型
+    temperature = 0.7
+    max_tokens = 2000  # 最大输出 token 数
+    system_prompt = '你是一个专业的视频总结助手。'
+
+    request_timeout = 120  # 单次请求超时（秒）
+    max_in_flight = 8  # 同时在途的最大请求数，所有视频共享
+    rate_per_minute = 60  # 每分钟最大请求数，0 表示不限速
+    max_retries = 4  # 遇到 429/5xx 或连接错误时的最大重试次数
+    stream = True  # 标准 OpenAI 接口是否流式输出，边生成边写入 .final.md
+
+    summary_mode = 'markdown'  # 'markdown' 由模型生成整个文档；'structured' 本地计算时间线表格，模型只返回标题和总结
+    structured_max_segments = 20  # 结构化模式下时间线表格的最多行数
+
+    cache = True  # 是否缓存AI响应，相同的输入和模型参数不再重复调用接口
+    cache_max_age_days = 30  # 缓存有效期（天），0 表示不过期
+    cache_max_size_mb = 200  # 缓存总大小上限（MB），超出时淘汰最久未用的条目
+
+    compact = True  # 发送前是否压缩字幕：去语气词、去重复行、合并相邻行
+    compact_bucket_seconds = 10  # 压缩时把多少秒内的相邻字幕合并为一行
+    compact_token_budget = 24000  # 压缩后字幕内容的 token 上限，0 表示不限制
+
+    chunk_mode = 'auto'  # 长文本分块总结：'auto' 超出预算时分块，'on' 总是分块，'off' 不分块
+    chunk_token_budget = 6000  # 单次请求中字幕内容的 token 上限，超出则按时间窗口切分
+    chunk_workers = 4  # 同时总结的时间窗口数
+    chunk_max_points = 12  # 每个时间窗口最多提炼的要点行数
+    topic_segmentation = True  # 分块总结时先在本地识别话题边界，按话题切分时间窗口
+    topic_window_seconds = 30  # 话题识别的基本窗口时长（秒）
+    topic_min_seconds = 120  # 单个话题的最短时长（秒）
+
+
+class WebConfig:
+    addr = '127.0.0.1'
+    port = 8080
+
+    page_size = 50  # 列表页每页的视频数
+    max_page_size = 200  # 列表接口允许的最大每页数量
+    scan_interval = 30  # 重新扫描 downloads 目录的间隔（秒）
+    prerender_count = 50  # 每次扫描后预先渲染最新的多少个视频
+    render_cache_mb = 128  # 渲染缓存的大小上限（MB）
+    gzip_min_bytes = 1024  # 小于该大小的响应不压缩
+    keep_alive_timeout = 15  # 空闲长连接的超时（秒）
+
+
+class ArchiveConfig:
+    archive = True  # 转录完成后是否在后台把 WAV 转码归档
+    format = 'opus'  # 'flac' 无损压缩；'opus' 针对语音调优的有损压缩（单声道 16kHz），体积小得多
+    opus_bitrate = '24k'  # opus 的码率
+    storage_budget_mb = 10240  # downloads 下所有音频的总大小上限（MB），超出时按最近访问时间淘汰，0 表示不限制
+    max_age_days = 0  # 最近访问超过多少天的音频直接淘汰，0 表示不按时间淘汰
+
+
+class PcmCacheConfig:
+    enabled = True  # 是否缓存解码后的 16kHz 单声道音频，重新转录同一文件时不再调用 ffmpeg
+    cache_dir = ''  # 缓存目录，为空时使用 downloads/pcm-cache
+    budget_mb = 4096  # 缓存的总大小上限（MB），超出时按最近使用时间淘汰，0 表示不限制；1 小时音频约 230MB
+    chunk_size = 1024 * 1024  # 解码时每次从 ffmpeg 读取并写入缓存文件的字节数
+
+
+class MetricsConfig:
+    enabled = True  # 是否记录各阶段的耗时、字节数和速率
+    events_file = ''  # JSON-lines 事件文件，为空时使用 downloads/metrics.jsonl
+    prometheus_textfile = ''  # 进程退出前导出的 Prometheus textfile 路径（node_exporter 的 textfile 目录），为空时不导出
+
+
+class MemoryConfig:
+    budget_mb = 4096  # 进程常驻内存预算（MB），超出时暂停新的下载、解码和上传，0 表示不限制
+    resume_ratio = 0.9  # 内存降到预算的多少比例以下时恢复
+    max_wait = 600  # 最多等待内存回落多少秒，超时后继续执行
+    release_threshold_mb = 64  # 大阶段结束后，内存增长超过多少 MB 时释放堆内存（gc + malloc_trim）
+    sample_interval = 0.5  # 后台采样内存的间隔（秒）
+    malloc_arena_max = 2  # Linux 上限制 glibc 的 malloc arena 数量，减少多线程下的内存碎片，0 表示不修改
+
+
+class QueueConfig:
+    db_file = ''  # 任务队列的 SQLite 文件，为空时使用 downloads/jobs.db
+    lease_seconds = 120  # 工作进程多久没有心跳就认为已崩溃，任务可被其他进程接手
+    max_attempts = 3  # 每个任务最多尝试的次数
+    retry_delay = 30  # 失败后重试的等待时间（秒），每次失败翻倍
+    poll_interval = 2  # 队列为空时工作进程查询的间隔（秒）
+    watch_dir = ''  # 监视目录，为空时使用 downloads/inbox
+    media_suffixes = ('.wav', '.mp3', '.m4a', '.aac', '.flac', '.ogg', '.opus',
+                      '.mp4', '.mkv', '.flv', '.webm', '.mov', '.avi')  # 监视目录中需要转录的文件类型
+
+    scheduling = 'sjf'  # 'sjf' 按预估时长从短到长领取，排队越久越靠前；'fifo' 按加入顺序领取
+    default_duration = 1200  # 还不知道时长的任务按多少秒音频排序
+    aging_rate = 1  # 每排队 1 秒，排序用的预估时长减少多少秒：长任务排队的时间超过两者时长之差后，排在新加入的短任务之前
+    long_job_seconds = 3600  # 预估时长不短于该值（秒）的任务为长任务
+    long_job_slots = 1  # 为长任务保留的工作进程数：有长任务排队时短任务最多占用其余的进程；进程数不多于该值时不保留，0 表示不保留
+    stats_window_hours = 24  # 统计等待时间时包含最近多少小时内开始执行的任务
+
+
+class DownloadConfig:
+    state_file = ''  # 各站点限额状态的 SQLite 文件，所有线程和进程共享，为空时使用 downloads/hosts.db
+    concurrency_per_host = 2  # 同一站点同时下载的数量
+    requests_per_minute = 12  # 同一站点每分钟最多开始的下载数，0 表示不限制
+    throttle_backoff = 60  # 被限流（403/412/429/503）后的基础等待时间（秒），每次翻倍并加随机抖动
+    network_backoff = 5  # 网络错误后的基础等待时间（秒）
+    max_backoff = 900  # 单次等待的上限（秒）
+    recovery_factor = 0.7  # 每次下载成功后惩罚系数乘以该值，逐渐恢复并发和速率
+    lease_seconds = 3600  # 占用名额超过多少秒未释放视为所在进程已退出
+    poll_interval = 1  # 名额已满时重新检查的间隔（秒）
+
+
+class DictationConfig:
+    buffer_seconds = 60  # 录音环形缓冲区能容纳的音频时长（秒），网络卡住时超出的录音被丢弃，录音回调从不阻塞
+    block_seconds = 0.05  # 录音回调每次送入的音频时长（秒）
+    audio_dir = ''  # save_audio 时录音的保存目录，为空时使用 downloads/dictation
+    latency_window = 200  # 统计结束说话到出字延迟时保留的最近次数
 
 
 class ModelPaths:
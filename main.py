@@ -12,7 +12,17 @@ from utils.file_manager import (
 )
 
 
-def process_video(url):
+def download_audio(url, temp_dir=None):
+    """
+    下载视频的音频到当天的目录，并保存原始 URL 和清理后的 URL
+
+    参数:
+    url (str): 视频链接
+    temp_dir (str): 下载用的临时目录，默认为 downloads/temp-dir；多个进程同时下载时需要各自使用不同的目录
+
+    返回:
+    str: 音频文件的完整路径，失败时返回None
+    """
     cleaned_url = clean_url(url)
     print(f"清理后的URL: {cleaned_url}")
 
@@ -23,10 +33,10 @@ def process_video(url):
     }
 
     today_folder = get_today_folder()
-    temp_dir = get_temp_dir()
+    temp_dir = temp_dir or get_temp_dir()
     if temp_dir is None or not os.path.exists(temp_dir):
         print("Error: Unable to create or access temporary directory.")
-        return
+        return None
 
     file_number = get_next_file_number(today_folder)
 
@@ -48,9 +58,7 @@ def process_video(url):
             with open(url_json_file, 'w', encoding='utf-8') as f:
                 json.dump(url_info, f, ensure_ascii=False, indent=2)
             print(f"已保存URL信息到 {url_json_file}")
-
-            # 调用处理音频文件的脚本
-            subprocess.run(["python", "process_audio_file.py", full_output_path])
+            return full_output_path
         except FileNotFoundError as e:
             print(f"错误: {str(e)}")
 
@@ -58,6 +66,14 @@ def process_video(url):
         print(f"处理失败: {str(e)}")
     finally:
         clean_temp_directory(temp_dir)
+    return None
+
+
+def process_video(url):
+    full_output_path = download_audio(url)
+    if full_output_path:
+        # 调用处理音频文件的脚本
+        subprocess.run(["python", "process_audio_file.py", full_output_path])
 
 
 def main(url=None):
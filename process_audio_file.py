@@ -9,6 +9,7 @@ import typer
 from rich.console import Console
 
 from config import ClientConfig as Config
+from utils.audio_archive import find_audio
 from utils.client_transcribe import transcribe_check, transcribe_send, transcribe_recv
 from utils.client_ws import Cosmic
 
@@ -25,6 +26,10 @@ async def process_file(file: Path):
     处理单个文件的函数
     根据文件类型选择适当的处理方法
     """
+    # 原始 WAV 已被归档时，改用归档后的 FLAC/Opus 重新转录
+    if not file.exists():
+        file = find_audio(file) or file
+
     # 对于其他文件（可能是音频或视频），进行转录
     await transcribe_check(file)
     await asyncio.gather(
@@ -1,10 +1,23 @@
+import asyncio
+import contextvars
 import json
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Union
-
-import requests
+from typing import Callable, List, Optional, Tuple, Union
+
+from config import SummaryConfig
+from utils import metrics
+from utils.endpoint_registry import get_shared_registry
+from utils.llm_cache import get_shared_cache, make_cache_key
+from utils.llm_client import get_shared_client
+from utils import structured_summary
+from utils.topic_segmenter import segment_topics
+from utils.transcript_utils import (
+    TimedLine, estimate_tokens, parse_timed_lines, format_timed_lines, split_windows, compact_lines, srt_duration
+)
 
 # 导入dotenv用于加载.env文件
 try:
@@ -18,29 +31,81 @@ except ImportError:
     ENV_LOADED = False
 
 
+class _SummaryWriter:
+    """
+    边生成边写入摘要：内容先追加到临时文件，完成后原子地重命名为目标文件
+    """
+
+    def __init__(self, output_file: str, on_token: Optional[Callable[[str], None]] = None):
+        self.output_file = output_file
+        self.temp_file = f"{output_file}.part"
+        self.on_token = on_token
+        self.length = 0
+        self._file = open(self.temp_file, 'w', encoding='utf-8')
+
+    def write(self, delta: str):
+        self._file.write(delta)
+        self._file.flush()
+        self.length += len(delta)
+        if self.on_token:
+            self.on_token(delta)
+
+    def commit(self, response: str):
+        # 缓存命中、非流式接口或分块中间结果等情况下，临时文件内容可能与最终结果不一致
+        if self.length != len(response):
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(response)
+        self._file.close()
+        os.replace(self.temp_file, self.output_file)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.temp_file):
+            os.remove(self.temp_file)
+
+
 # 适配不同的API
 class AISummarizer:
     """
     使用AI生成视频总结和跳转链接的类
     """
 
-    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None,
+                 chunk_mode: Optional[str] = None, use_cache: Optional[bool] = None,
+                 on_token: Optional[Callable[[str], None]] = None, summary_mode: Optional[str] = None):
         """
         初始化AI总结器
         
         Args:
             api_key: API密钥，如果为None则从环境变量获取
             api_base: API基础URL，如果为None则使用默认值
+            chunk_mode: 分块总结模式（'auto'/'on'/'off'），如果为None则使用 SummaryConfig.chunk_mode
+            use_cache: 是否使用响应缓存，如果为None则使用 SummaryConfig.cache
+            on_token: 可选的回调，流式输出时每收到一段文本调用一次
+            summary_mode: 总结模式（'markdown'/'structured'），如果为None则使用 SummaryConfig.summary_mode
         """
         # 从参数或环境变量获取API密钥和基础URL
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         self.api_base = api_base or os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+        self.chunk_mode = chunk_mode or SummaryConfig.chunk_mode
+        use_cache = SummaryConfig.cache if use_cache is None else use_cache
+        self.cache = get_shared_cache(SummaryConfig.cache_max_age_days,
+                                      SummaryConfig.cache_max_size_mb) if use_cache else None
+        self.client = get_shared_client(max_in_flight=SummaryConfig.max_in_flight,
+                                        rate_per_minute=SummaryConfig.rate_per_minute,
+                                        max_retries=SummaryConfig.max_retries)
+        self.endpoints = get_shared_registry()
+        self.on_token = on_token
+        self.summary_mode = summary_mode or SummaryConfig.summary_mode
+        # 每次API调用的耗时统计：ttft（首字延迟）、duration、output_tokens、tokens_per_second
+        self.call_metrics: List[dict] = []
 
         # 打印当前配置信息（隐藏API密钥的大部分内容）
         if self.api_key:
-            masked_key = self.api_key[:5] + "*" * 5 + self.api_key[-5:] if len(self.api_key) > 10 else "*" * len(
+            self.masked_key = self.api_key[:5] + "*" * 5 + self.api_key[-5:] if len(self.api_key) > 10 else "*" * len(
                 self.api_key)
-            print(f"使用API密钥: {masked_key}")
+            print(f"使用API密钥: {self.masked_key}")
             print(f"使用API基础URL: {self.api_base}")
         else:
             print("警告: 没有设置API密钥，请设置OPENAI_API_KEY环境变量或在.env文件中配置")
@@ -56,6 +121,10 @@ class AISummarizer:
         Returns:
             生成的markdown格式摘要
         """
+        with metrics.job_scope(metrics.job_id(main_txt_file)), metrics.stage('summary', mode=self.summary_mode):
+            return self._generate_summary(main_txt_file, original_url)
+
+    def _generate_summary(self, main_txt_file: Union[str, Path], original_url: str) -> str:
         try:
             # 读取输入文件
             with open(main_txt_file, 'r', encoding='utf-8') as f:
@@ -64,36 +133,200 @@ class AISummarizer:
             if not content.strip():
                 return "错误: 输入文件内容为空"
 
-            # 构建prompt
-            prompt = self._build_prompt(content, original_url)
-
-            # 调用API
-            response = self._call_api(prompt)
+            content = self._compact(content)
+
+            # 保存生成的内容到与输入文件同名但后缀为.final.md的文件，流式输出时边生成边写入
+            output_file = str(main_txt_file).replace('.main.txt', '.final.md')
+            writer = _SummaryWriter(output_file, self.on_token)
+            try:
+                if self.summary_mode == 'structured':
+                    # 时间线表格在本地计算，模型只生成标题和总结
+                    srt_file = str(main_txt_file).replace('.main.txt', '.srt')
+                    response = self._generate_structured(content, original_url, srt_duration(srt_file),
+                                                         writer.write)
+                elif self._should_chunk(content):
+                    # 长视频：按时间窗口分块总结，再合并
+                    response = self._generate_chunked(content, original_url, writer.write)
+                else:
+                    # 构建prompt
+                    prompt = self._build_prompt(content, original_url)
+
+                    # 调用API
+                    response = self._call_api(prompt, writer.write)
+            except BaseException:
+                writer.discard()
+                raise
 
             if response:
-                # 保存生成的内容到与输入文件同名但后缀为.merge.txt的文件
-                output_file = str(main_txt_file).replace('.main.txt', '.final.md')
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(response)
+                writer.commit(response)
                 print(f"已生成摘要并保存到: {output_file}")
+                if self.cache:
+                    print(self.cache.stats())
                 return response
             else:
+                writer.discard()
                 return "API调用失败，未能生成摘要"
 
         except Exception as e:
             print(f"生成摘要时出错: {str(e)}")
             return f"错误: {str(e)}"
 
-    def _build_prompt(self, content: str, original_url: str) -> str:
+    def _compact(self, content: str) -> str:
+        """按 SummaryConfig 压缩字幕内容，无法解析时原样返回"""
+        if not SummaryConfig.compact:
+            return content
+        lines = parse_timed_lines(content)
+        if not lines:
+            return content
+        compacted = format_timed_lines(compact_lines(
+            lines, SummaryConfig.compact_bucket_seconds, SummaryConfig.compact_token_budget
+        ))
+        print(f"字幕压缩：约{estimate_tokens(content)} → {estimate_tokens(compacted)} tokens")
+        return compacted
+
+    def _generate_structured(self, content: str, original_url: str, duration: Optional[float] = None,
+                             on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        结构化总结：本地切分片段并计算时长、占比和跳转链接，模型只返回 JSON 格式的标题和总结
+
+        Args:
+            content: main.txt 的内容
+            original_url: 原始视频URL
+            duration: 视频总时长（秒），如果为None则使用最后一行字幕的时间
+            on_delta: 可选的回调，渲染完成后以整个文档调用一次
+
+        Returns:
+            渲染后的markdown格式摘要，失败时返回None
+        """
+        lines = parse_timed_lines(content)
+        if not lines:
+            print("无法解析字幕时间戳，改用普通模式")
+            return self._call_api(self._build_prompt(content, original_url), on_delta)
+
+        segments = structured_summary.build_segments(
+            lines, duration or lines[-1][0], SummaryConfig.structured_max_segments, SummaryConfig.topic_min_seconds
+        )
+        # 输入超出预算时按比例截短每行，片段边界不受影响
+        if estimate_tokens(content) > SummaryConfig.chunk_token_budget:
+            segments = [segment._replace(lines=compact_lines(
+                segment.lines, 0, max(1, SummaryConfig.chunk_token_budget * len(segment.lines) // len(lines))
+            )) for segment in segments]
+        print(f"结构化总结：共{len(segments)}个片段")
+
+        response = self._call_api(structured_summary.build_prompt(segments, original_url))
+        if not response:
+            return None
+        result = structured_summary.parse_response(response, len(segments))
+        if result is None:
+            print("模型返回的内容不是有效的JSON，使用原始内容作为总结")
+            result = structured_summary.StructuredSummary(response.strip(), '', [''] * len(segments))
+        markdown = structured_summary.render_markdown(segments, result, original_url)
+        if on_delta:
+            on_delta(markdown)
+        return markdown
+
+    def _should_chunk(self, content: str) -> bool:
+        """判断是否需要分块总结"""
+        if self.chunk_mode == 'on':
+            return True
+        if self.chunk_mode == 'off':
+            return False
+        return estimate_tokens(content) > SummaryConfig.chunk_token_budget
+
+    def _generate_chunked(self, content: str, original_url: str,
+                          on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        分块总结：先并发总结每个时间窗口，再用合并后的要点生成最终文档
+
+        开启 SummaryConfig.topic_segmentation 时，第一轮按本地识别的话题切分窗口，
+        每个话题单独用简短的 prompt 总结。每个窗口的输出仍是 “秒数 内容” 格式，
+        要点过多时会再分块压缩一轮，直到能放进一次请求，
+        最后复用 _build_prompt 生成与普通模式相同格式的文档。
+
+        Args:
+            content: main.txt 的内容
+            original_url: 原始视频URL
+            on_delta: 可选的回调，流式输出最终文档时每收到一段文本调用一次
+
+        Returns:
+            生成的markdown格式摘要，失败时返回None
+        """
+        lines = parse_timed_lines(content)
+        if not lines:
+            return self._call_api(self._build_prompt(content, original_url), on_delta)
+        duration = lines[-1][0]
+
+        budget = SummaryConfig.chunk_token_budget
+        rounds = 0
+        while True:
+            by_topic = rounds == 0 and SummaryConfig.topic_segmentation
+            windows = self._topic_windows(lines, budget) if by_topic else split_windows(lines, budget)
+            if rounds and len(windows) == 1:
+                break
+            rounds += 1
+            print(f"分块总结第{rounds}轮：共{len(lines)}行，切分为{len(windows)}个{'话题' if by_topic else '时间窗口'}")
+            with ThreadPoolExecutor(max_workers=SummaryConfig.chunk_workers) as executor:
+                # 复制上下文，使各线程中的指标事件归属当前任务
+                results = list(executor.map(
+                    lambda window: contextvars.copy_context().run(self._summarize_window, window, by_topic), windows
+                ))
+            if not any(results):
+                print("所有时间窗口都总结失败")
+                return None
+            condensed = []
+            for window, points in zip(windows, results):
+                # 某个窗口失败时保留该窗口的首行，保证时间线不断档
+                condensed.extend(points or window[:1])
+            # 没有进一步压缩时直接进入合并，避免死循环
+            if len(condensed) >= len(lines):
+                lines = condensed
+                break
+            lines = condensed
+
+        prompt = self._build_prompt(format_timed_lines(lines), original_url, duration)
+        return self._call_api(prompt, on_delta)
+
+    def _topic_windows(self, lines: List[TimedLine], budget: int) -> List[List[TimedLine]]:
+        """按话题切分窗口，超出 token 预算的话题再按预算细分"""
+        topics = segment_topics(lines, SummaryConfig.topic_window_seconds,
+                                min_topic_seconds=SummaryConfig.topic_min_seconds)
+        return [window for topic in topics for window in split_windows(topic.lines, budget)]
+
+    def _summarize_window(self, window: List[TimedLine], by_topic: bool = False) -> Optional[List[TimedLine]]:
+        """总结单个时间窗口，返回带时间戳的要点列表，失败时返回None"""
+        start, end = window[0][0], window[-1][0]
+        if by_topic:
+            task = (f"下面是视频中围绕同一个话题的一段字幕，从第{start}秒到第{end}秒，每行以时间戳（秒）开头。\n"
+                    f"请先用一行“{start} 话题标题”概括这个话题，再按时间顺序提炼这一段的要点")
+        else:
+            task = (f"下面是视频从第{start}秒到第{end}秒的字幕，每行以时间戳（秒）开头。\n"
+                    f"请按时间顺序提炼这一段的要点")
+        prompt = f"""你现在是一个视频总结小助手。{task}，每个要点一行，格式为“时间戳 要点内容”，时间戳必须取自输入中的某一行。
+只输出要点列表，不要输出其他内容，最多{SummaryConfig.chunk_max_points}行。
+
+以下是我的输入，
+{format_timed_lines(window)}"""
+        response = self._call_api(prompt)
+        if not response:
+            print(f"时间窗口 {start}s-{end}s 总结失败")
+            return None
+        points = [(second, text) for second, text in parse_timed_lines(response) if start <= second <= end]
+        if not points:
+            # 模型没按格式输出时，整段挂在窗口起点上
+            points = [(start, ' '.join(response.split()))]
+        return points
+
+    def _build_prompt(self, content: str, original_url: str, duration: Optional[int] = None) -> str:
         """构建发送给AI的prompt"""
         # 从URL中提取BV号
         bv_match = re.search(r'(BV\w+)', original_url)
         bv_id = bv_match.group(1) if bv_match else ""
+        duration_line = f"\n视频时长: 约{duration}秒，输入是按时间分段提炼的要点" if duration else ""
 
         return f"""你现在是一个视频总结小助手，能够帮我提供一个文档作为视频总结和快速跳转
 
 视频链接: {original_url}
-BV号: {bv_id}
+BV号: {bv_id}{duration_line}
 
 ## 输入
 包含时间戳（秒）以及内容的文本信息
@@ -114,12 +347,42 @@ BV号: {bv_id}
 {content}
 """
 
-    def _call_api(self, prompt: str) -> Optional[str]:
+    def _call_api(self, prompt: str, on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        调用AI API，优先从响应缓存读取
+
+        Args:
+            prompt: 要发送的提示文本
+            on_delta: 可选的回调，流式输出时每收到一段文本调用一次
+
+        Returns:
+            API返回的文本内容，失败时返回None
+        """
+        if not self.cache:
+            return self._request_api(prompt, on_delta)
+
+        key = make_cache_key(self.api_base, SummaryConfig.model, SummaryConfig.temperature,
+                             SummaryConfig.max_tokens, SummaryConfig.system_prompt, prompt)
+        response = self.cache.get(key)
+        if response is not None:
+            print("命中AI响应缓存，跳过API调用")
+            metrics.record('llm_cache_hit', None, output_tokens=estimate_tokens(response))
+            if on_delta:
+                on_delta(response)
+            return response
+
+        response = self._request_api(prompt, on_delta)
+        if response:
+            self.cache.put(key, response)
+        return response
+
+    def _request_api(self, prompt: str, on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """
-        调用AI API
+        实际请求AI API
         
         Args:
             prompt: 要发送的提示文本
+            on_delta: 可选的回调，标准接口开启流式输出时每收到一段文本调用一次
             
         Returns:
             API返回的文本内容，失败时返回None
@@ -128,6 +391,9 @@ BV号: {bv_id}
             print("错误: 未设置API密钥")
             return None
 
+        start = time.perf_counter()
+        response = None
+        streaming = False  # 响应交给 _read_stream 后由它关闭
         try:
             # 打印当前使用的API端点详细信息，便于调试
             print(f"将请求发送到: {self.api_base}")
@@ -135,142 +401,14 @@ BV号: {bv_id}
             # FastGPT的API调用方式与OpenAI不同
             if "ziki.top" in self.api_base:
                 print("\n使用FastGPT API...")
-
-                # 尝试不同的FastGPT API调用方式
-
-                # 方式1: 将API密钥放在请求头中
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
-                }
-
-                # 方式1的请求体
-                payload1 = {
-                    "model": "gpt-3.5-turbo",
-                    "messages": [
-                        {"role": "system", "content": "你是一个专业的视频总结助手。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7
-                }
-
-                # 方式2: 使用apiKey参数
-                payload2 = {
-                    "apiKey": self.api_key,
-                    "prompt": prompt,
-                    "temperature": 0.7
-                }
-
-                # 自动尝试不同的调用方式
-                api_url = self.api_base.rstrip('/')
-                success = False
-                response = None
-
-                # 不同的API调用方式
-                api_methods = [
-                    {
-                        "name": "Authorization header + OpenAI 格式",
-                        "headers": {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
-                        "payload": payload1,
-                        "endpoint": f"{api_url}/v1/chat/completions"
-                    },
-                    {
-                        "name": "Authorization header + 基础格式",
-                        "headers": {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
-                        "payload": payload1,
-                        "endpoint": api_url
-                    },
-                    {
-                        "name": "apiKey参数",
-                        "headers": {"Content-Type": "application/json"},
-                        "payload": payload2,
-                        "endpoint": api_url
-                    },
-                    {
-                        "name": "key参数",
-                        "headers": {"Content-Type": "application/json"},
-                        "payload": {"key": self.api_key, "prompt": prompt},
-                        "endpoint": api_url
-                    },
-                    {
-                        "name": "API密钥作为URL参数",
-                        "headers": {"Content-Type": "application/json"},
-                        "payload": {"messages": [{"role": "user", "content": prompt}]},
-                        "endpoint": f"{api_url}?key={self.api_key}"
-                    }
-                ]
-
-                # 尝试每种方法
-                for method in api_methods:
-                    try:
-                        print(f"\n\n尝试方法: {method['name']}")
-                        print(f"\n请求URL: {method['endpoint']}")
-                        print(f"\n请求头: {method['headers']}")
-                        # 支持中文输出且限制输出长度
-                        payload_preview = json.dumps(method['payload'], ensure_ascii=False)[:100]
-                        print(f"\n请求体: {payload_preview}{'...' if len(payload_preview) == 100 else ''}")
-
-                        response = requests.post(
-                            method['endpoint'],
-                            headers=method['headers'],
-                            json=method['payload'],
-                            timeout=30  # 添加超时设置
-                        )
-
-                        print(f"\n状态码: {response.status_code}")
-
-                        if response.status_code == 200:
-                            print("\n该方法请求成功!")
-                            success = True
-                            break
-                        else:
-                            print(f"\n返回内容: {response.text[:200]}")
-                            if '402' in response.text or '403' in response.text:
-                                print("授权错误，尝试下一种方法")
-                            else:
-                                print("非授权错误，可能不需要尝试其他方法")
-                                break
-                    except Exception as e:
-                        print(f"\n该方法异常: {str(e)}")
-                        continue
-
-                if not success and response is None:
-                    print("\n所有API调用方法都失败了")
-                    return "无法连接到AI API，请检查网络和API密钥"
-
-                if not success:
-                    print("\n所有方法均返回错误状态码")
-
-                # 处理响应
-                print(f"\n响应状态码: {response.status_code}")
-
+                response = self._call_fastgpt(prompt)
+                if response is None:
+                    print("\n所有API调用方法都失败了，无法连接到AI API，请检查网络和API密钥")
+                    return None
                 if response.status_code == 200:
-                    try:
-                        result = response.json()
-                        print(f"\n响应结果类型: {type(result)}")
-                        print(f"\n响应结果键: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
-
-                        # 尝试不同的响应格式
-                        if isinstance(result, dict):
-                            if "text" in result:
-                                return result["text"]
-                            elif "choices" in result and len(result["choices"]) > 0:
-                                if isinstance(result["choices"][0], dict) and "text" in result["choices"][0]:
-                                    return result["choices"][0]["text"]
-                                elif isinstance(result["choices"][0], dict) and "message" in result["choices"][0]:
-                                    return result["choices"][0]["message"]["content"]
-                            elif "data" in result and isinstance(result["data"], str):
-                                return result["data"]
-                            # 如果是纯文本返回
-                        elif isinstance(result, str):
-                            return result
-
-                        # 输出完整响应作为调试
-                        print(f"\n完整响应: {json.dumps(result, ensure_ascii=False)}")
-                        return str(result)  # 返回字符串形式的完整响应
-                    except Exception as e:
-                        print(f"\n解析FastGPT响应时出错: {str(e)}")
-                        return response.text  # 返回原始文本
+                    result = self._parse_fastgpt_response(response)
+                    self._record_metrics(start, None, prompt, result)
+                    return result
             else:
                 # 标准OpenAI API格式
                 headers = {
@@ -279,38 +417,288 @@ BV号: {bv_id}
                 }
 
                 payload = {
-                    "model": "gpt-3.5-turbo",
+                    "model": SummaryConfig.model,
                     "messages": [
-                        {"role": "system", "content": "你是一个专业的视频总结助手。"},
+                        {"role": "system", "content": SummaryConfig.system_prompt},
                         {"role": "user", "content": prompt}
                     ],
-                    "temperature": 0.7,
-                    "max_tokens": 2000
+                    "temperature": SummaryConfig.temperature,
+                    "max_tokens": SummaryConfig.max_tokens
                 }
+                stream = SummaryConfig.stream and on_delta is not None
+                if stream:
+                    payload["stream"] = True
 
-                response = requests.post(
+                response = self.client.post_sync(
                     f"{self.api_base}/chat/completions",
                     headers=headers,
-                    json=payload
+                    payload=payload,
+                    timeout=SummaryConfig.request_timeout,
+                    stream=stream
                 )
 
                 if response.status_code == 200:
-                    return response.json()["choices"][0]["message"]["content"]
+                    if stream:
+                        streaming = True
+                        return self._read_stream(response, start, prompt, on_delta)
+                    data = response.json()
+                    result = data["choices"][0]["message"]["content"]
+                    self._record_metrics(start, None, prompt, result, data.get("usage"))
+                    return result
 
             # 处理错误情况
             print(f"API调用失败，状态码: {response.status_code}")
             print(f"请求URL: {self.api_base}")
-            print(f"返回内容: {response.text}")
+            print(f"返回内容: {self._mask(response.text)}")
             return None
 
         except Exception as e:
-            print(f"API调用出错: {str(e)}")
+            print(f"API调用出错: {self._mask(str(e))}")
             return None
+        finally:
+            # 出错的流式响应在关闭前一直占用连接和并发名额
+            if response is not None and not streaming:
+                response.close()
+
+    def _read_stream(self, response, start: float, prompt: str, on_delta: Callable[[str], None]) -> Optional[str]:
+        """
+        读取 server-sent events 格式的流式响应，逐段回调并拼接完整文本
+
+        Args:
+            response: stream=True 的响应对象
+            start: 请求开始的时间（perf_counter）
+            prompt: 发送的提示文本，用于估算输入 token 数
+            on_delta: 每收到一段文本调用一次的回调
+
+        Returns:
+            完整的文本内容，没有收到任何内容时返回None
+        """
+        parts = []
+        first_token_time = None
+        usage = None
+        try:
+            # chunk_size=None 表示按服务端发送的分块（chunked）读取，避免攒够缓冲区才处理
+            for line in response.iter_lines(chunk_size=None):
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get('usage') or usage
+                if not chunk.get('choices'):
+                    continue
+                delta = chunk['choices'][0].get('delta', {}).get('content')
+                if delta:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    parts.append(delta)
+                    on_delta(delta)
+        finally:
+            response.close()
+        if not parts:
+            print("流式响应中没有内容")
+            return None
+        result = ''.join(parts)
+        self._record_metrics(start, first_token_time, prompt, result, usage)
+        return result
+
+    def _record_metrics(self, start: float, first_token_time: Optional[float], prompt: str, result: str,
+                        usage: Optional[dict] = None):
+        """记录一次调用的首字延迟、输入输出 token 数和生成速度，非流式调用的首字延迟等于总耗时"""
+        end = time.perf_counter()
+        ttft = (first_token_time or end) - start
+        usage = usage or {}
+        input_tokens = usage.get('prompt_tokens') or estimate_tokens(prompt)
+        output_tokens = usage.get('completion_tokens') or estimate_tokens(result)
+        generation_time = end - (first_token_time or start)
+        call_metrics = {
+            'ttft': ttft,
+            'duration': end - start,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'tokens_per_second': output_tokens / generation_time if generation_time > 0 else 0.0,
+        }
+        self.call_metrics.append(call_metrics)
+        metrics.record('llm', None, call_metrics['duration'], model=SummaryConfig.model, ttft=ttft,
+                       input_tokens=input_tokens, output_tokens=output_tokens,
+                       tokens_per_second=call_metrics['tokens_per_second'])
+        print(f"首字延迟 {ttft:.2f}s，总耗时 {call_metrics['duration']:.2f}s，"
+              f"输出约 {output_tokens} tokens，{call_metrics['tokens_per_second']:.1f} tokens/s")
+
+    def _mask(self, text: str) -> str:
+        """隐藏文本中出现的API密钥，避免写入日志"""
+        return text.replace(self.api_key, self.masked_key) if self.api_key else text
+
+    def _fastgpt_methods(self, prompt: str) -> List[dict]:
+        """FastGPT 可能支持的各种调用方式，按优先级排列"""
+        api_url = self.api_base.rstrip('/')
+        auth_headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+        openai_payload = {
+            "model": SummaryConfig.model,
+            "messages": [
+                {"role": "system", "content": SummaryConfig.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": SummaryConfig.temperature
+        }
+        return [
+            {
+                "name": "Authorization header + OpenAI 格式",
+                "headers": auth_headers,
+                "payload": openai_payload,
+                "endpoint": f"{api_url}/v1/chat/completions"
+            },
+            {
+                "name": "Authorization header + 基础格式",
+                "headers": auth_headers,
+                "payload": openai_payload,
+                "endpoint": api_url
+            },
+            {
+                "name": "apiKey参数",
+                "headers": {"Content-Type": "application/json"},
+                "payload": {"apiKey": self.api_key, "prompt": prompt, "temperature": SummaryConfig.temperature},
+                "endpoint": api_url
+            },
+            {
+                "name": "key参数",
+                "headers": {"Content-Type": "application/json"},
+                "payload": {"key": self.api_key, "prompt": prompt},
+                "endpoint": api_url
+            },
+            {
+                "name": "API密钥作为URL参数",
+                "headers": {"Content-Type": "application/json"},
+                "payload": {"messages": [{"role": "user", "content": prompt}]},
+                "endpoint": f"{api_url}?key={self.api_key}"
+            }
+        ]
+
+    def _try_fastgpt_method(self, method: dict, max_retries: Optional[int] = 0):
+        """
+        用指定方式发送请求，连接失败时返回None
+
+        Args:
+            method: 调用方式
+            max_retries: 最大重试次数，探测阶段不重试，失败直接换下一种方式；为None时使用客户端的默认值
+        """
+        print(f"\n尝试方法: {method['name']}")
+        print(f"请求URL: {self._mask(method['endpoint'])}")
+        try:
+            response = self.client.post_sync(
+                method['endpoint'],
+                headers=method['headers'],
+                payload=method['payload'],
+                timeout=30,
+                max_retries=max_retries
+            )
+        except Exception as e:
+            print(f"该方法异常: {self._mask(str(e))}")
+            return None
+        print(f"状态码: {response.status_code}")
+        return response
+
+    def discover_endpoint(self, prompt: str = "你好") -> Optional[str]:
+        """
+        探测当前 api_base 可用的 FastGPT 调用方式，并记录下来供之后的请求直接使用
+
+        Args:
+            prompt: 探测时发送的提示文本
+
+        Returns:
+            可用调用方式的名称，全部失败时返回None
+        """
+        response = self._probe_fastgpt(self._fastgpt_methods(prompt))
+        return self.endpoints.get(self.api_base) if response is not None and response.status_code == 200 else None
+
+    def _probe_fastgpt(self, methods: List[dict]):
+        """依次尝试各种调用方式，成功时记录该方式，返回最后一次的响应"""
+        response = None
+        for method in methods:
+            result = self._try_fastgpt_method(method)
+            if result is None:
+                continue
+            response = result
+            if response.status_code == 200:
+                print("该方法请求成功，已记录为该地址的调用方式")
+                self.endpoints.remember(self.api_base, method['name'])
+                break
+            print(f"返回内容: {self._mask(response.text[:200])}")
+            if '402' in response.text or '403' in response.text:
+                print("授权错误，尝试下一种方法")
+            else:
+                print("非授权错误，可能不需要尝试其他方法")
+                break
+        return response
+
+    def _call_fastgpt(self, prompt: str):
+        """
+        调用 FastGPT 接口，优先使用已记录的调用方式，失效时重新探测
+
+        已记录的方式按客户端的设置重试 429/5xx 和连接错误，重试后仍失败时直接返回，不重新探测；
+        只有授权或格式错误（402/403/404，或 200 但响应不是 JSON）才说明该方式失效。
+
+        Returns:
+            最后一次请求的响应，全部无法连接时返回None
+        """
+        methods = self._fastgpt_methods(prompt)
+        known = self.endpoints.get(self.api_base)
+        method = next((m for m in methods if m['name'] == known), None)
+        if method:
+            response = self._try_fastgpt_method(method, max_retries=None)
+            if response is None or not self._fastgpt_method_invalid(response):
+                return response
+            print(f"已记录的调用方式「{known}」失效，重新探测")
+            self.endpoints.forget(self.api_base)
+        return self._probe_fastgpt(methods)
+
+    @staticmethod
+    def _fastgpt_method_invalid(response) -> bool:
+        """响应是否说明调用方式本身不可用（授权或格式错误），而不是暂时的失败"""
+        if response.status_code in (402, 403, 404):
+            return True
+        if response.status_code != 200:
+            return False
+        try:
+            response.json()
+        except ValueError:
+            return True
+        return False
+
+    def _parse_fastgpt_response(self, response) -> str:
+        """从 FastGPT 的各种响应格式中取出文本"""
+        try:
+            result = response.json()
+
+            # 尝试不同的响应格式
+            if isinstance(result, dict):
+                if "text" in result:
+                    return result["text"]
+                elif "choices" in result and len(result["choices"]) > 0:
+                    if isinstance(result["choices"][0], dict) and "text" in result["choices"][0]:
+                        return result["choices"][0]["text"]
+                    elif isinstance(result["choices"][0], dict) and "message" in result["choices"][0]:
+                        return result["choices"][0]["message"]["content"]
+                elif "data" in result and isinstance(result["data"], str):
+                    return result["data"]
+            # 如果是纯文本返回
+            elif isinstance(result, str):
+                return result
+
+            # 输出完整响应作为调试
+            print(f"\n完整响应: {json.dumps(result, ensure_ascii=False)}")
+            return str(result)  # 返回字符串形式的完整响应
+        except Exception as e:
+            print(f"\n解析FastGPT响应时出错: {str(e)}")
+            return response.text  # 返回原始文本
 
 
 # 简单使用示例
 def summarize_video(main_txt_file: Union[str, Path], original_url: str, api_key: Optional[str] = None,
-                    api_base: Optional[str] = None) -> str:
+                    api_base: Optional[str] = None, chunk_mode: Optional[str] = None,
+                    use_cache: Optional[bool] = None, on_token: Optional[Callable[[str], None]] = None,
+                    summary_mode: Optional[str] = None) -> str:
     """
     生成视频总结和跳转链接的简便函数
     
@@ -319,9 +707,50 @@ def summarize_video(main_txt_file: Union[str, Path], original_url: str, api_key:
         original_url: 原始视频URL
         api_key: 可选的API密钥
         api_base: 可选的API基础URL
+        chunk_mode: 可选的分块总结模式（'auto'/'on'/'off'）
+        use_cache: 可选，是否使用响应缓存
+        on_token: 可选的回调，流式输出时每收到一段文本调用一次
+        summary_mode: 可选的总结模式（'markdown'/'structured'）
         
     Returns:
         生成的markdown格式摘要
     """
-    summarizer = AISummarizer(api_key=api_key, api_base=api_base)
+    summarizer = AISummarizer(api_key=api_key, api_base=api_base, chunk_mode=chunk_mode, use_cache=use_cache,
+                              on_token=on_token, summary_mode=summary_mode)
     return summarizer.generate_summary(main_txt_file, original_url)
+
+
+async def summarize_videos_async(jobs: List[Tuple[Union[str, Path], str]], api_key: Optional[str] = None,
+                                 api_base: Optional[str] = None,
+                                 summarizer: Optional[AISummarizer] = None) -> List[str]:
+    """
+    并发生成多个视频的总结
+
+    所有请求经过共享的 LLMClient，同时在途的请求数和每分钟请求数受 SummaryConfig 限制，
+    因此可以一次性提交大量视频，由客户端按速率上限调度。
+
+    Args:
+        jobs: (main.txt 文件路径, 原始视频URL) 列表
+        api_key: 可选的API密钥
+        api_base: 可选的API基础URL
+        summarizer: 可选，使用已有的总结器（此时忽略 api_key 和 api_base）
+
+    Returns:
+        与 jobs 顺序一致的markdown格式摘要列表
+    """
+    if not jobs:
+        return []
+    summarizer = summarizer or AISummarizer(api_key=api_key, api_base=api_base)
+    loop = asyncio.get_running_loop()
+    # 每个视频占一个线程等待接口返回，线程数不能成为并发的瓶颈
+    with ThreadPoolExecutor(max_workers=min(len(jobs), 64), thread_name_prefix='summary') as executor:
+        return list(await asyncio.gather(*(
+            loop.run_in_executor(executor, summarizer.generate_summary, main_txt_file, original_url)
+            for main_txt_file, original_url in jobs
+        )))
+
+
+def summarize_videos(jobs: List[Tuple[Union[str, Path], str]], api_key: Optional[str] = None,
+                     api_base: Optional[str] = None) -> List[str]:
+    """summarize_videos_async 的同步版本"""
+    return asyncio.run(summarize_videos_async(jobs, api_key=api_key, api_base=api_base))
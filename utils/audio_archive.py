@@ -0,0 +1,227 @@
+"""
+音频归档
+
+转录完成后，WAV 只在重新转录时才会用到。归档在后台用 ffmpeg 把 WAV 转码为 FLAC（无损）
+或针对语音调优的 Opus（单声道 16kHz），校验时长后替换原文件，并更新同名 audio_urls.json 中的音频文件名。
+
+downloads 下所有音频的总大小超过预算时，按最近访问时间从旧到新淘汰音频文件，字幕和总结保留；
+还没有转录完成（没有 main.txt）的音频不会被淘汰。
+
+用法:
+    python -m utils.audio_archive archive          # 归档 downloads 下已转录的 WAV 并执行存储预算
+    python -m utils.audio_archive budget           # 只执行存储预算
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Union
+
+import typer
+
+from config import ArchiveConfig
+
+AUDIO_SUFFIXES = ('.wav', '.flac', '.opus', '.mp3', '.m4a')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_downloads_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads")
+
+
+def find_audio(media_file: Union[str, Path]) -> Optional[Path]:
+    """
+    查找任务的音频文件，原文件已归档时返回归档后的文件
+
+    Args:
+        media_file: 任务的音频文件路径，或同名的任意产物（如 .txt、.main.txt）
+
+    Returns:
+        存在的音频文件，音频已被淘汰时返回None
+    """
+    media_file = Path(media_file)
+    if media_file.suffix.lower() in AUDIO_SUFFIXES and media_file.exists():
+        return media_file
+    name = media_file.name
+    for suffix in ('.main.txt', '.merge.txt', '.final.md', '.audio_urls.json'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    else:
+        name = media_file.stem
+    for suffix in AUDIO_SUFFIXES:
+        candidate = media_file.parent / f"{name}{suffix}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _ffmpeg_args(fmt: str) -> List[str]:
+    if fmt == 'flac':
+        return ['-c:a', 'flac', '-compression_level', '8', '-f', 'flac']
+    if fmt == 'opus':
+        return ['-c:a', 'libopus', '-b:a', ArchiveConfig.opus_bitrate, '-application', 'voip',
+                '-ac', '1', '-ar', '16000', '-f', 'opus']
+    raise ValueError(f"不支持的归档格式: {fmt}")
+
+
+def probe_duration(audio_file: Union[str, Path]) -> Optional[float]:
+    """用 ffprobe 读取音频时长（秒），无法读取时返回None"""
+    try:
+        output = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', str(audio_file)],
+            capture_output=True, text=True, timeout=60
+        ).stdout.strip()
+        return float(output)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def _update_references(wav_file: Path, audio_file: Optional[Path]):
+    """在同名 audio_urls.json 中记录当前的音频文件名，音频被淘汰时记为 null"""
+    url_json_file = wav_file.parent / f"{wav_file.stem}.audio_urls.json"
+    if not url_json_file.exists():
+        return
+    try:
+        with open(url_json_file, 'r', encoding='utf-8') as f:
+            url_data = json.load(f)
+        url_data['audio_file'] = audio_file.name if audio_file else None
+        temp_file = f"{url_json_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(url_data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, url_json_file)
+    except (OSError, ValueError) as e:
+        print(f"更新 {url_json_file} 时出错: {e}")
+
+
+def archive_audio(wav_file: Union[str, Path], fmt: str = ArchiveConfig.format) -> Optional[Path]:
+    """
+    把 WAV 转码为归档格式，校验时长一致后删除 WAV
+
+    Args:
+        wav_file: WAV 文件路径
+        fmt: 'flac' 或 'opus'
+
+    Returns:
+        归档后的文件路径，失败或无需归档时返回None
+    """
+    wav_file = Path(wav_file)
+    if wav_file.suffix.lower() != '.wav' or not wav_file.exists():
+        return None
+    if shutil.which('ffmpeg') is None:
+        print("未找到 ffmpeg，跳过音频归档")
+        return None
+
+    archive_file = wav_file.with_suffix(f'.{fmt}')
+    temp_file = wav_file.with_name(f"{archive_file.name}.part")
+    command = ['ffmpeg', '-nostdin', '-y', '-v', 'error', '-i', str(wav_file), '-map_metadata', '0',
+               *_ffmpeg_args(fmt), str(temp_file)]
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        source, target = probe_duration(wav_file), probe_duration(temp_file)
+        if source is not None and (target is None or abs(source - target) > 1):
+            raise ValueError(f"转码后时长不一致: {source} != {target}")
+        os.replace(temp_file, archive_file)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"归档 {wav_file} 时出错: {e}")
+        temp_file.unlink(missing_ok=True)
+        return None
+
+    saved = wav_file.stat().st_size - archive_file.stat().st_size
+    wav_file.unlink()
+    _update_references(wav_file, archive_file)
+    print(f"已归档 {wav_file.name} -> {archive_file.name}，节省 {saved / 1024 / 1024:.1f}MB")
+    return archive_file
+
+
+def enforce_budget(root: Optional[str] = None, budget_mb: float = ArchiveConfig.storage_budget_mb,
+                   max_age_days: float = ArchiveConfig.max_age_days) -> int:
+    """
+    执行存储预算：淘汰最近访问超过 max_age_days 的音频，总大小超过 budget_mb 时再按最近访问时间从旧到新淘汰
+
+    Returns:
+        淘汰的文件数
+    """
+    root = Path(root or get_downloads_dir())
+    candidates = []
+    total = 0
+    for audio_file in root.glob('*/*'):
+        if audio_file.suffix.lower() not in AUDIO_SUFFIXES or not audio_file.is_file():
+            continue
+        stat = audio_file.stat()
+        total += stat.st_size
+        # 只淘汰已经转录完成的音频
+        if (audio_file.parent / f"{audio_file.stem}.main.txt").exists():
+            candidates.append((max(stat.st_atime, stat.st_mtime), stat.st_size, audio_file))
+    candidates.sort()
+
+    now = time.time()
+    budget = budget_mb * 1024 * 1024
+    evicted = 0
+    for last_access, size, audio_file in candidates:
+        expired = max_age_days and now - last_access > max_age_days * 86400
+        if not expired and (not budget or total <= budget):
+            break
+        try:
+            audio_file.unlink()
+        except OSError as e:
+            print(f"删除 {audio_file} 时出错: {e}")
+            continue
+        total -= size
+        evicted += 1
+        _update_references(audio_file, None)
+        print(f"已淘汰音频 {audio_file.name}（{size / 1024 / 1024:.1f}MB）")
+    return evicted
+
+
+def _archive_job(media_file: Path):
+    archive_audio(media_file)
+    enforce_budget()
+
+
+def archive_in_background(media_file: Union[str, Path]) -> Optional[Future]:
+    """
+    转录完成后调用，在后台线程中归档音频并执行存储预算，同一时间只转码一个文件
+
+    Returns:
+        后台任务，未启用归档时返回None
+    """
+    global _executor
+    if not ArchiveConfig.archive:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-archive')
+    return _executor.submit(_archive_job, Path(media_file))
+
+
+app = typer.Typer()
+
+
+@app.command()
+def archive(folder: Path = typer.Argument(None, help='要归档的目录，默认为 downloads'),
+            fmt: str = typer.Option(ArchiveConfig.format, '--format', help='flac 或 opus')):
+    """归档目录下已转录完成的 WAV，并执行存储预算"""
+    folder = folder or Path(get_downloads_dir())
+    count = 0
+    for wav_file in sorted(folder.rglob('*.wav')):
+        if (wav_file.parent / f"{wav_file.stem}.main.txt").exists() and archive_audio(wav_file, fmt):
+            count += 1
+    print(f'已归档 {count} 个文件，淘汰 {enforce_budget()} 个文件')
+
+
+@app.command()
+def budget(budget_mb: float = ArchiveConfig.storage_budget_mb, max_age_days: float = ArchiveConfig.max_age_days):
+    """按存储预算淘汰音频"""
+    print(f'淘汰 {enforce_budget(budget_mb=budget_mb, max_age_days=max_age_days)} 个文件')
+
+
+if __name__ == '__main__':
+    app()
@@ -1,16 +1,20 @@
 import base64
 import json
-import re
-import subprocess
 import sys
 import time
 import uuid
 from pathlib import Path
 
 from config import ClientConfig as Config
+from utils import metrics
+from utils.audio_archive import archive_in_background
+from utils.memory_governor import MB, get_governor
 from utils.client_ws import check_websocket
 from utils.client_ws import console, Cosmic
+from utils.hot_words import correct_and_normalize
 from utils.multi_from_txt import one_task
+from utils.pcm_cache import load_pcm
+from utils.token_store import tokens_file_for, write_tokens
 
 
 async def transcribe_check(file: Path):
@@ -33,44 +37,51 @@ async def transcribe_send(file: Path):
     console.print(f'\n任务标识：{task_id}')
     console.print(f'    处理文件：{file}')
 
-    # 获取音频数据，ffmpeg 输出采样率 16000，单声道，float32 格式
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-i", file,
-        "-f", "f32le",
-        "-ac", "1",
-        "-ar", "16000",
-        "-",
-    ]
-    process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
-    console.print(f'    正在提取音频', end='\r')
-    data = process.stdout.read()
-    audio_duration = len(data) / 4 / 16000
+    # 获取音频数据：采样率 16000，单声道，float32 格式，解码结果缓存后重新转录时直接映射，不再调用 ffmpeg
+    job = metrics.job_id(file)
+    governor = get_governor()
+    await governor.wait_for_headroom_async('解码')
+    decode_start = time.perf_counter()
+    with governor.stage('decode', job):
+        console.print(f'    正在提取音频', end='\r')
+        pcm = load_pcm(file)
+        data = memoryview(pcm.samples).cast('B')
+    audio_duration = pcm.duration
+    metrics.record('decode', job, time.perf_counter() - decode_start, len(data),
+                   input_bytes=Path(file).stat().st_size, audio_seconds=audio_duration, cached=pcm.cached)
     console.print(f'    音频长度：{audio_duration:.2f}s')
 
-    # 构建分段消息，发送给服务端
-    offset = 0
-    while True:
-        chunk_end = offset + 16000 * 4 * 60
-        is_final = False if chunk_end < len(data) else True
-        message = {
-            'task_id': task_id,  # 任务 ID
-            'seg_duration': Config.file_seg_duration,  # 分段长度
-            'seg_overlap': Config.file_seg_overlap,  # 分段重叠
-            'is_final': is_final,  # 是否结束
-            'time_start': time.time(),  # 录音起始时间
-            'time_frame': time.time(),  # 该帧时间
-            'source': 'file',  # 数据来源：从文件读的数据
-            'data': base64.b64encode(
-                data[offset: chunk_end]
-            ).decode('utf-8'),
-        }
-        offset = chunk_end
-        progress = min(offset / 4 / 16000, audio_duration)
-        await websocket.send(json.dumps(message))
-        console.print(f'    发送进度：{progress:.2f}s', end='\r')
-        if is_final:
-            break
+    # 构建分段消息，发送给服务端，解码后的音频在发送完后释放
+    with governor.stage('upload', job, release=True):
+        offset = 0
+        sent_bytes = 0
+        upload_start = time.perf_counter()
+        while True:
+            chunk_end = offset + 16000 * 4 * 60
+            is_final = False if chunk_end < len(data) else True
+            message = {
+                'task_id': task_id,  # 任务 ID
+                'seg_duration': Config.file_seg_duration,  # 分段长度
+                'seg_overlap': Config.file_seg_overlap,  # 分段重叠
+                'is_final': is_final,  # 是否结束
+                'time_start': time.time(),  # 录音起始时间
+                'time_frame': time.time(),  # 该帧时间
+                'source': 'file',  # 数据来源：从文件读的数据
+                'data': base64.b64encode(
+                    data[offset: chunk_end]
+                ).decode('utf-8'),
+            }
+            offset = chunk_end
+            progress = min(offset / 4 / 16000, audio_duration)
+            payload = json.dumps(message)
+            await websocket.send(payload)
+            sent_bytes += len(payload)
+            console.print(f'    发送进度：{progress:.2f}s', end='\r')
+            if is_final:
+                break
+            await governor.wait_for_headroom_async('上传')
+        del data, pcm, message, payload
+    metrics.record('upload', job, time.perf_counter() - upload_start, sent_bytes, audio_seconds=audio_duration)
 
 
 async def transcribe_recv(file: Path):
@@ -84,11 +95,13 @@ async def transcribe_recv(file: Path):
         if message['is_final']:
             break
 
-    # 解析结果
-    text_merge = message['text']
-    text_split = re.sub('[，。？]', '\n', text_merge)
-    timestamps = message['timestamps']
-    tokens = message['tokens']
+    # 解析结果，用热词纠正文本和分词（逐字替换，时间戳不变），规范化数字、标点和空格并按句分行，最后执行自定义规则
+    job = metrics.job_id(file)
+    normalized = correct_and_normalize(message['text'], message['tokens'], message['timestamps'], job)
+    text_merge = normalized.text
+    text_split = '\n'.join(normalized.lines)
+    # 分词换成规范化后的词（数字串、英文单词各为一个词），与分行稿逐字对应，时间戳取其第一个分词
+    timestamps, tokens = normalized.timestamps, normalized.words
 
     # 得到文件名
     json_filename = Path(file).with_suffix(".json")
@@ -100,9 +113,16 @@ async def transcribe_recv(file: Path):
         f.write(text_merge)  # 合并一行输出
     with open(txt_filename, "w", encoding="utf-8") as f:
         f.write(text_split)  # 分行输出
-    with open(json_filename, "w", encoding="utf-8") as f:
-        json.dump({'timestamps': timestamps, 'tokens': tokens}, f, ensure_ascii=False)
+    write_tokens(tokens_file_for(json_filename), timestamps, tokens)
+    if Config.token_json:
+        with open(json_filename, "w", encoding="utf-8") as f:
+            json.dump({'timestamps': timestamps, 'tokens': tokens}, f, ensure_ascii=False)
     one_task(txt_filename)  # 生成 srt 文件
+    archive_in_background(file)  # 字幕已生成，在后台把 WAV 转码归档
 
     process_duration = message['time_complete'] - message['time_start']
-    console.print(f'\033[K    视频转文字处理耗时：{process_duration:.2f}s')
+    metrics.record('asr', job, process_duration, audio_seconds=message['duration'],
+                   rtf=process_duration / message['duration'] if message['duration'] else None,
+                   tokens=len(tokens))
+    job_peak = get_governor().job_peaks.pop(job, 0)
+    console.print(f'\033[K    视频转文字处理耗时：{process_duration:.2f}s，峰值内存：{job_peak / MB:.0f}MB')
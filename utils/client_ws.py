@@ -45,8 +45,16 @@ class Handler:
             print(e)
 
 
+def is_open(websocket) -> bool:
+    # websockets 14 起新的客户端连接没有 closed 属性，改用 state 判断
+    closed = getattr(websocket, 'closed', None)
+    if closed is not None:
+        return not closed
+    return websocket.state == websockets.protocol.State.OPEN
+
+
 async def check_websocket() -> bool:
-    if Cosmic.websocket and not Cosmic.websocket.closed:
+    if Cosmic.websocket and is_open(Cosmic.websocket):
         return True
     for _ in range(3):
         with Handler():
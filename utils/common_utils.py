@@ -1,4 +1,3 @@
-import ctypes
 import re
 
 
@@ -35,21 +34,40 @@ def clean_url(url):
     return url
 
 
+def jump_url(url, seconds):
+    """
+    生成跳转到视频指定时间的链接。
+
+    Bilibili 和 YouTube 都使用 t 参数（秒），已有查询参数时用 & 连接，
+    原 URL 中已有的 t 参数会被替换。
+
+    参数:
+    url (str): 视频 URL
+    seconds (int | float): 跳转的时间（秒）
+
+    返回:
+    str: 带时间参数的 URL
+
+    示例:
+    >>> jump_url("https://www.bilibili.com/video/BV1xx411c7mD", 90)
+    "https://www.bilibili.com/video/BV1xx411c7mD?t=90"
+    >>> jump_url("https://www.bilibili.com/video/BV1xx411c7mD?p=2", 90)
+    "https://www.bilibili.com/video/BV1xx411c7mD?p=2&t=90"
+    """
+    url = re.sub(r'([?&])t=[^&#]*&?', r'\1', url).rstrip('?&')
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}t={int(seconds)}"
+
+
 def empty_current_working_set():
     """
-    清空当前工作集。
+    释放当前进程的空闲内存。
 
-    此函数使用 Windows API 函数来清空当前进程的工作集。
-    它首先获取当前进程的 ID，然后打开进程并获取句柄，
-    接着使用 EmptyWorkingSet 函数清空工作集，最后关闭进程句柄。
+    原先只能在 Windows 上清空工作集，现在由 utils.memory_governor.release_memory 跨平台实现：
+    回收 Python 垃圾，Linux 上调用 malloc_trim，Windows 上清空工作集。
 
-    注意：此函数仅在 Windows 系统上有效。
+    返回:
+    int: 释放的常驻内存（字节）
     """
-    # 使用 Windows API 函数 GetCurrentProcessId() 获取当前进程的ID。
-    pid = ctypes.windll.kernel32.GetCurrentProcessId()
-    # 使用 OpenProcess 函数打开进程，获取句柄, 0x1F0FFF 表示进程句柄的访问权限
-    handle = ctypes.windll.kernel32.OpenProcess(0x1F0FFF, False, pid)
-    # 使用 EmptyWorkingSet 函数清空工作集
-    ctypes.windll.psapi.EmptyWorkingSet(handle)
-    # 使用 CloseHandle 函数关闭进程句柄
-    ctypes.windll.kernel32.CloseHandle(handle)
+    from utils.memory_governor import release_memory
+    return release_memory()
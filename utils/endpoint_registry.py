@@ -0,0 +1,65 @@
+"""
+记录每个 API 地址可用的调用方式
+
+FastGPT 类接口的鉴权和请求格式不统一，需要逐个尝试。探测成功后把调用方式按 api_base
+保存到 downloads/endpoint_methods.json，之后直接使用，只有该方式失效时才重新探测。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from utils.file_manager import ensure_dir_exists
+
+
+def get_registry_file():
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "endpoint_methods.json")
+
+
+class EndpointRegistry:
+    """
+    api_base -> 调用方式名称 的持久化映射，线程安全
+    """
+
+    def __init__(self, registry_file: Optional[str] = None):
+        self.registry_file = registry_file or get_registry_file()
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(self.registry_file, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, api_base: str) -> Optional[str]:
+        entry = self._entries.get(api_base)
+        return entry['method'] if entry else None
+
+    def remember(self, api_base: str, method: str):
+        with self._lock:
+            self._entries[api_base] = {'method': method, 'updated': time.time()}
+            self._save()
+
+    def forget(self, api_base: str):
+        with self._lock:
+            if self._entries.pop(api_base, None) is not None:
+                self._save()
+
+    def _save(self):
+        ensure_dir_exists(os.path.dirname(self.registry_file))
+        temp_file = f"{self.registry_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.registry_file)
+
+
+_shared_registry: Optional[EndpointRegistry] = None
+
+
+def get_shared_registry() -> EndpointRegistry:
+    global _shared_registry
+    if _shared_registry is None:
+        _shared_registry = EndpointRegistry()
+    return _shared_registry
@@ -5,6 +5,10 @@ from typing import Dict, Any
 import yt_dlp
 from dotenv import load_dotenv
 
+from utils import metrics
+from utils.host_limiter import FATAL, NETWORK, backoff_delay, classify_error, get_limiter
+from utils.memory_governor import get_governor
+
 # 加载环境变量
 load_dotenv()
 
@@ -25,27 +29,47 @@ def get_ydl_opts(output_path: str, audio_format: str) -> Dict[str, Any]:
         'password': os.getenv('BILIBILI_PASSWORD'),
         'retries': 10,
         'fragment_retries': 10,
+        # yt-dlp 内部重试也指数退避，避免被限流时连续请求
+        'retry_sleep_functions': {'http': lambda n: min(2 ** n, 60), 'fragment': lambda n: min(2 ** n, 60)},
         'skip_unavailable_fragments': True,
-        'ignoreerrors': True,
+        # 出错时抛出异常，由 download_video 按错误类型退避
+        'ignoreerrors': False,
         'no_warnings': True,
     }
 
 
 def download_video(url: str, output_path: str, audio_format: str, max_retries: int = 3) -> str:
     ydl_opts = get_ydl_opts(output_path, audio_format)
+    # 统计实际下载的字节数，用于计算下载速度
+    downloaded = {}
+    ydl_opts['progress_hooks'] = [
+        lambda d: downloaded.__setitem__(d.get('filename'), d.get('downloaded_bytes') or d.get('total_bytes') or 0)
+    ]
 
+    governor = get_governor()
+    limiter = get_limiter()
     for attempt in range(max_retries):
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                title = info['title']
-                ydl.download([url])
+            governor.wait_for_headroom('下载')
+            # 占用该站点的一个名额，所有线程和进程共享并发数、请求速率和限流后的冷却
+            with limiter.slot(url):
+                start = time.perf_counter()
+                with governor.stage('download', release=True), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    # 解析和下载一起完成，不再为获取标题单独请求一次
+                    info = ydl.extract_info(url, download=True)
+                    title = info['title']
+            metrics.record('download', None, time.perf_counter() - start, sum(downloaded.values()),
+                           url=url, attempt=attempt + 1, duration=info.get('duration'))
             return title
         except Exception as e:
-            print(f"下载失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                print("等待5秒后重试...")
-                time.sleep(5)
+            error_class = classify_error(e)
+            print(f"下载失败 (尝试 {attempt + 1}/{max_retries}，{error_class}): {str(e)}")
+            if error_class != FATAL and attempt < max_retries - 1:
+                # 被限流时整个站点进入冷却，下次占用名额时会等待；网络错误只退避这一次下载
+                if error_class == NETWORK:
+                    delay = backoff_delay(error_class, attempt)
+                    print(f"等待{delay:.0f}秒后重试...")
+                    time.sleep(delay)
             else:
                 raise
 
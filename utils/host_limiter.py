@@ -0,0 +1,287 @@
+"""
+按站点限制下载的并发数和请求速率
+
+同时下载很多视频时，B站会对同一 IP 返回 HTTP 412/429，之后所有下载一起失败。这里把每个站点的状态保存在
+SQLite（downloads/hosts.db）中，同一台机器上的所有线程和进程共享：
+1. 并发数：同一站点同时进行的下载不超过 DownloadConfig.concurrency_per_host
+2. 请求速率：同一站点两次下载开始的间隔不小于 60 / DownloadConfig.requests_per_minute 秒
+3. 站点健康度：被限流时惩罚系数翻倍，并发数按系数降低、间隔按系数拉长，并让该站点冷却一段时间；
+   成功后系数逐渐回落（乘性增、渐进减），在被封禁之前就先慢下来
+4. 按错误类型退避：限流（403/412/429/503）、网络错误（超时、连接重置）使用不同的基础等待时间，
+   指数增长并加随机抖动，视频不存在等错误不重试
+
+用法:
+    python -m utils.host_limiter status       # 查看各站点的状态
+    python -m utils.host_limiter reset        # 清除惩罚和冷却
+"""
+
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+import typer
+
+from config import DownloadConfig
+from utils import metrics
+from utils.file_manager import ensure_dir_exists
+
+# 错误类型
+THROTTLE = 'throttle'  # 被站点限流，整个站点需要冷却
+NETWORK = 'network'  # 网络错误，只需要重试这一次下载
+FATAL = 'fatal'  # 视频不存在、链接不支持等，重试没有意义
+
+THROTTLE_STATUS = {403, 412, 429, 503}
+FATAL_STATUS = {400, 401, 404, 410}
+MAX_PENALTY = 16
+
+_http_status_pattern = re.compile(r'HTTP Error (\d{3})')
+_fatal_pattern = re.compile(r'Unsupported URL|Video unavailable|not available|啥都木有|视频不见了|is private|'
+                            r'does not exist|No video formats found', re.IGNORECASE)
+
+_limiter: Optional['HostLimiter'] = None
+_limiter_lock = threading.Lock()
+
+
+def get_state_file():
+    return DownloadConfig.state_file or os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "downloads", "hosts.db")
+
+
+def host_key(url: str) -> str:
+    """站点名称：取主域名，www.bilibili.com、m.bilibili.com 共用一个限额"""
+    host = (urlparse(url).hostname or url).lower()
+    parts = host.split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 and not host.replace('.', '').isdigit() else host
+
+
+def classify_error(e: BaseException) -> str:
+    """根据 HTTP 状态码、异常类型和错误信息判断错误类型"""
+    status = getattr(e, 'status', None) or getattr(e, 'code', None)
+    message = str(e)
+    if not isinstance(status, int):
+        match = _http_status_pattern.search(message)
+        status = int(match.group(1)) if match else None
+    if status in THROTTLE_STATUS:
+        return THROTTLE
+    if status in FATAL_STATUS or _fatal_pattern.search(message):
+        return FATAL
+    return NETWORK
+
+
+def backoff_delay(error_class: str, attempt: int) -> float:
+    """
+    指数退避的等待时间，加上随机抖动，避免多个下载在同一时刻重试
+
+    Args:
+        error_class: 错误类型
+        attempt: 第几次重试，从 0 开始
+
+    Returns:
+        等待的秒数，在 [delay / 2, delay) 之间
+    """
+    base = DownloadConfig.throttle_backoff if error_class == THROTTLE else DownloadConfig.network_backoff
+    delay = min(DownloadConfig.max_backoff, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != 'posix':
+        # Windows 上 os.kill 会结束进程，只依赖租约超时回收
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class HostLimiter:
+    """
+    跨线程、跨进程共享的站点限额
+    """
+
+    def __init__(self, state_file: Optional[str] = None):
+        self.state_file = state_file or get_state_file()
+        ensure_dir_exists(os.path.dirname(self.state_file))
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.state_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS hosts (
+                host TEXT PRIMARY KEY,
+                penalty REAL NOT NULL DEFAULT 1,
+                next_start REAL NOT NULL DEFAULT 0,
+                cooldown_until REAL NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                successes INTEGER NOT NULL DEFAULT 0,
+                throttled INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                id INTEGER PRIMARY KEY,
+                host TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                acquired REAL NOT NULL
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def _try_acquire(self, host: str) -> tuple:
+        """尝试占用一个名额，返回 (租约编号, 需要等待的秒数)，占用成功时等待时间为 0"""
+        now = time.time()
+        with self._transaction() as conn:
+            # 回收已退出的进程和超时未释放的名额
+            for lease_id, pid, acquired in conn.execute('SELECT id, pid, acquired FROM leases WHERE host = ?', (host,)):
+                if now - acquired > DownloadConfig.lease_seconds or not _pid_alive(pid):
+                    conn.execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+            conn.execute('INSERT OR IGNORE INTO hosts (host) VALUES (?)', (host,))
+            penalty, next_start, cooldown_until = conn.execute(
+                'SELECT penalty, next_start, cooldown_until FROM hosts WHERE host = ?', (host,)).fetchone()
+            active = conn.execute('SELECT COUNT(*) FROM leases WHERE host = ?', (host,)).fetchone()[0]
+            allowed = max(1, int(DownloadConfig.concurrency_per_host / penalty))
+            wait = max(next_start, cooldown_until) - now
+            if wait > 0:
+                return None, wait
+            if active >= allowed:
+                return None, DownloadConfig.poll_interval
+            interval = 60 / DownloadConfig.requests_per_minute * penalty if DownloadConfig.requests_per_minute else 0
+            conn.execute('UPDATE hosts SET next_start = ? WHERE host = ?', (now + interval, host))
+            cursor = conn.execute('INSERT INTO leases (host, pid, acquired) VALUES (?, ?, ?)', (host, os.getpid(), now))
+            return cursor.lastrowid, 0
+
+    def acquire(self, host: str) -> int:
+        """等待直到该站点有空闲名额，返回租约编号"""
+        start = time.monotonic()
+        reported = False
+        while True:
+            lease_id, wait = self._try_acquire(host)
+            if lease_id is not None:
+                if reported:
+                    metrics.record('download_wait', None, time.monotonic() - start, host=host)
+                return lease_id
+            if wait >= 5 and not reported:
+                print(f"{host} 限流中，等待 {wait:.0f} 秒")
+                reported = True
+            time.sleep(min(wait, 5))
+
+    def release(self, lease_id: int, host: str, error: Optional[BaseException] = None) -> Optional[str]:
+        """
+        释放名额并根据结果更新站点健康度
+
+        Args:
+            lease_id: acquire 返回的租约编号
+            host: 站点名称
+            error: 下载出错时的异常，成功时为None
+
+        Returns:
+            错误类型，成功时为None
+        """
+        error_class = classify_error(error) if error is not None else None
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+            if error_class is None:
+                conn.execute("""
+                    UPDATE hosts SET penalty = MAX(1, penalty * ?), failures = 0, successes = successes + 1
+                    WHERE host = ?
+                """, (DownloadConfig.recovery_factor, host))
+            elif error_class == THROTTLE:
+                failures = conn.execute('SELECT failures FROM hosts WHERE host = ?', (host,)).fetchone()[0]
+                cooldown = backoff_delay(THROTTLE, failures)
+                conn.execute("""
+                    UPDATE hosts SET penalty = MIN(?, penalty * 2), failures = failures + 1, throttled = throttled + 1,
+                    cooldown_until = MAX(cooldown_until, ?), last_error = ? WHERE host = ?
+                """, (MAX_PENALTY, now + cooldown, str(error)[:200], host))
+                print(f"{host} 返回限流错误，冷却 {cooldown:.0f} 秒并降低并发")
+                metrics.record('download_throttle', None, cooldown, host=host)
+            elif error_class == NETWORK:
+                conn.execute("""
+                    UPDATE hosts SET penalty = MIN(?, penalty * 1.25), failures = failures + 1, last_error = ?
+                    WHERE host = ?
+                """, (MAX_PENALTY, str(error)[:200], host))
+        return error_class
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[str]:
+        """
+        占用站点的一个名额，块内出错时按错误类型更新站点健康度后重新抛出
+
+            with get_limiter().slot(url):
+                ydl.extract_info(url, download=True)
+        """
+        host = host_key(url)
+        lease_id = self.acquire(host)
+        try:
+            yield host
+        except Exception as e:
+            self.release(lease_id, host, e)
+            raise
+        except BaseException:
+            # 被用户中断，不计入站点健康度
+            with self._transaction() as conn:
+                conn.execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+            raise
+        else:
+            self.release(lease_id, host)
+
+
+def get_limiter() -> HostLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = HostLimiter()
+        return _limiter
+
+
+app = typer.Typer()
+
+
+@app.command()
+def status():
+    """查看各站点的惩罚系数、冷却时间和进行中的下载"""
+    limiter = HostLimiter()
+    now = time.time()
+    rows = limiter.conn.execute("""
+        SELECT host, penalty, cooldown_until, failures, successes, throttled, last_error,
+               (SELECT COUNT(*) FROM leases WHERE leases.host = hosts.host)
+        FROM hosts ORDER BY host
+    """).fetchall()
+    print(f"{'站点':<20}{'惩罚':>6}{'冷却(s)':>9}{'下载中':>7}{'成功':>7}{'限流':>6}{'连续失败':>9}  最近错误")
+    for host, penalty, cooldown_until, failures, successes, throttled, last_error, active in rows:
+        print(f"{host:<22}{penalty:>6.1f}{max(0, cooldown_until - now):>9.0f}{active:>7}{successes:>7}{throttled:>6}"
+              f"{failures:>9}  {last_error or ''}")
+
+
+@app.command()
+def reset(host: str = typer.Argument(None, help='站点名称，默认为全部站点')):
+    """清除站点的惩罚系数和冷却时间"""
+    limiter = HostLimiter()
+    with limiter._transaction() as conn:
+        conn.execute("UPDATE hosts SET penalty = 1, cooldown_until = 0, next_start = 0, failures = 0"
+                     + (" WHERE host = ?" if host else ''), (host,) if host else ())
+    print('已重置')
+
+
+if __name__ == '__main__':
+    app()
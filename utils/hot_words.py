@@ -0,0 +1,379 @@
+"""
+热词纠正
+
+按 ClientConfig 的开关，用项目根目录下的热词文件纠正识别结果：
+- hot_zh.txt：中文热词，每行一个。热词按拼音编入 Aho-Corasick 自动机，识别结果中读音相同的字
+  （「声调」为 False 时忽略声调，「多音字」为 True 时每个字的所有读音都参与匹配）替换为热词
+- hot_en.txt：英文热词，每行一个，可以包含空格。不区分大小写匹配整词，替换为文件中的写法
+- hot_rule.txt：自定义规则，每行 “正则 = 替换”，按顺序作用于文本
+以 # 开头的行是注释。
+
+中文和英文热词在一次线性扫描中完成匹配，重叠时取最靠前、最长的热词。中文热词逐字替换、长度不变，
+英文热词整词替换，因此可以同时作用于文本和分词列表，分词的时间戳仍然有效。自定义规则可能改变长度，
+转录和听写时在文本规范化之后执行（correct_and_normalize），替换结果写入分行稿、字幕和 main.txt。
+
+用法:
+    python -m utils.hot_words 识别结果文本        # 查看纠正结果
+"""
+
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from itertools import islice, product
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import typer
+from pypinyin import Style, lazy_pinyin, pinyin
+
+from config import ClientConfig as Config
+from utils import metrics
+from utils.text_normalizer import Normalized, normalize_transcript, replace_text
+
+MAX_READINGS = 16  # 多音字热词最多展开的读音组合数
+MAX_STATES = 8  # 多音字匹配时同时跟踪的自动机状态数
+
+_hanzi_pattern = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]')
+_HANZI_FIRST, _HANZI_LAST = '\u3400', '\u9fff'  # 逐字扫描时用比较代替正则，包含少量非汉字的符号，不影响匹配
+_en_word_pattern = re.compile(r'[A-Za-z][A-Za-z0-9+#]*')
+
+_corrector: Optional['HotWordCorrector'] = None
+_corrector_key = None
+_corrector_lock = threading.Lock()
+
+
+def get_hot_file(name: str) -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), name)
+
+
+def read_lines(path: str) -> List[str]:
+    """读取热词文件，跳过空行和注释，文件不存在时返回空列表"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    except FileNotFoundError:
+        return []
+
+
+class PinyinAutomaton:
+    """
+    以拼音音节为字母表的 Aho-Corasick 自动机
+    """
+
+    def __init__(self, words: Sequence[str], tone: bool = False, polyphone: bool = True):
+        """
+        Args:
+            words: 中文热词
+            tone: 是否区分声调
+            polyphone: 是否匹配多音字的所有读音
+        """
+        self.style = Style.TONE3 if tone else Style.NORMAL
+        self.polyphone = polyphone
+        self.symbols: Dict[str, int] = {}
+        self.children: List[Dict[int, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.depth: List[int] = [0]
+        self.words: List[Optional[List[str]]] = [None]  # 以该节点结尾的热词（读音相同的可能有多个）
+        self.match: List[int] = [-1]  # 后缀链上最长的热词节点
+        self.syllables = lru_cache(maxsize=None)(self._syllables)
+        for word in words:
+            if all(_hanzi_pattern.match(char) for char in word):
+                for reading in self._word_readings(word):
+                    self._insert(reading, word)
+        self._build()
+
+    def _symbol(self, syllable: str) -> int:
+        return self.symbols.setdefault(syllable, len(self.symbols))
+
+    def _syllables(self, char: str) -> Tuple[int, ...]:
+        """一个字的读音编号，多音字模式下包含所有读音"""
+        readings = pinyin(char, style=self.style, heteronym=self.polyphone)[0]
+        return tuple(dict.fromkeys(self._symbol(reading) for reading in readings))
+
+    def _word_readings(self, word: str) -> List[Tuple[int, ...]]:
+        # 按词组判断的读音放在最前，多音字模式下再加上逐字读音的组合
+        readings = [tuple(self._symbol(reading) for reading in lazy_pinyin(word, style=self.style))]
+        if self.polyphone:
+            for combination in islice(product(*(self.syllables(char) for char in word)), MAX_READINGS):
+                if combination not in readings:
+                    readings.append(combination)
+        return readings
+
+    def _insert(self, reading: Tuple[int, ...], word: str):
+        node = 0
+        for symbol in reading:
+            child = self.children[node].get(symbol)
+            if child is None:
+                child = len(self.children)
+                self.children[node][symbol] = child
+                self.children.append({})
+                self.fail.append(0)
+                self.depth.append(self.depth[node] + 1)
+                self.words.append(None)
+                self.match.append(-1)
+            node = child
+        if self.words[node] is None:
+            self.words[node] = []
+        if word not in self.words[node]:
+            self.words[node].append(word)
+
+    def _build(self):
+        """广度优先计算失败指针和后缀链上最长的热词"""
+        queue = []
+        for child in self.children[0].values():
+            self.match[child] = child if self.words[child] else -1
+            queue.append(child)
+        for node in queue:
+            for symbol, child in self.children[node].items():
+                state = self.fail[node]
+                while state and symbol not in self.children[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.children[state].get(symbol, 0)
+                self.match[child] = child if self.words[child] else self.match[self.fail[child]]
+                queue.append(child)
+
+    def _step(self, state: int, symbol: int) -> int:
+        while state and symbol not in self.children[state]:
+            state = self.fail[state]
+        return self.children[state].get(symbol, 0)
+
+    def find(self, text: str) -> Dict[int, Tuple[int, List[str]]]:
+        """
+        一次扫描找出所有匹配
+
+        Returns:
+            起始位置 -> (长度, 读音相同的热词)，同一位置只保留最长的
+        """
+        best: Dict[int, Tuple[int, List[str]]] = {}
+        if len(self.children) == 1:
+            return best
+        syllables, step, match, depth, words = self.syllables, self._step, self.match, self.depth, self.words
+        states = (0,)
+        for i, char in enumerate(text):
+            if not _HANZI_FIRST <= char <= _HANZI_LAST:
+                states = (0,)
+                continue
+            symbols = syllables(char)
+            if len(states) == 1 and len(symbols) == 1:
+                states = (step(states[0], symbols[0]),)
+            else:
+                states = tuple(dict.fromkeys(step(state, symbol) for state in states
+                                             for symbol in symbols))[:MAX_STATES]
+            for state in states:
+                node = match[state]
+                if node > 0:
+                    length = depth[node]
+                    start = i - length + 1
+                    if length > best.get(start, (0,))[0]:
+                        best[start] = (length, words[node])
+        return best
+
+
+class HotWordCorrector:
+    """
+    中文、英文热词和自定义规则的纠正器
+    """
+
+    def __init__(self, zh_words: Sequence[str] = (), en_words: Sequence[str] = (),
+                 rules: Sequence[str] = (), tone: bool = False, polyphone: bool = True):
+        """
+        Args:
+            zh_words: 中文热词
+            en_words: 英文热词，可以包含空格
+            rules: “正则 = 替换” 格式的规则
+            tone: 中文热词是否区分声调
+            polyphone: 中文热词是否匹配多音字的所有读音
+        """
+        self.automaton = PinyinAutomaton(zh_words, tone, polyphone) if zh_words else None
+        # 英文热词按小写的单词序列索引
+        self.en_words: Dict[Tuple[str, ...], str] = {}
+        for word in en_words:
+            words = tuple(w.lower() for w in _en_word_pattern.findall(word))
+            if words:
+                self.en_words[words] = word
+        self.en_max_words = max((len(words) for words in self.en_words), default=0)
+        self.rules = []
+        for rule in rules:
+            pattern, sep, replacement = rule.partition('=')
+            if sep:
+                try:
+                    self.rules.append((re.compile(pattern.strip()), replacement.strip()))
+                except re.error as e:
+                    print(f"热词规则 {rule} 无效: {e}")
+
+    def _zh_replacements(self, text: str) -> List[Tuple[int, int, str]]:
+        if self.automaton is None:
+            return []
+        matches = self.automaton.find(text)
+        replacements = []
+        i, end = 0, len(text)
+        for start in sorted(matches):
+            if start < i:
+                continue
+            length, words = matches[start]
+            original = text[start:start + length]
+            if original not in words:
+                replacements.append((start, start + length, words[0]))
+            i = start + length
+            if i >= end:
+                break
+        return replacements
+
+    def _en_replacements(self, text: str) -> List[Tuple[int, int, str]]:
+        if not self.en_words:
+            return []
+        spans = [(m.start(), m.end(), m.group().lower()) for m in _en_word_pattern.finditer(text)]
+        replacements = []
+        i = 0
+        while i < len(spans):
+            # 从最长的词组开始尝试，相邻单词之间只能是空白
+            for count in range(min(self.en_max_words, len(spans) - i), 0, -1):
+                group = spans[i:i + count]
+                if any(text[a[1]:b[0]].strip() for a, b in zip(group, group[1:])):
+                    continue
+                word = self.en_words.get(tuple(span[2] for span in group))
+                if word is not None:
+                    start, end = group[0][0], group[-1][1]
+                    if text[start:end] != word:
+                        replacements.append((start, end, word))
+                    i += count
+                    break
+            else:
+                i += 1
+        return replacements
+
+    def correct_text(self, text: str, rules: bool = True) -> str:
+        """纠正一段文本"""
+        replacements = sorted(self._zh_replacements(text) + self._en_replacements(text))
+        if replacements:
+            out, last = [], 0
+            for start, end, word in replacements:
+                out.append(text[last:start])
+                out.append(word)
+                last = end
+            out.append(text[last:])
+            text = ''.join(out)
+        if rules:
+            for pattern, replacement in self.rules:
+                text = pattern.sub(replacement, text)
+        return text
+
+    def correct_tokens(self, tokens: Sequence[str]) -> List[str]:
+        """
+        纠正分词列表，分词的数量和顺序不变
+
+        中文逐字替换；英文热词只替换完整的单词分词（不含 @@ 续接标记的分词）。
+        """
+        tokens = list(tokens)
+        if self.automaton is not None:
+            # 单字分词拼成字符串，其他分词用空格隔开，热词不会跨过它们
+            chars = ''.join(token if len(token) == 1 else ' ' for token in tokens)
+            for start, end, word in self._zh_replacements(chars):
+                tokens[start:end] = list(word)
+        if self.en_words:
+            for i, token in enumerate(tokens):
+                if '@' not in token:
+                    word = self.en_words.get((token.lower(),))
+                    if word is not None:
+                        tokens[i] = word
+        return tokens
+
+    def correct(self, text: str, tokens: Sequence[str], rules: bool = True) -> Tuple[str, List[str]]:
+        """
+        同时纠正识别结果的文本和分词列表
+
+        中文热词只在文本上匹配一次（文本中的标点会隔开热词），再按汉字的顺序映射到分词，
+        两者的汉字序列不一致时分词单独匹配。rules 为 False 时不执行自定义规则。
+        """
+        corrected = self.correct_text(text, rules=False)
+        original_chars = [char for char in text if _HANZI_FIRST <= char <= _HANZI_LAST]
+        token_positions = [i for i, token in enumerate(tokens) if len(token) == 1 and _HANZI_FIRST <= token <= _HANZI_LAST]
+        if self.automaton is not None and len(original_chars) == len(token_positions) and \
+                all(tokens[i] == char for i, char in zip(token_positions, original_chars)):
+            corrected_chars = [char for char in corrected if _HANZI_FIRST <= char <= _HANZI_LAST]
+            tokens = list(tokens)
+            if len(corrected_chars) == len(token_positions):
+                for i, char in zip(token_positions, corrected_chars):
+                    tokens[i] = char
+            for i, token in enumerate(tokens):
+                if self.en_words and '@' not in token:
+                    tokens[i] = self.en_words.get((token.lower(),), token)
+        else:
+            tokens = self.correct_tokens(tokens)
+        if rules:
+            for pattern, replacement in self.rules:
+                corrected = pattern.sub(replacement, corrected)
+        return corrected, tokens
+
+
+def get_corrector() -> Optional[HotWordCorrector]:
+    """
+    按 ClientConfig 的开关加载热词文件，文件修改后自动重新加载
+
+    Returns:
+        纠正器，没有启用任何热词或热词文件为空时返回None
+    """
+    global _corrector, _corrector_key
+    files = [(enabled, get_hot_file(name)) for enabled, name in
+             ((Config.hot_zh, 'hot_zh.txt'), (Config.hot_en, 'hot_en.txt'), (Config.hot_rule, 'hot_rule.txt'))]
+    key = tuple((enabled, os.path.getmtime(path) if enabled and os.path.exists(path) else None)
+                for enabled, path in files) + (Config.声调, Config.多音字)
+    with _corrector_lock:
+        if key != _corrector_key:
+            zh, en, rules = (read_lines(path) if enabled else [] for enabled, path in files)
+            start = time.perf_counter()
+            _corrector = HotWordCorrector(zh, en, rules, tone=Config.声调, polyphone=Config.多音字) \
+                if zh or en or rules else None
+            _corrector_key = key
+            if _corrector:
+                print(f"已加载热词：中文 {len(zh)} 个，英文 {len(en)} 个，规则 {len(rules)} 条，"
+                      f"耗时 {time.perf_counter() - start:.2f}s")
+        return _corrector
+
+
+def correct_transcript(text: str, tokens: Sequence[str], job: Optional[str] = None) -> Tuple[str, List[str]]:
+    """用当前的热词纠正识别结果，没有热词时原样返回"""
+    corrector = get_corrector()
+    if corrector is None:
+        return text, list(tokens)
+    with metrics.stage('hotword', job, bytes=len(text.encode('utf-8'))):
+        return corrector.correct(text, tokens)
+
+
+def correct_and_normalize(text: str, tokens: Sequence[str], timestamps: Sequence[float],
+                          job: Optional[str] = None) -> Normalized:
+    """
+    纠正并规范化识别结果，转录文件和实时听写共用
+
+    热词同时作用于文本和分词；自定义规则只能作用于文本，而规范化按分词重建输出，
+    因此规则在规范化之后执行，替换同步到分行稿和词。
+
+    Args:
+        text: 服务端返回的文本
+        tokens: 分词
+        timestamps: 每个分词的开始时间（秒）
+        job: 任务标识，用于记录耗时
+
+    Returns:
+        规范化的结果
+    """
+    corrector = get_corrector()
+    if corrector is not None:
+        with metrics.stage('hotword', job, bytes=len(text.encode('utf-8'))):
+            text, tokens = corrector.correct(text, tokens, rules=False)
+    normalized = normalize_transcript(text, tokens, timestamps, job)
+    if corrector is not None and corrector.rules:
+        with metrics.stage('hotword', job, bytes=len(normalized.text.encode('utf-8'))):
+            normalized = replace_text(normalized, corrector.rules)
+    return normalized
+
+
+def main(text: str):
+    """用项目根目录下的热词文件纠正一段文本"""
+    corrected, _ = correct_transcript(text, [])
+    print(corrected)
+
+
+if __name__ == '__main__':
+    typer.run(main)
@@ -0,0 +1,766 @@
+"""
+持久化任务队列
+
+任务（视频链接或本地音视频文件）保存在 SQLite 中，一个或多个工作进程从队列领取任务并依次执行各阶段：
+- 链接：expand（展开分P、读取时长）-> download（下载音频）-> transcribe（转录、对齐、索引、AI总结）-> done
+- 本地文件：ingest（监视目录中的文件移动到当天的目录，其他文件在原来的位置转录）-> transcribe -> done
+每完成一个阶段就写回队列，工作进程崩溃或被终止后，任务从最后完成的阶段继续。
+
+多P视频、合集和播放列表在 expand 阶段展开（见 utils.playlist），每个分P作为子任务由所有工作进程并行处理，
+原任务变为 course 任务：combine（合并各分P的 main.txt 并总结）-> done，所有子任务结束后才会被领取。
+
+领取任务时记录工作进程和心跳时间，执行期间定期更新心跳；超过 QueueConfig.lease_seconds 没有心跳的任务
+视为所在进程已崩溃，可被其他进程接手。失败的任务按指数退避重试，超过 QueueConfig.max_attempts 次后标记为 failed。
+
+领取顺序由 QueueConfig.scheduling 决定，默认按预估的音频时长从短到长（短任务优先），避免一个几小时的直播
+挡住几十个短视频：本地文件加入队列时用 ffprobe 读取时长，链接在 expand 阶段从 yt-dlp 元数据读取时长后重新排队，
+还不知道时长的任务按 QueueConfig.default_duration 排序。排序时扣除已排队时间乘以 QueueConfig.aging_rate，
+长任务等得越久越靠前，不会一直被插队；有长任务排队时，短任务最多占用 工作进程数 - QueueConfig.long_job_slots 个
+工作进程，剩下的留给长任务（工作进程不多于 long_job_slots 时不保留）。
+每次领取记录排队等待时间（metrics 的 queue_wait 阶段），status 命令显示排队数量和等待时间的统计。
+
+监视模式用 watchdog（Linux 上为 inotify）监听目录事件，文件写入完成或移入目录时加入队列，不轮询目录。
+
+用法:
+    python -m utils.job_queue add https://www.bilibili.com/video/BV... ./a.mp4    # 加入队列
+    python -m utils.job_queue work --processes 2                                    # 启动工作进程
+    python -m utils.job_queue watch --workers 1                                     # 监视 downloads/inbox
+    python -m utils.job_queue status                                                # 查看队列
+    python -m utils.job_queue retry                                                 # 重试失败的任务
+"""
+
+import asyncio
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import typer
+
+from config import QueueConfig
+from utils import metrics
+from utils.audio_archive import probe_duration
+from utils.file_manager import clean_filename, ensure_dir_exists, get_next_file_number, get_temp_dir, get_today_folder
+from utils.playlist import combine_parts, course_stem, expand_url, needs_expansion, read_manifest, summarize_course, \
+    write_manifest
+
+# 每种任务依次执行的阶段
+STAGES = {
+    'url': ('expand', 'download', 'transcribe', 'done'),
+    'file': ('ingest', 'transcribe', 'done'),
+    'course': ('combine', 'done'),
+}
+
+# 只读元数据或合并文本的阶段，耗时与音频时长无关，排序时预估时长记为 0
+CHEAP_STAGES = ('expand', 'combine')
+# 排序用的预估时长（秒），与 JobQueue.estimate 一致
+_COST = (f"(CASE WHEN stage IN ({', '.join(repr(stage) for stage in CHEAP_STAGES)}) THEN 0 "
+         f"ELSE COALESCE(duration, :default) END)")
+
+
+class Job(NamedTuple):
+    id: int
+    source: str  # 视频链接或本地文件的绝对路径
+    kind: str  # 'url'、'file' 或 'course'
+    stage: str  # 下一个要执行的阶段
+    media_file: Optional[str]  # 下载或移入后的音频文件，course 任务为 parts.json
+    attempts: int
+    duration: Optional[float] = None  # 音频时长（秒），还不知道时为None
+
+
+def get_db_file():
+    return QueueConfig.db_file or os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "jobs.db")
+
+
+def get_watch_dir():
+    return QueueConfig.watch_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "inbox")
+
+
+def is_media_file(path) -> bool:
+    path = Path(path)
+    return path.suffix.lower() in QueueConfig.media_suffixes and not path.name.startswith('.')
+
+
+def is_pipeline_output(path) -> bool:
+    """是否是转录流程在源文件旁写出的音频，例如转录完成后 WAV 归档成的 .flac/.opus：同名的识别结果已经存在"""
+    path = Path(path)
+    return any(path.with_name(f"{path.stem}{suffix}").exists() for suffix in ('.merge.txt', '.main.txt'))
+
+
+class JobQueue:
+    """
+    基于 SQLite 的任务队列，可被多个进程同时访问
+    """
+
+    def __init__(self, db_file: Optional[str] = None):
+        self.db_file = db_file or get_db_file()
+        ensure_dir_exists(os.path.dirname(self.db_file))
+        self.lock = threading.Lock()
+        # 自动提交模式，由 _transaction 显式开启写事务
+        self.conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                media_file TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                heartbeat REAL,
+                next_run REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                created REAL,
+                updated REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_run);
+            CREATE INDEX IF NOT EXISTS jobs_source ON jobs (source);
+            CREATE TABLE IF NOT EXISTS workers (
+                name TEXT PRIMARY KEY,
+                seen REAL NOT NULL
+            );
+        """)
+        # 旧版本的队列文件没有后来加入的列；queued 为进入排队状态的时间，waited 为累计的排队时间
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+        for column, decl in (('parent', 'INTEGER'), ('duration', 'REAL'), ('queued', 'REAL'), ('waited', 'REAL')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {decl}')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_parent ON jobs (parent)')
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE 先取得写锁，多个进程同时领取任务时不会拿到同一个"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def enqueue(self, source: str, kind: Optional[str] = None, parent: Optional[int] = None,
+                duration: Optional[float] = None) -> Tuple[int, bool]:
+        """
+        加入队列，同一来源已在排队或执行中时不重复加入
+
+        Args:
+            source: 视频链接或本地文件路径
+            kind: 'url' 或 'file'，如果为None则按是否以 http(s):// 开头判断
+            parent: 所属 course 任务的编号，分P任务不再展开
+            duration: 音频时长（秒），如果为None，本地文件用 ffprobe 读取，链接在 expand 阶段读取
+
+        Returns:
+            (任务编号, 是否新加入)
+        """
+        if kind is None:
+            kind = 'url' if re.match(r'https?://', source) else 'file'
+        if kind == 'file':
+            source = str(Path(source).resolve())
+            if duration is None:
+                duration = probe_duration(source)
+        stage = STAGES[kind][0]
+        if kind == 'url' and (parent is not None or (duration is not None and not needs_expansion(source))):
+            stage = 'download'
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT id FROM jobs WHERE source = ? AND status IN ('queued', 'running')",
+                               (source,)).fetchone()
+            if row:
+                return row[0], False
+            cursor = conn.execute("""
+                INSERT INTO jobs (source, kind, stage, status, parent, duration, created, queued, updated)
+                VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)
+            """, (source, kind, stage, parent, duration, now, now, now))
+            return cursor.lastrowid, True
+
+    @staticmethod
+    def estimate(job: Job) -> float:
+        """排序用的预估时长（秒）"""
+        return 0 if job.stage in CHEAP_STAGES else job.duration or QueueConfig.default_duration
+
+    @staticmethod
+    def _params(now: float) -> dict:
+        return {'now': now, 'expired': now - QueueConfig.lease_seconds, 'default': QueueConfig.default_duration,
+                'aging': QueueConfig.aging_rate, 'long': QueueConfig.long_job_seconds}
+
+    def _pick(self, conn: sqlite3.Connection, now: float, long_only: bool = False) -> Optional[tuple]:
+        """
+        可领取的任务中排在最前的一个
+
+        按 预估时长 - 已排队时间 × aging_rate 从小到大排序；所有任务减去的是同一个 now，
+        等价于按 预估时长 + 加入时间 × aging_rate 排序。
+        """
+        order = 'id' if QueueConfig.scheduling == 'fifo' else f'{_COST} + created * :aging, id'
+        return conn.execute(f"""
+            SELECT id, source, kind, stage, media_file, attempts, duration, status, COALESCE(queued, created) FROM jobs
+            WHERE ((status = 'queued' AND next_run <= :now) OR (status = 'running' AND heartbeat < :expired))
+              AND NOT EXISTS (SELECT 1 FROM jobs AS child
+                              WHERE child.parent = jobs.id AND child.status IN ('queued', 'running'))
+              {f'AND {_COST} >= :long' if long_only else ''}
+            ORDER BY {order} LIMIT 1
+        """, self._params(now)).fetchone()
+
+    def _short_capacity_full(self, conn: sqlite3.Connection, now: float) -> bool:
+        """
+        短任务是否已经占满了不保留给长任务的工作进程
+
+        有 n 个工作进程（最近 lease_seconds 内领取过任务或更新过心跳）时，短任务最多同时占用
+        n - long_job_slots 个；n 不多于 long_job_slots 时不保留，按正常顺序领取。
+        """
+        params = self._params(now)
+        live = conn.execute('SELECT COUNT(*) FROM workers WHERE seen >= :expired', params).fetchone()[0]
+        if live <= QueueConfig.long_job_slots:
+            return False
+        running_short = conn.execute(f"""
+            SELECT COUNT(*) FROM jobs WHERE status = 'running' AND heartbeat >= :expired AND {_COST} < :long
+        """, params).fetchone()[0]
+        return running_short >= live - QueueConfig.long_job_slots
+
+    def unregister(self, worker: str):
+        """工作进程退出时调用，不再计入保留名额的工作进程数"""
+        with self.lock:
+            self.conn.execute('DELETE FROM workers WHERE name = ?', (worker,))
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        领取一个任务：排队中且已到重试时间的任务，或心跳超时（所在进程已崩溃）的任务；
+        还有子任务在排队或执行中的 course 任务不会被领取。领取顺序见 _pick；短任务已经占满了
+        不保留给长任务的工作进程（见 _short_capacity_full）且有长任务在排队时，改为领取排在最前的长任务
+
+        Args:
+            worker: 工作进程标识
+
+        Returns:
+            领取到的任务，队列为空时返回None
+        """
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                conn.execute('INSERT OR REPLACE INTO workers (name, seen) VALUES (?, ?)', (worker, now))
+                row = self._pick(conn, now)
+                if row is None:
+                    return None
+                if QueueConfig.scheduling != 'fifo' and QueueConfig.long_job_slots and \
+                        self.estimate(Job(*row[:7])) < QueueConfig.long_job_seconds and \
+                        self._short_capacity_full(conn, now):
+                    row = self._pick(conn, now, long_only=True) or row
+                job, status, queued = Job(*row[:7]), row[7], row[8]
+                if job.attempts >= QueueConfig.max_attempts:
+                    # 每次执行都让进程崩溃的任务，不再继续接手
+                    conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                                 ('工作进程多次在执行中退出', now, job.id))
+                    continue
+                waited = max(0.0, now - queued) if status == 'queued' else 0.0
+                conn.execute("""
+                    UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1,
+                    waited = COALESCE(waited, 0) + ?, updated = ? WHERE id = ?
+                """, (worker, now, waited, now, job.id))
+            if status == 'running':
+                print(f"接手心跳超时的任务 {job.id}，从阶段 {job.stage} 继续")
+            else:
+                estimate = self.estimate(job)
+                metrics.record('queue_wait', None, waited, queue_job=job.id, queue_stage=job.stage,
+                               estimated_seconds=estimate, long=estimate >= QueueConfig.long_job_seconds)
+            return job._replace(attempts=job.attempts + 1)
+
+    def heartbeat(self, job_id: int, worker: str):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?', (now, job_id, worker))
+            self.conn.execute('INSERT OR REPLACE INTO workers (name, seen) VALUES (?, ?)', (worker, now))
+
+    def advance(self, job_id: int, stage: str, media_file: Optional[str] = None, duration: Optional[float] = None):
+        """记录任务已完成的阶段，stage 为下一个要执行的阶段，为 'done' 时任务完成"""
+        status = 'done' if stage == 'done' else 'running'
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE jobs SET stage = ?, status = ?, media_file = COALESCE(?, media_file),
+                duration = COALESCE(?, duration), error = NULL, updated = ? WHERE id = ?
+            """, (stage, status, media_file, duration, time.time(), job_id))
+
+    def defer(self, job_id: int, kind: str, stage: str, media_file: Optional[str] = None,
+              duration: Optional[float] = None):
+        """把任务改为另一种类型或阶段并放回队列，例如展开分P后等待子任务完成，或读取时长后重新排序"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE jobs SET kind = ?, stage = ?, status = 'queued', media_file = COALESCE(?, media_file),
+                duration = COALESCE(?, duration), attempts = 0, worker = NULL, queued = ?, updated = ? WHERE id = ?
+            """, (kind, stage, media_file, duration, now, now, job_id))
+
+    def children(self, job_id: int) -> Dict[int, Tuple[str, Optional[str]]]:
+        """子任务编号 -> (状态, 音频文件)"""
+        with self.lock:
+            return {child_id: (status, media_file) for child_id, status, media_file in self.conn.execute(
+                'SELECT id, status, media_file FROM jobs WHERE parent = ?', (job_id,))}
+
+    def fail(self, job: Job, error: str):
+        """任务出错：未超过最大次数时按指数退避重新排队，否则标记为 failed"""
+        now = time.time()
+        if job.attempts >= QueueConfig.max_attempts:
+            status, next_run = 'failed', 0
+        else:
+            status, next_run = 'queued', now + QueueConfig.retry_delay * 2 ** (job.attempts - 1)
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE jobs SET status = ?, next_run = ?, error = ?, worker = NULL, queued = ?, updated = ? WHERE id = ?
+            """, (status, next_run, error, now, now, job.id))
+        return status
+
+    def release(self, job: Job):
+        """工作进程被用户中断，把任务放回队列，不计入尝试次数"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), worker = NULL, queued = ?, updated = ?
+                WHERE id = ? AND status = 'running'
+            """, (now, now, job.id))
+
+    def retry(self, job_ids: Optional[List[int]] = None) -> int:
+        """把失败的任务重新排队，job_ids 为空时重试全部失败的任务"""
+        now = time.time()
+        with self._transaction() as conn:
+            if job_ids:
+                marks = ','.join('?' * len(job_ids))
+                cursor = conn.execute(f"""
+                    UPDATE jobs SET status = 'queued', attempts = 0, next_run = 0, queued = ?
+                    WHERE status = 'failed' AND id IN ({marks})
+                """, [now, *job_ids])
+            else:
+                cursor = conn.execute("""
+                    UPDATE jobs SET status = 'queued', attempts = 0, next_run = 0, queued = ? WHERE status = 'failed'
+                """, (now,))
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def stats(self, window_hours: float = None) -> Dict[str, dict]:
+        """
+        短任务和长任务各自的排队数量和等待时间
+
+        Args:
+            window_hours: 统计最近多少小时内开始执行的任务的等待时间，默认为 QueueConfig.stats_window_hours
+
+        Returns:
+            {'short': {...}, 'long': {...}}：queued 排队数，ready 已到领取时间的数量，oldest 排队最久的任务已等待的秒数，
+            started 窗口内开始执行的任务数，wait_p50 / wait_p95 / wait_max 这些任务累计的排队时间（秒）
+        """
+        now = time.time()
+        params = self._params(now)
+        params['since'] = now - (QueueConfig.stats_window_hours if window_hours is None else window_hours) * 3600
+        with self.lock:
+            depth = self.conn.execute(f"""
+                SELECT {_COST} >= :long, COUNT(*), SUM(next_run <= :now), MIN(COALESCE(queued, created)) FROM jobs
+                WHERE status = 'queued' GROUP BY 1
+            """, params).fetchall()
+            waits = self.conn.execute(f"""
+                SELECT {_COST} >= :long, waited FROM jobs
+                WHERE status != 'queued' AND waited IS NOT NULL AND updated >= :since
+            """, params).fetchall()
+        stats = {}
+        for name, is_long in (('short', 0), ('long', 1)):
+            queued, ready, oldest = next(((count, ready, oldest) for long, count, ready, oldest in depth
+                                          if long == is_long), (0, 0, None))
+            values = sorted(waited for long, waited in waits if long == is_long)
+            stats[name] = {
+                'queued': queued,
+                'ready': ready or 0,
+                'oldest': now - oldest if oldest is not None else 0.0,
+                'started': len(values),
+                'wait_p50': values[len(values) // 2] if values else 0.0,
+                'wait_p95': values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0,
+                'wait_max': values[-1] if values else 0.0,
+            }
+        return stats
+
+    def recent(self, limit: int = 20) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute("""
+                SELECT id, status, stage, attempts, COALESCE(media_file, source), error FROM jobs
+                ORDER BY id DESC LIMIT ?
+            """, (limit,)).fetchall()
+
+
+class _Heartbeat:
+    """执行任务期间在后台线程定期更新心跳"""
+
+    def __init__(self, queue: JobQueue, job: Job, worker: str):
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(queue, job.id, worker), daemon=True)
+        self.thread.start()
+
+    def _run(self, queue: JobQueue, job_id: int, worker: str):
+        while not self.stopped.wait(QueueConfig.lease_seconds / 3):
+            try:
+                queue.heartbeat(job_id, worker)
+            except sqlite3.Error as e:
+                print(f"更新任务 {job_id} 的心跳时出错: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def _download(job: Job) -> str:
+    from main import download_audio
+
+    # 每个任务使用单独的临时目录，多个工作进程可以同时下载
+    temp_dir = os.path.join(get_temp_dir(), f"job-{job.id}")
+    ensure_dir_exists(temp_dir)
+    try:
+        media_file = download_audio(job.source, temp_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    if not media_file:
+        raise RuntimeError(f"下载失败：{job.source}")
+    return media_file
+
+
+def _ingest(queue: JobQueue, job: Job) -> str:
+    """
+    把监视目录（QueueConfig.watch_dir）中的文件移动到当天的目录，与下载的音频放在一起；
+    其他本地文件（add 加入的用户文件）不移动，与 process_audio_file 一样在原来的位置转录
+    """
+    source = Path(job.source)
+    if Path(get_watch_dir()).resolve() not in source.resolve().parents:
+        return str(source)
+
+    destination = job.media_file
+    if not destination:
+        today_folder = get_today_folder()
+        number = get_next_file_number(today_folder)
+        date_str = datetime.now().strftime('%Y%m%d')
+        while True:
+            destination = os.path.join(today_folder, f"{number}.{clean_filename(source.stem)}_{date_str}{source.suffix}")
+            if not os.path.exists(destination):
+                break
+            number += 1
+        # 先记录目标位置再移动，移动后崩溃也能找到文件
+        queue.advance(job.id, 'ingest', destination)
+    if source.exists():
+        shutil.move(str(source), destination)
+        print(f"已移动到 {destination}")
+    if not os.path.exists(destination):
+        raise FileNotFoundError(f"找不到文件：{source}")
+    return destination
+
+
+async def _process_file(media_file: Path):
+    from process_audio_file import process_file
+    from utils.client_ws import Cosmic
+
+    try:
+        await process_file(media_file)
+    finally:
+        # 每个任务使用新的事件循环，连接不能跨任务复用
+        if Cosmic.websocket:
+            await Cosmic.websocket.close()
+            Cosmic.websocket = None
+
+
+def _transcribe(media_file: Path):
+    """转录并生成字幕、main.txt 和AI总结；已有识别结果时只重新对齐和总结"""
+    from utils.multi_from_txt import one_task
+    from utils.token_store import tokens_file_for
+
+    main_txt = media_file.parent / f"{media_file.stem}.main.txt"
+    final_md = media_file.parent / f"{media_file.stem}.final.md"
+    url_json = media_file.parent / f"{media_file.stem}.audio_urls.json"
+    if main_txt.exists() and (final_md.exists() or not url_json.exists()):
+        return
+
+    txt_file = media_file.with_suffix('.txt')
+    if txt_file.exists() and tokens_file_for(media_file.with_suffix('.json')).exists():
+        # 上次在识别完成后中断，不需要重新识别
+        one_task(media_file)
+    else:
+        try:
+            asyncio.run(_process_file(media_file))
+        except SystemExit:
+            # transcribe_check 连不上服务端时会退出进程，这里改为任务失败
+            raise ConnectionError('无法连接到语音识别服务端')
+    if not main_txt.exists():
+        raise RuntimeError(f"转录失败，没有生成 {main_txt.name}")
+
+
+def _expand(queue: JobQueue, job: Job) -> bool:
+    """
+    展开分P，有多个分P时加入子任务并把任务改为 course；只有一个分P且读到了时长时，记录时长后放回队列按时长重新排序
+
+    Returns:
+        是否已放回队列（不再继续执行后面的阶段）
+    """
+    playlist = expand_url(job.source)
+    if len(playlist.parts) <= 1:
+        duration = playlist.parts[0].duration if playlist.parts else None
+        if duration is None:
+            return False
+        queue.defer(job.id, 'url', 'download', duration=duration)
+        print(f"任务 {job.id} 时长 {duration:.0f}s，按时长重新排队")
+        return True
+    job_ids = [queue.enqueue(part.url, 'url', parent=job.id, duration=part.duration)[0] for part in playlist.parts]
+    manifest_file = course_stem(playlist.title) + '.parts.json'
+    write_manifest(manifest_file, playlist, job_ids)
+    queue.defer(job.id, 'course', 'combine', manifest_file)
+    print(f"任务 {job.id} 展开为 {len(job_ids)} 个分P：{playlist.title}，分P完成后合并")
+    return True
+
+
+def _combine(queue: JobQueue, job: Job):
+    """合并已完成的分P并生成课程总结"""
+    manifest = read_manifest(job.media_file)
+    children = queue.children(job.id)
+    media_files = []
+    for part in manifest['parts']:
+        status, media_file = children.get(part['job_id'], (None, None))
+        media_files.append(media_file if status == 'done' else None)
+    main_txt_file = combine_parts(job.media_file, media_files)
+    if main_txt_file is None:
+        raise RuntimeError('没有任何分P转录成功')
+    try:
+        summarize_course(main_txt_file, manifest['url'])
+    except Exception as e:
+        print(f"生成课程总结时出错: {str(e)}")
+
+
+def run_job(queue: JobQueue, job: Job):
+    """从任务记录的阶段开始依次执行，每完成一个阶段写回队列"""
+    start = time.perf_counter()
+    stages = STAGES[job.kind]
+    while job.stage != 'done':
+        print(f"任务 {job.id} 阶段 {job.stage}：{job.media_file or job.source}")
+        media_file = job.media_file
+        duration = None
+        if job.stage == 'expand':
+            if _expand(queue, job):
+                return
+        elif job.stage == 'combine':
+            _combine(queue, job)
+        elif job.stage == 'download':
+            media_file = _download(job)
+        elif job.stage == 'ingest':
+            media_file = _ingest(queue, job)
+        else:
+            _transcribe(Path(job.media_file))
+        if media_file and job.duration is None and job.stage in ('download', 'ingest'):
+            # 元数据中没有时长的链接，下载后读取实际时长，供排队统计使用
+            duration = probe_duration(media_file)
+        next_stage = stages[stages.index(job.stage) + 1]
+        queue.advance(job.id, next_stage, media_file, duration)
+        job = job._replace(stage=next_stage, media_file=media_file, duration=job.duration or duration)
+    metrics.record('job', metrics.job_id(job.media_file), time.perf_counter() - start,
+                   kind=job.kind, attempts=job.attempts)
+    print(f"任务 {job.id} 完成：{job.media_file}")
+
+
+def work_loop(db_file: Optional[str] = None, once: bool = False):
+    """
+    工作进程的主循环：领取任务并执行，队列为空时等待
+
+    Args:
+        db_file: 队列文件，默认为 downloads/jobs.db
+        once: 队列为空时是否退出
+    """
+    queue = JobQueue(db_file)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"工作进程 {worker} 已启动，队列：{queue.db_file}")
+    try:
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                if once:
+                    break
+                time.sleep(QueueConfig.poll_interval)
+                continue
+            heartbeat = _Heartbeat(queue, job, worker)
+            try:
+                run_job(queue, job)
+            except KeyboardInterrupt:
+                queue.release(job)
+                raise
+            except Exception as e:
+                status = queue.fail(job, str(e))
+                print(f"任务 {job.id} 出错（第 {job.attempts} 次）: {e}，{'稍后重试' if status == 'queued' else '不再重试'}")
+            finally:
+                heartbeat.stop()
+    except KeyboardInterrupt:
+        print(f"工作进程 {worker} 已停止")
+    finally:
+        queue.unregister(worker)
+        queue.close()
+
+
+def start_workers(count: int, db_file: Optional[str] = None, once: bool = False) -> List[multiprocessing.Process]:
+    processes = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=work_loop, args=(db_file, once))
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def _wait_until_stable(path: str, interval: float = 1.0) -> bool:
+    """等文件大小不再变化，文件被删除时返回 False"""
+    size = -1
+    while os.path.exists(path):
+        current = os.path.getsize(path)
+        if current == size:
+            return True
+        size = current
+        time.sleep(interval)
+    return False
+
+
+def watch_handler(queue: JobQueue):
+    from watchdog.events import FileSystemEventHandler
+
+    class InboxHandler(FileSystemEventHandler):
+        """
+        文件写入完成（inotify 的 IN_CLOSE_WRITE）或在目录内重命名时加入队列。
+
+        从其他目录移入的文件和没有 close 事件的平台（macOS、Windows）只有 created 事件，
+        等文件大小稳定后再加入队列；期间收到 close 事件的文件由 on_closed 处理。
+        """
+
+        def __init__(self):
+            self.pending = set()
+            self.lock = threading.Lock()
+
+        def enqueue(self, path: str):
+            with self.lock:
+                self.pending.discard(path)
+            if not is_media_file(path) or is_pipeline_output(path):
+                return
+            job_id, created = queue.enqueue(path, 'file')
+            if created:
+                print(f"已加入队列：任务 {job_id} {path}")
+
+        def _enqueue_when_stable(self, path: str):
+            if _wait_until_stable(path):
+                with self.lock:
+                    if path not in self.pending:
+                        return
+                self.enqueue(path)
+
+        def on_created(self, event):
+            if event.is_directory or not is_media_file(event.src_path):
+                return
+            with self.lock:
+                self.pending.add(event.src_path)
+            threading.Thread(target=self._enqueue_when_stable, args=(event.src_path,), daemon=True).start()
+
+        def on_closed(self, event):
+            if not event.is_directory:
+                self.enqueue(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self.enqueue(event.dest_path)
+
+    return InboxHandler()
+
+
+app = typer.Typer()
+
+
+@app.command()
+def add(sources: List[str] = typer.Argument(..., help='视频链接或本地音视频文件')):
+    """把视频链接或本地文件加入队列"""
+    queue = JobQueue()
+    for source in sources:
+        if not re.match(r'https?://', source) and not os.path.exists(source):
+            print(f"文件不存在：{source}")
+            continue
+        job_id, created = queue.enqueue(source)
+        print(f"{'已加入队列' if created else '已在队列中'}：任务 {job_id} {source}")
+
+
+@app.command()
+def work(processes: int = typer.Option(1, help='工作进程数'),
+         once: bool = typer.Option(False, help='队列为空时退出')):
+    """启动工作进程，从队列领取任务执行"""
+    if processes <= 1:
+        work_loop(once=once)
+        return
+    workers = start_workers(processes, once=once)
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        # 子进程同样收到 Ctrl+C，会把执行中的任务放回队列后退出
+        for process in workers:
+            process.join()
+
+
+@app.command()
+def watch(folder: Path = typer.Argument(None, help='监视的目录，默认为 downloads/inbox'),
+          workers: int = typer.Option(0, help='同时启动的工作进程数，0 表示只加入队列')):
+    """监视目录，把放入的音视频文件加入队列"""
+    from watchdog.observers import Observer
+
+    folder = folder or Path(get_watch_dir())
+    ensure_dir_exists(folder)
+    queue = JobQueue()
+    handler = watch_handler(queue)
+    # 监视程序未运行时放入的文件
+    for path in sorted(folder.iterdir()):
+        if path.is_file():
+            handler.enqueue(str(path))
+
+    observer = Observer()
+    observer.schedule(handler, str(folder), recursive=False)
+    observer.start()
+    processes = start_workers(workers)
+    print(f"正在监视 {folder}，按 Ctrl+C 退出")
+    try:
+        while observer.is_alive():
+            observer.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+        for process in processes:
+            process.join()
+
+
+@app.command()
+def status(limit: int = typer.Option(20, help='显示最近的任务数')):
+    """查看队列中各状态的任务数和最近的任务"""
+    queue = JobQueue()
+    print('  '.join(f"{name}: {count}" for name, count in sorted(queue.counts().items())) or '队列为空')
+    stats = queue.stats()
+    for name, label in (('short', '短任务'), ('long', '长任务')):
+        stat = stats[name]
+        print(f"{label}：排队 {stat['queued']}（可领取 {stat['ready']}，最久已等 {stat['oldest']:.0f}s）；"
+              f"最近 {QueueConfig.stats_window_hours} 小时开始 {stat['started']} 个，"
+              f"等待 P50 {stat['wait_p50']:.0f}s P95 {stat['wait_p95']:.0f}s 最长 {stat['wait_max']:.0f}s")
+    for job_id, job_status, stage, attempts, target, error in queue.recent(limit):
+        print(f"{job_id:>6}  {job_status:<8}{stage:<12}{attempts:>3}  {target}" + (f"  [{error}]" if error else ''))
+
+
+@app.command()
+def retry(job_ids: List[int] = typer.Argument(None, help='要重试的任务编号，默认为全部失败的任务')):
+    """把失败的任务重新排队"""
+    print(f"已重新排队 {JobQueue().retry(job_ids)} 个任务")
+
+
+if __name__ == '__main__':
+    app()
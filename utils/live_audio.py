@@ -0,0 +1,194 @@
+"""
+实时录音的环形缓冲区和音源
+
+录音回调（sounddevice 的音频线程）只把采样复制进预先分配的环形缓冲区，不分配内存、不等待网络；
+发送端直接对缓冲区的 memoryview 做 base64 编码，不再复制。缓冲区写满（网络卡住太久）时丢弃新录到的音频并计数，
+录音永远不会阻塞。
+
+音源可以替换：MicSource 从麦克风录音，ArraySource / FileSource 按实时（或加速）的节奏送入内存中的音频或
+音视频文件，用于没有麦克风的环境和测试。
+"""
+
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from config import DictationConfig
+from utils.pcm_cache import load_pcm
+
+SAMPLE_RATE = 16000
+
+
+class RingBuffer:
+    """
+    单生产者、单消费者的 float32 环形缓冲区
+
+    written 和 read 是累计的采样数，只增不减：生产者只修改 written，消费者只修改 read，不需要加锁。
+    """
+
+    def __init__(self, seconds: float = None, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.capacity = int((seconds or DictationConfig.buffer_seconds) * sample_rate)
+        self.buffer = np.zeros(self.capacity, dtype='<f4')
+        self.written = 0
+        self.read = 0
+        self.dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """绑定事件循环，写入后唤醒 wait()"""
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    @property
+    def available(self) -> int:
+        return self.written - self.read
+
+    def write(self, samples: np.ndarray):
+        """生产者：写入采样，空间不足时丢弃放不下的部分"""
+        count = len(samples)
+        free = self.capacity - (self.written - self.read)
+        if count > free:
+            self.dropped += count - free
+            samples, count = samples[:free], free
+        if count:
+            start = self.written % self.capacity
+            first = min(count, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            if first < count:
+                self.buffer[:count - first] = samples[first:]
+            self.written += count
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._event.set)
+            except RuntimeError:
+                pass  # 事件循环已经关闭
+
+    def views(self, end: Optional[int] = None) -> List[memoryview]:
+        """
+        消费者：从 read 到 end（默认为 written）之间的采样，跨越缓冲区末尾时分为两段
+
+        返回按字节的 memoryview，直接指向缓冲区，在 consume 之前生产者不会覆盖它们。
+        """
+        end = self.written if end is None else min(end, self.written)
+        count = end - self.read
+        if count <= 0:
+            return []
+        start = self.read % self.capacity
+        first = min(count, self.capacity - start)
+        views = [memoryview(self.buffer[start:start + first]).cast('B')]
+        if first < count:
+            views.append(memoryview(self.buffer[:count - first]).cast('B'))
+        return views
+
+    def consume(self, count: int):
+        """消费者：标记 count 个采样已经处理，空间交还给生产者"""
+        self.read += count
+
+    def skip(self):
+        """丢弃所有未读的采样"""
+        self.read = self.written
+
+    def wake(self):
+        """在事件循环线程中唤醒 wait()，例如松开快捷键时不必等下一块录音"""
+        if self._event is not None:
+            self._event.set()
+
+    async def wait(self, timeout: float):
+        """等待生产者写入新的采样"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+
+
+class MicSource:
+    """
+    从麦克风录音，sounddevice 在音频线程中调用回调
+    """
+
+    def __init__(self):
+        self.stream = None
+
+    def start(self, ring: RingBuffer):
+        import sounddevice as sd
+
+        def callback(indata, frames, time_info, status):
+            ring.write(indata[:, 0])
+
+        self.stream = sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='float32',
+                                     blocksize=int(DictationConfig.block_seconds * SAMPLE_RATE), callback=callback)
+        self.stream.start()
+        return self.stream
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    @property
+    def finished(self) -> bool:
+        return False
+
+
+class ArraySource:
+    """
+    虚拟音源：在后台线程中按录音回调的节奏把一段音频送入缓冲区
+
+    speed 为 1 时与真实录音同速，大于 1 时加速；指定 duration 时循环播放到该时长，用于测试几个小时的听写。
+    """
+
+    def __init__(self, samples: np.ndarray, speed: float = 1.0, duration: Optional[float] = None):
+        self.samples = np.asarray(samples, dtype='<f4')
+        self.speed = speed
+        self.total = int(duration * SAMPLE_RATE) if duration else len(self.samples)
+        self.position = 0
+        self.max_write = 0.0  # 单次写入的最长耗时（秒），录音回调不应该被阻塞
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, ring: RingBuffer):
+        self._thread = threading.Thread(target=self._run, args=(ring,), daemon=True)
+        self._thread.start()
+
+    def _run(self, ring: RingBuffer):
+        block = int(DictationConfig.block_seconds * SAMPLE_RATE)
+        interval = DictationConfig.block_seconds / self.speed
+        next_time = time.perf_counter()
+        while self.position < self.total and not self._stopped.is_set():
+            offset = self.position % len(self.samples)
+            samples = self.samples[offset:offset + block]
+            if len(samples) < block and self.total > len(self.samples):
+                samples = np.concatenate([samples, self.samples[:block - len(samples)]])
+            start = time.perf_counter()
+            ring.write(samples[:self.total - self.position])
+            self.max_write = max(self.max_write, time.perf_counter() - start)
+            self.position += block
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                self._stopped.wait(delay)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= self.total
+
+
+class FileSource(ArraySource):
+    """
+    虚拟音源：把音视频文件解码为 16kHz 单声道后按实时节奏送入，解码结果来自 pcm_cache，反复播放同一文件不再解码
+    """
+
+    def __init__(self, file: str, speed: float = 1.0):
+        super().__init__(load_pcm(file).samples, speed)
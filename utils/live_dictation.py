@@ -0,0 +1,374 @@
+"""
+实时听写
+
+按住 ClientConfig.shortcut（默认 CapsLock）说话，松开后把识别结果输入到当前窗口：
+1. 音源把采样写入预先分配的环形缓冲区（utils.live_audio），录音回调不等待网络
+2. 按下超过 ClientConfig.threshold 秒后开始一个任务：发送 source 为 mic 的 JSON 消息，带上
+   mic_seg_duration 和 mic_seg_overlap，服务端按此切分出相互重叠的分段并边录边识别；与转录文件相同，
+   音频以 base64 放在每条消息的 data 中，直接编码缓冲区的 memoryview，不另外复制；松开后发送 is_final
+3. 进度消息即时规范化后显示；最终结果经过热词纠正和文本规范化、去掉 trash_punc 末尾标点后粘贴或模拟键入，
+   save_audio 时录音随发送写入 WAV，按识别结果命名
+从松开快捷键（结束说话）到收到最终结果的延迟记为 dictation 事件，并显示最近若干次的中位数和 P95。
+每次听写结束后释放该次的全部状态，连续使用几个小时延迟和内存也保持不变。
+
+用法:
+    python -m utils.live_dictation mic                          # 麦克风听写
+    python -m utils.live_dictation file 录音.wav --session 10     # 不需要麦克风：把文件按每 10 秒一次模拟听写
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import wave
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import typer
+
+from config import ClientConfig as Config, DictationConfig
+from utils import metrics
+from utils.client_ws import Cosmic, check_websocket, console
+from utils.file_manager import clean_filename, ensure_dir_exists
+from utils.hot_words import correct_and_normalize
+from utils.live_audio import SAMPLE_RATE, FileSource, MicSource, RingBuffer
+from utils.text_normalizer import TextNormalizer
+
+DRAIN_TIMEOUT = 60  # 退出前等待未完成的识别结果的最长时间（秒）
+
+
+def get_audio_dir() -> str:
+    return DictationConfig.audio_dir or os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "downloads", "dictation", datetime.now().strftime('%Y-%m-%d'))
+
+
+def type_result(text: str):
+    """把识别结果输入到当前窗口：写入剪贴板后模拟粘贴，或者逐字模拟键入"""
+    import keyboard
+
+    if not Config.paste:
+        keyboard.write(text)
+        return
+    import pyclip
+
+    previous = pyclip.paste() if Config.restore_clip else None
+    pyclip.copy(text)
+    keyboard.send('command+v' if sys.platform == 'darwin' else 'ctrl+v')
+    if previous is not None:
+        time.sleep(0.1)  # 等目标程序读取剪贴板后再恢复
+        pyclip.copy(previous)
+
+
+class _Session:
+    """
+    一次听写：从按下到松开快捷键
+    """
+
+    def __init__(self, start_sample: int):
+        self.task_id = str(uuid.uuid1())
+        self.start_sample = start_sample
+        self.end_sample: Optional[int] = None  # 松开时缓冲区的写入位置
+        self.time_start = time.time()
+        self.pressed = time.perf_counter()
+        self.released: Optional[float] = None  # 结束说话的时间
+        self.started = False  # 是否已经发送了开始消息
+        self.samples = 0  # 已发送的采样数
+        self.normalizer = TextNormalizer()
+        self.audio_file: Optional[Path] = None
+        self.wav: Optional[wave.Wave_write] = None
+
+    def message(self, is_final: bool, data=b'') -> str:
+        return json.dumps({
+            'task_id': self.task_id,  # 任务 ID
+            'seg_duration': Config.mic_seg_duration,  # 分段长度
+            'seg_overlap': Config.mic_seg_overlap,  # 分段重叠
+            'is_final': is_final,  # 是否结束
+            'time_start': self.time_start,  # 录音起始时间
+            'time_frame': time.time(),  # 该帧时间
+            'source': 'mic',  # 数据来源：麦克风
+            'data': base64.b64encode(data).decode('utf-8'),  # 16kHz 单声道 float32 音频
+        })
+
+    def open_audio(self):
+        folder = get_audio_dir()
+        ensure_dir_exists(folder)
+        self.audio_file = Path(folder) / f"{datetime.now().strftime('%H%M%S')}_{self.task_id[:8]}.wav"
+        self.wav = wave.open(str(self.audio_file), 'wb')
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(SAMPLE_RATE)
+
+    def write_audio(self, view: memoryview):
+        samples = np.frombuffer(view, dtype='<f4')
+        self.wav.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+    def close_audio(self, text: str = ''):
+        """关闭录音文件，文件名加上识别结果的开头"""
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+        if self.audio_file is not None and text:
+            name = clean_filename(text[:Config.audio_name_len]).strip()
+            if name:
+                target = self.audio_file.with_name(f"{self.audio_file.stem}_{name}.wav")
+                os.replace(self.audio_file, target)
+                self.audio_file = target
+
+
+class LiveDictation:
+    """
+    实时听写的发送和接收，所有状态只在事件循环线程中修改；快捷键线程通过 press / release 通知
+    """
+
+    def __init__(self, source, output: Optional[Callable[[str], None]] = None, save_audio: Optional[bool] = None,
+                 threshold: Optional[float] = None):
+        """
+        Args:
+            source: 音源，MicSource、ArraySource 或 FileSource
+            output: 处理最终识别结果的函数，默认输入到当前窗口
+            save_audio: 是否保存录音，默认取 ClientConfig.save_audio
+            threshold: 按住多久才开始识别，默认取 ClientConfig.threshold
+        """
+        self.source = source
+        self.output = output or type_result
+        self.save_audio = Config.save_audio if save_audio is None else save_audio
+        self.threshold = Config.threshold if threshold is None else threshold
+        self.ring = RingBuffer()
+        self.current: Optional[_Session] = None
+        self.pending: Dict[str, _Session] = {}  # 已经发送、等待最终结果的听写
+        self.latencies = deque(maxlen=DictationConfig.latency_window)
+        self.results = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+
+    def begin(self):
+        """开始说话：丢弃之前的录音，从当前位置开始一次听写"""
+        if self.current is not None:
+            return
+        self.ring.skip()
+        self.current = _Session(self.ring.written)
+        Cosmic.on = True
+
+    def end(self):
+        """结束说话；按下时间短于 threshold 时当作普通按键，不识别"""
+        session = self.current
+        if session is None or session.end_sample is not None:
+            return
+        session.end_sample = self.ring.written
+        session.released = time.perf_counter()
+        Cosmic.on = False
+        if not session.started and session.released - session.pressed < self.threshold:
+            self.current = None
+            self.ring.skip()
+        self.ring.wake()
+
+    def press(self):
+        self.loop.call_soon_threadsafe(self.begin)
+
+    def release(self):
+        self.loop.call_soon_threadsafe(self.end)
+
+    def latency_summary(self) -> Tuple[float, float]:
+        """最近若干次结束说话到出字延迟的中位数和 P95（秒）"""
+        if not self.latencies:
+            return 0.0, 0.0
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2], ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    async def _send_loop(self, websocket):
+        """把当前听写的录音发送给服务端；没有在听写时丢弃录音"""
+        while self._running:
+            await self.ring.wait(DictationConfig.block_seconds * 4)
+            session = self.current
+            if session is None:
+                self.ring.skip()
+                continue
+            if not session.started:
+                if session.end_sample is None and time.perf_counter() - session.pressed < self.threshold:
+                    continue
+                await websocket.send(session.message(False))
+                session.started = True
+                self.pending[session.task_id] = session
+                if self.save_audio:
+                    session.open_audio()
+            for view in self.ring.views(session.end_sample):
+                await websocket.send(session.message(False, view))
+                if session.wav is not None:
+                    session.write_audio(view)
+                count = len(view) // 4
+                self.ring.consume(count)
+                session.samples += count
+            if session.end_sample is not None and self.ring.read >= session.end_sample:
+                await websocket.send(session.message(True))
+                if session.wav is not None:
+                    session.wav.close()
+                    session.wav = None
+                self.current = None
+
+    async def _recv_loop(self, websocket):
+        async for message in websocket:
+            message = json.loads(message)
+            session = self.pending.get(message.get('task_id'))
+            if session is None:
+                continue
+            if not message['is_final']:
+                if message.get('tokens'):
+                    preview = session.normalizer.feed(message['tokens'], message['timestamps'], message.get('text'))
+                    if preview:
+                        console.print(preview, end='')
+                continue
+            del self.pending[session.task_id]
+            await self._finish(session, message)
+
+    async def _finish(self, session: _Session, message: dict):
+        latency = time.perf_counter() - session.released
+        text = correct_and_normalize(message['text'], message['tokens'], message['timestamps']).text
+        text = text.strip().rstrip(Config.trash_punc)
+        self.latencies.append(latency)
+        self.results += 1
+        audio_seconds = session.samples / SAMPLE_RATE
+        metrics.record('dictation', None, latency, audio_seconds=audio_seconds, chars=len(text),
+                       dropped=self.ring.dropped)
+        if text:
+            await self.loop.run_in_executor(None, self.output, text)
+        session.close_audio(text)
+        median, p95 = self.latency_summary()
+        console.print(f'\033[K    {text}\n    录音 {audio_seconds:.1f}s，出字延迟 {latency * 1000:.0f}ms'
+                      f'（最近 {len(self.latencies)} 次中位数 {median * 1000:.0f}ms，P95 {p95 * 1000:.0f}ms）')
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT):
+        """等待当前的听写发送完毕、所有结果返回"""
+        deadline = time.perf_counter() + timeout
+        while (self.current is not None or self.pending) and time.perf_counter() < deadline:
+            await asyncio.sleep(DictationConfig.block_seconds)
+
+    async def run(self, script: Optional[Callable[['LiveDictation'], Awaitable[None]]] = None):
+        """
+        连接服务端并开始录音，直到 script 结束（没有 script 时一直运行到被中断）
+
+        Args:
+            script: 驱动听写的协程函数，用于没有快捷键的场景，如按文件模拟听写
+        """
+        self.loop = Cosmic.loop = asyncio.get_running_loop()
+        self.ring.attach(self.loop)
+        if not await check_websocket():
+            console.print('无法连接到服务端！！！！')
+            return
+        websocket = Cosmic.websocket
+        Cosmic.stream = self.source.start(self.ring)
+        self._running = True
+        tasks = [asyncio.create_task(self._send_loop(websocket)), asyncio.create_task(self._recv_loop(websocket))]
+        try:
+            if script is not None:
+                await script(self)
+                await self.drain()
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            self._running = False
+            self.source.stop()
+            Cosmic.stream = None
+            for task in tasks:
+                task.cancel()
+            if self.ring.dropped:
+                console.print(f'网络阻塞期间丢弃了 {self.ring.dropped / SAMPLE_RATE:.1f}s 录音')
+
+
+def bind_shortcut(dictation: LiveDictation):
+    """
+    绑定快捷键：长按模式按下开始、松开结束；单击模式单击开始、再次单击结束
+    """
+    import keyboard
+
+    state = {'pressed': None, 'restoring': False}
+
+    def restore():
+        # 再按一次快捷键，恢复 CapsLock 等按键原来的状态
+        state['restoring'] = True
+        keyboard.send(Config.shortcut)
+
+    def handler(event):
+        if state['restoring']:
+            if event.event_type == keyboard.KEY_UP:
+                state['restoring'] = False
+            return
+        if event.event_type == keyboard.KEY_DOWN:
+            if state['pressed'] is not None:
+                return  # 按住时的重复事件
+            state['pressed'] = time.perf_counter()
+            if Config.hold_mode:
+                dictation.press()
+            return
+        if state['pressed'] is None:
+            return
+        held = time.perf_counter() - state['pressed']
+        state['pressed'] = None
+        if Config.hold_mode:
+            dictation.release()
+            if Config.restore_key and not Config.suppress and held >= Config.threshold:
+                threading.Thread(target=restore, daemon=True).start()
+        elif held < Config.threshold:
+            # 单击模式：短按切换，长按保留按键原本的功能
+            if dictation.current is None:
+                dictation.press()
+            else:
+                dictation.release()
+
+    keyboard.hook_key(Config.shortcut, handler, suppress=Config.suppress)
+
+
+def play_sessions(session_seconds: float, gap_seconds: float):
+    """按音源的时间每 session_seconds 秒模拟一次听写，之间停顿 gap_seconds 秒，直到音源结束"""
+    async def script(dictation: LiveDictation):
+        ring, source = dictation.ring, dictation.source
+        while not source.finished:
+            for seconds, action in ((session_seconds, dictation.begin), (gap_seconds, dictation.end)):
+                action()
+                target = ring.written + int(seconds * SAMPLE_RATE)
+                while ring.written < target and not source.finished:
+                    await asyncio.sleep(DictationConfig.block_seconds / 10)
+        dictation.end()
+
+    return script
+
+
+app = typer.Typer()
+
+
+@app.command()
+def mic():
+    """麦克风听写，按住快捷键说话"""
+    dictation = LiveDictation(MicSource())
+
+    async def run():
+        dictation.loop = asyncio.get_running_loop()
+        bind_shortcut(dictation)
+        console.print(f'按住 {Config.shortcut} 开始说话' if Config.hold_mode else f'单击 {Config.shortcut} 开始和结束说话')
+        await dictation.run()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def file(path: Path, session: float = typer.Option(10, help='每次听写的时长（秒）'),
+         gap: float = typer.Option(2, help='两次听写之间的停顿（秒）'),
+         speed: float = typer.Option(1.0, help='送入音频的速度，1 为实时')):
+    """不需要麦克风：把音视频文件按实时节奏送入，模拟连续的听写，识别结果输出到终端"""
+    dictation = LiveDictation(FileSource(str(path), speed), output=print, threshold=0)
+    asyncio.run(dictation.run(play_sessions(session, gap)))
+    median, p95 = dictation.latency_summary()
+    console.print(f'共 {dictation.results} 次听写，出字延迟中位数 {median * 1000:.0f}ms，P95 {p95 * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    app()
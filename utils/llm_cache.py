@@ -0,0 +1,134 @@
+"""
+AI 接口响应的磁盘缓存
+
+以 (接口地址, 模型, temperature, max_tokens, system prompt, user prompt) 的哈希为键，
+重复处理同一个视频或重跑任务时直接返回上次的结果，不再调用接口。
+缓存按条目存放在 downloads/llm-cache 下，超过有效期或总大小超过上限时淘汰最久未用的条目。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from utils.file_manager import ensure_dir_exists
+
+
+def get_cache_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "llm-cache")
+
+
+def make_cache_key(endpoint: str, model: str, temperature: float, max_tokens: Optional[int],
+                   system_prompt: str, prompt: str) -> str:
+    """计算缓存键，所有影响输出的参数都参与哈希"""
+    raw = json.dumps([endpoint, model, temperature, max_tokens, system_prompt, prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    AI 响应的磁盘缓存，线程安全
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_age_days: float = 30, max_size_mb: float = 200):
+        """
+        Args:
+            cache_dir: 缓存目录，如果为None则使用 downloads/llm-cache
+            max_age_days: 条目有效期（天），0 表示不过期
+            max_size_mb: 缓存总大小上限（MB），0 表示不限制
+        """
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.max_age = max_age_days * 86400
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if self.max_age and time.time() - entry['created'] > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            # 更新访问时间，供 LRU 淘汰使用
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry['response']
+
+    def put(self, key: str, response: str):
+        """写入缓存，写入后按需淘汰"""
+        path = self._path(key)
+        ensure_dir_exists(os.path.dirname(path))
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'response': response}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        # 淘汰需要遍历目录，最多每分钟执行一次
+        if time.time() - self._last_evict > 60:
+            self.evict()
+
+    def evict(self):
+        """删除长期未访问的条目，并在总大小超限时按最近访问时间从旧到新删除"""
+        now = time.time()
+        self._last_evict = now
+        if not os.path.exists(self.cache_dir):
+            return
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.json') and self.max_age and now - stat.st_mtime > self.max_age:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        # 其他进程已经删除
+                        pass
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if not self.max_size or total <= self.max_size:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"缓存命中 {self.hits} 次，未命中 {self.misses} 次，命中率 {rate:.1f}%"
+
+
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_shared_cache(max_age_days: float = 30, max_size_mb: float = 200) -> ResponseCache:
+    """获取进程内共享的缓存实例，使命中统计在多个视频之间累计"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResponseCache(max_age_days=max_age_days, max_size_mb=max_size_mb)
+    return _shared_cache
@@ -0,0 +1,212 @@
+"""
+AI 接口的共享 HTTP 客户端
+
+所有请求共用一个 requests.Session 连接池（keep-alive），由后台线程中的事件循环统一调度：
+- 信号量限制同时在途的请求数
+- 令牌桶限制每分钟的请求数
+- 遇到 429/5xx 或连接错误时按指数退避加随机抖动重试，并遵守服务端的 Retry-After
+
+异步代码直接 await LLMClient.post，同步代码（如 AISummarizer）调用 LLMClient.post_sync，
+两者共享同一组并发和速率限制。
+"""
+
+import asyncio
+import email.utils
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    令牌桶限速器，只能在同一个事件循环中使用
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数，0 表示不限速
+            capacity: 桶容量，即允许的突发请求数，默认等于每秒速率（至少为1）
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """
+    带连接池、并发限制、限速和重试的异步 HTTP 客户端
+    """
+
+    def __init__(self, max_in_flight: int = 8, rate_per_minute: float = 0, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0):
+        """
+        Args:
+            max_in_flight: 同时在途的最大请求数
+            rate_per_minute: 每分钟最大请求数，0 表示不限速
+            max_retries: 单个请求的最大重试次数
+            backoff_base: 退避的基础时长（秒）
+            backoff_max: 单次退避的最长时长（秒）
+        """
+        self.max_in_flight = max_in_flight
+        self.rate_per_minute = rate_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # 所有请求都在后台线程的事件循环中调度，信号量和令牌桶只在该循环中使用
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._bucket = TokenBucket(rate_per_minute)
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='llm-io'))
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True)
+        self._thread.start()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # full jitter：在 [0, base * 2^attempt] 内随机，避免多个请求同时重试
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _release_on_close(self, response: requests.Response):
+        """流式响应在读完之前一直占用并发名额，调用 close() 时才归还"""
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            if not released:
+                released = True
+                self._loop.call_soon_threadsafe(self._semaphore.release)
+            close()
+
+        response.close = close_and_release
+
+    async def _post(self, url: str, headers: Dict[str, str], payload: Any, timeout: float,
+                    max_retries: int, stream: bool) -> requests.Response:
+        attempt = 0
+        while True:
+            retry_after = None
+            await self._semaphore.acquire()
+            hold = False
+            try:
+                await self._bucket.acquire()
+                try:
+                    response = await self._loop.run_in_executor(None, functools.partial(
+                        self.session.post, url, headers=headers, json=payload, timeout=timeout, stream=stream
+                    ))
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= max_retries:
+                        raise
+                    print(f"请求出错（{type(e).__name__}），准备重试")
+                else:
+                    if response.status_code not in RETRY_STATUS or attempt >= max_retries:
+                        if stream and response.status_code == 200:
+                            self._release_on_close(response)
+                            hold = True
+                        elif stream:
+                            # 错误响应不会按流读取，先读完（很短的）响应体，连接回到连接池，立即归还名额，
+                            # 调用方不关闭响应也不会占住名额，仍可读取 response.text
+                            await self._loop.run_in_executor(None, lambda: response.content)
+                        return response
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    print(f"请求返回 {response.status_code}，准备重试")
+                    response.close()
+            finally:
+                if not hold:
+                    self._semaphore.release()
+            # 退避时不占用并发名额
+            delay = self._backoff(attempt, retry_after)
+            attempt += 1
+            print(f"第{attempt}次重试，等待 {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def post(self, url: str, headers: Dict[str, str], payload: Any, timeout: float = 120,
+                   max_retries: Optional[int] = None, stream: bool = False) -> requests.Response:
+        """
+        异步发送 POST 请求，可在任意事件循环中 await
+
+        Args:
+            url: 请求地址
+            headers: 请求头
+            payload: JSON 请求体
+            timeout: 单次请求的超时时间（秒）
+            max_retries: 最大重试次数，如果为None则使用客户端的默认值
+            stream: 是否流式读取响应体，状态码为 200 的流式响应在调用 close() 之前一直占用并发名额
+
+        Returns:
+            最后一次请求的响应，重试耗尽时返回最后的错误响应
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        coro = self._post(url, headers, payload, timeout, retries, stream)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def post_sync(self, url: str, headers: Dict[str, str], payload: Any, timeout: float = 120,
+                  max_retries: Optional[int] = None, stream: bool = False) -> requests.Response:
+        """post 的同步版本，参数同 post，可在任意线程中调用"""
+        retries = self.max_retries if max_retries is None else max_retries
+        coro = self._post(url, headers, payload, timeout, retries, stream)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self.session.close()
+
+
+_shared_client: Optional[LLMClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client(**kwargs) -> LLMClient:
+    """获取进程内共享的客户端，首次调用时的参数生效"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient(**kwargs)
+    return _shared_client
@@ -0,0 +1,258 @@
+"""
+内存管理
+
+长时间运行的批处理进程中，解码、上传等阶段会一次性申请几百 MB 的缓冲区，释放后 glibc 往往不会把内存还给系统，
+进程的常驻内存（RSS）只增不减。这里提供：
+1. 跨平台的当前/峰值 RSS 采样：Linux 读 /proc，Windows 调用 GetProcessMemoryInfo，其他平台使用 psutil 或 resource
+2. 按阶段统计内存：后台线程定期采样，记录每个阶段的起始、峰值和结束 RSS，写入 utils.metrics 的 memory 事件
+3. 内存预算与背压：RSS 超过 MemoryConfig.budget_mb 时，新的下载、解码、上传先释放内存并等待，降到预算以下再继续
+4. 大阶段结束后释放堆内存：gc.collect()，Linux 上调用 malloc_trim，Windows 上清空工作集
+
+用法:
+    python -m utils.memory_governor report     # 按任务汇总峰值内存
+"""
+
+import asyncio
+import ctypes
+import gc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import typer
+
+from config import MemoryConfig
+from utils import metrics
+
+MB = 1024 * 1024
+
+_libc = None
+_governor: Optional['MemoryGovernor'] = None
+_governor_lock = threading.Lock()
+
+
+def _load_libc():
+    """加载 glibc，非 glibc 平台（musl、macOS、Windows）返回None"""
+    global _libc
+    if _libc is None and sys.platform.startswith('linux'):
+        try:
+            libc = ctypes.CDLL('libc.so.6')
+            _libc = libc if hasattr(libc, 'malloc_trim') else False
+        except OSError:
+            _libc = False
+    return _libc or None
+
+
+def _windows_memory_counters():
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+    return counters
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节）"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if sys.platform == 'win32':
+        return _windows_memory_counters().WorkingSetSize
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """当前进程启动以来的峰值常驻内存（字节）"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    if sys.platform == 'win32':
+        return _windows_memory_counters().PeakWorkingSetSize
+    import resource
+    # macOS 上 ru_maxrss 的单位是字节，其他系统是 KB
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def empty_working_set():
+    """Windows：把当前进程的工作集换出，立即降低 RSS"""
+    handle = ctypes.windll.kernel32.OpenProcess(0x1F0FFF, False, ctypes.windll.kernel32.GetCurrentProcessId())
+    ctypes.windll.psapi.EmptyWorkingSet(handle)
+    ctypes.windll.kernel32.CloseHandle(handle)
+
+
+def release_memory() -> int:
+    """
+    回收 Python 垃圾并把空闲的堆内存还给系统
+
+    Returns:
+        释放的常驻内存（字节），可能为负
+    """
+    before = current_rss()
+    gc.collect()
+    libc = _load_libc()
+    if libc:
+        libc.malloc_trim(0)
+    elif sys.platform == 'win32':
+        empty_working_set()
+    return before - current_rss()
+
+
+class MemoryGovernor:
+    """
+    按阶段采样内存并施加背压，所有线程共享一个实例
+    """
+
+    def __init__(self, budget_mb: float = MemoryConfig.budget_mb, sample_interval: float = MemoryConfig.sample_interval):
+        """
+        Args:
+            budget_mb: 常驻内存预算（MB），0 表示不限制
+            sample_interval: 后台采样间隔（秒）
+        """
+        self.budget = budget_mb * MB
+        self.sample_interval = sample_interval
+        self.lock = threading.Lock()
+        self.current = current_rss()
+        self.stage_peaks: Dict[int, int] = {}  # 进行中的阶段 -> 峰值
+        self.job_peaks: Dict[str, int] = {}  # 任务 -> 各阶段的最大峰值，报告任务的峰值后删除
+        self._next_id = 0
+        self._sampler: Optional[threading.Thread] = None
+
+        # 限制 glibc 的 malloc arena 数量，多线程下减少碎片
+        libc = _load_libc()
+        if libc and MemoryConfig.malloc_arena_max:
+            libc.mallopt(-8, MemoryConfig.malloc_arena_max)  # M_ARENA_MAX
+
+    def _ensure_sampler(self):
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name='memory-sampler', daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            self.sample()
+            time.sleep(self.sample_interval)
+
+    def sample(self) -> int:
+        """采样当前 RSS 并更新进行中阶段的峰值"""
+        rss = current_rss()
+        with self.lock:
+            self.current = rss
+            for stage_id, peak in self.stage_peaks.items():
+                if rss > peak:
+                    self.stage_peaks[stage_id] = rss
+        return rss
+
+    @contextmanager
+    def stage(self, name: str, job: Optional[str] = None, release: bool = False) -> Iterator[None]:
+        """
+        统计一个阶段的内存，退出时记录 memory 事件
+
+        Args:
+            name: 阶段名称
+            job: 任务编号，如果为None则使用 metrics.job_scope 设置的任务
+            release: 阶段结束后内存增长超过 MemoryConfig.release_threshold_mb 时是否释放堆内存
+        """
+        self._ensure_sampler()
+        start = self.sample()
+        with self.lock:
+            stage_id = self._next_id
+            self._next_id += 1
+            self.stage_peaks[stage_id] = start
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = self.sample()
+            with self.lock:
+                peak = self.stage_peaks.pop(stage_id)
+            released = 0
+            if release and peak - start > MemoryConfig.release_threshold_mb * MB:
+                released = release_memory()
+                end = self.sample()
+            job = job or metrics.current_job()
+            if job:
+                with self.lock:
+                    self.job_peaks[job] = max(self.job_peaks.get(job, 0), peak)
+            metrics.record('memory', job, time.perf_counter() - begin, stage_name=name,
+                           rss_start_mb=start / MB, rss_peak_mb=peak / MB, rss_end_mb=end / MB,
+                           released_mb=released / MB)
+
+    def _over_budget(self) -> bool:
+        return bool(self.budget) and self.sample() > self.budget
+
+    def wait_for_headroom(self, name: str):
+        """
+        RSS 超过预算时先释放内存，仍然超出则等待其他阶段结束，降到预算的 resume_ratio 以下再继续；
+        最多等待 MemoryConfig.max_wait 秒，避免内存无法回落时永久阻塞
+        """
+        if not self._over_budget():
+            return
+        release_memory()
+        if not self._over_budget():
+            return
+        print(f"内存 {self.current / MB:.0f}MB 超过预算 {self.budget / MB:.0f}MB，暂停{name}")
+        start = time.monotonic()
+        while self.sample() > self.budget * MemoryConfig.resume_ratio:
+            if time.monotonic() - start > MemoryConfig.max_wait:
+                print(f"等待内存回落超过 {MemoryConfig.max_wait}s，继续{name}")
+                break
+            time.sleep(self.sample_interval)
+            release_memory()
+        metrics.record('backpressure', None, time.monotonic() - start, stage_name=name, rss_mb=self.current / MB)
+
+    async def wait_for_headroom_async(self, name: str):
+        """异步版本，在事件循环中等待时不阻塞其他协程"""
+        if not self._over_budget():
+            return
+        await asyncio.to_thread(self.wait_for_headroom, name)
+
+
+def get_governor() -> MemoryGovernor:
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = MemoryGovernor()
+        return _governor
+
+
+app = typer.Typer()
+
+
+@app.command()
+def report(events_file: str = typer.Option(None, help='事件文件，默认为 downloads/metrics.jsonl')):
+    """按任务汇总各阶段的峰值内存"""
+    jobs: Dict[str, Dict[str, float]] = {}
+    for event in metrics.read_events(events_file):
+        if event.get('stage') == 'memory' and event.get('job'):
+            stages = jobs.setdefault(event['job'], {})
+            stages[event['stage_name']] = max(stages.get(event['stage_name'], 0), event.get('rss_peak_mb', 0))
+    for job, stages in sorted(jobs.items(), key=lambda item: -max(item[1].values())):
+        detail = ' '.join(f"{name}={peak:.0f}" for name, peak in stages.items())
+        print(f"{max(stages.values()):>8.0f}MB  {job}  {detail}")
+
+
+@app.command()
+def status():
+    """打印当前进程的内存信息"""
+    print(f"当前 RSS {current_rss() / MB:.1f}MB，峰值 {peak_rss() / MB:.1f}MB，释放 {release_memory() / MB:.1f}MB")
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,240 @@
+"""
+分阶段性能指标
+
+每个任务的每个阶段（下载、解码、上传、识别、对齐、AI总结等）记录一条 JSON-lines 事件：
+耗时、处理的字节数、速率以及各阶段特有的字段（音频时长、实时率、输入输出 token 数等），
+追加写入 downloads/metrics.jsonl，用于定位瓶颈和规划识别、大模型两端的容量。
+
+配置了 MetricsConfig.prometheus_textfile 时，进程退出前会把事件汇总为 Prometheus textfile，
+供 node_exporter 的 textfile collector 采集。
+
+用法:
+    python -m utils.metrics report               # 按阶段汇总耗时分位数和速率
+    python -m utils.metrics export out.prom      # 导出 Prometheus textfile
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import typer
+
+from config import MetricsConfig
+
+# 按阶段累加并导出为 Prometheus 计数器的数值字段
+SUM_FIELDS = ('bytes', 'audio_seconds', 'input_tokens', 'output_tokens')
+QUANTILES = (0.5, 0.9, 0.99)
+_JOB_SUFFIXES = ('.main.txt', '.merge.txt', '.final.md', '.audio_urls.json', '.tokens.bin', '.parts.json')
+
+_current_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('metrics_job', default=None)
+_lock = threading.Lock()
+_export_registered = False
+
+
+def get_events_file() -> str:
+    return MetricsConfig.events_file or os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "downloads", "metrics.jsonl")
+
+
+def job_id(path: Union[str, Path]) -> str:
+    """任务编号：去掉产物后缀的文件名，同一任务的音频、字幕和总结得到相同的编号"""
+    name = Path(path).name
+    for suffix in _JOB_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(name).stem
+
+
+def current_job() -> Optional[str]:
+    return _current_job.get()
+
+
+@contextmanager
+def job_scope(job: str):
+    """在此范围内（包括 copy_context 传递到的线程）记录的事件默认归属该任务"""
+    token = _current_job.set(job)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+
+def record(stage: str, job: Optional[str] = None, seconds: Optional[float] = None,
+           bytes: Optional[int] = None, **fields):
+    """
+    记录一条事件
+
+    Args:
+        stage: 阶段名称
+        job: 任务编号，如果为None则使用 job_scope 设置的任务
+        seconds: 耗时（秒）
+        bytes: 处理的字节数，与 seconds 一起计算 bytes_per_second
+        **fields: 阶段特有的字段
+    """
+    if not MetricsConfig.enabled:
+        return
+    event = {'time': round(time.time(), 3), 'job': job or _current_job.get(), 'stage': stage}
+    if seconds is not None:
+        event['seconds'] = round(seconds, 4)
+    if bytes is not None:
+        event['bytes'] = bytes
+        if seconds:
+            event['bytes_per_second'] = round(bytes / seconds, 1)
+    event.update({key: round(value, 4) if isinstance(value, float) else value for key, value in fields.items()})
+    line = json.dumps(event, ensure_ascii=False) + '\n'
+
+    global _export_registered
+    events_file = get_events_file()
+    try:
+        with _lock:
+            os.makedirs(os.path.dirname(events_file), exist_ok=True)
+            with open(events_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+            if MetricsConfig.prometheus_textfile and not _export_registered:
+                atexit.register(export_textfile)
+                _export_registered = True
+    except OSError as e:
+        print(f"写入指标 {events_file} 时出错: {e}")
+
+
+@contextmanager
+def stage(name: str, job: Optional[str] = None, **fields) -> Iterator[dict]:
+    """
+    计时一个阶段，退出时记录事件；块内可以往返回的字典里补充 bytes 等字段，出错时记录 status=error
+
+        with metrics.stage('align', job) as m:
+            ...
+            m['lines'] = len(lines)
+    """
+    start = time.perf_counter()
+    extra = dict(fields)
+    try:
+        yield extra
+    except BaseException:
+        extra['status'] = 'error'
+        raise
+    finally:
+        extra.setdefault('status', 'ok')
+        record(name, job, time.perf_counter() - start, **extra)
+
+
+def read_events(events_file: Optional[str] = None) -> Iterator[dict]:
+    try:
+        with open(events_file or get_events_file(), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def _quantile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def summarize(events: Iterator[dict]) -> Dict[str, dict]:
+    """按阶段汇总：次数、出错次数、耗时列表和各累加字段的总和"""
+    stages: Dict[str, dict] = {}
+    for event in events:
+        summary = stages.setdefault(event.get('stage', 'unknown'),
+                                    {'runs': 0, 'errors': 0, 'seconds': [], 'sums': dict.fromkeys(SUM_FIELDS, 0)})
+        summary['runs'] += 1
+        if event.get('status') == 'error':
+            summary['errors'] += 1
+        if isinstance(event.get('seconds'), (int, float)):
+            summary['seconds'].append(event['seconds'])
+        for field in SUM_FIELDS:
+            if isinstance(event.get(field), (int, float)):
+                summary['sums'][field] += event[field]
+    return stages
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(stages: Dict[str, dict]) -> str:
+    """把汇总结果转换为 Prometheus 文本格式"""
+    out = [
+        '# HELP vidsummarize_stage_runs_total Number of recorded stage runs.',
+        '# TYPE vidsummarize_stage_runs_total counter',
+    ]
+    for name, summary in sorted(stages.items()):
+        label = _escape_label(name)
+        out.append(f'vidsummarize_stage_runs_total{{stage="{label}",status="ok"}} {summary["runs"] - summary["errors"]}')
+        out.append(f'vidsummarize_stage_runs_total{{stage="{label}",status="error"}} {summary["errors"]}')
+    out += ['# HELP vidsummarize_stage_seconds Wall time per stage run.', '# TYPE vidsummarize_stage_seconds summary']
+    for name, summary in sorted(stages.items()):
+        label = _escape_label(name)
+        for q in QUANTILES:
+            out.append(f'vidsummarize_stage_seconds{{stage="{label}",quantile="{q}"}} '
+                       f'{_quantile(summary["seconds"], q):.6g}')
+        out.append(f'vidsummarize_stage_seconds_sum{{stage="{label}"}} {sum(summary["seconds"]):.6g}')
+        out.append(f'vidsummarize_stage_seconds_count{{stage="{label}"}} {len(summary["seconds"])}')
+    for field in SUM_FIELDS:
+        metric = f'vidsummarize_stage_{field}_total'
+        out += [f'# HELP {metric} Total {field.replace("_", " ")} processed per stage.', f'# TYPE {metric} counter']
+        for name, summary in sorted(stages.items()):
+            if summary['sums'][field]:
+                out.append(f'{metric}{{stage="{_escape_label(name)}"}} {summary["sums"][field]:.6g}')
+    return '\n'.join(out) + '\n'
+
+
+def export_textfile(path: Optional[str] = None, events_file: Optional[str] = None):
+    """汇总事件文件并原子地写出 Prometheus textfile"""
+    path = path or MetricsConfig.prometheus_textfile
+    if not path:
+        return
+    text = prometheus_text(summarize(read_events(events_file)))
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_file, path)
+    except OSError as e:
+        print(f"导出 Prometheus 指标到 {path} 时出错: {e}")
+
+
+app = typer.Typer()
+
+
+@app.command()
+def report(events_file: str = typer.Option(None, help='事件文件，默认为 downloads/metrics.jsonl')):
+    """按阶段汇总耗时分位数、吞吐量和 token 数"""
+    stages = summarize(read_events(events_file))
+    print(f"{'阶段':<10}{'次数':>6}{'出错':>6}{'p50(s)':>10}{'p90(s)':>10}{'总耗时(s)':>12}{'MB/s':>10}  其他")
+    for name, summary in sorted(stages.items(), key=lambda item: -sum(item[1]['seconds'])):
+        seconds = summary['seconds']
+        total = sum(seconds)
+        rate = summary['sums']['bytes'] / total / 1024 / 1024 if total and summary['sums']['bytes'] else 0
+        others = ' '.join(f"{field}={value:.0f}" for field, value in summary['sums'].items()
+                          if value and field != 'bytes')
+        if summary['sums']['audio_seconds'] and total:
+            others += f" rtf={total / summary['sums']['audio_seconds']:.3f}"
+        print(f"{name:<12}{summary['runs']:>6}{summary['errors']:>6}{_quantile(seconds, 0.5):>10.2f}"
+              f"{_quantile(seconds, 0.9):>10.2f}{total:>12.1f}{rate:>10.2f}  {others}")
+
+
+@app.command()
+def export(path: str = typer.Argument(None, help='输出文件，默认为 MetricsConfig.prometheus_textfile'),
+           events_file: str = typer.Option(None, help='事件文件，默认为 downloads/metrics.jsonl')):
+    """导出 Prometheus textfile"""
+    path = path or MetricsConfig.prometheus_textfile
+    if not path:
+        print('请指定输出文件')
+        raise typer.Exit(1)
+    export_textfile(path, events_file)
+    print(f'已导出到 {path}')
+
+
+if __name__ == '__main__':
+    app()
@@ -20,13 +20,18 @@ from collections import deque
 from dataclasses import dataclass
 from datetime import timedelta
 from pathlib import Path
-from typing import List, Optional, Dict, Union, NamedTuple
+from typing import List, Optional, Dict, Union, NamedTuple, Sequence
 
 import srt
 import typer
 from rich import print
 
+from utils import metrics
 from utils.ai_summarizer import summarize_video
+from utils.memory_governor import get_governor
+from utils.search_index import index_main_txt
+from utils.semantic_index import index_main_txt as index_semantic
+from utils.token_store import TokenWords, tokens_file_for
 
 
 class Config(NamedTuple):
@@ -83,7 +88,9 @@ def get_scout(line, words, cursor, config: Config = config):
                 current_cursor += 1
                 tolerance = config.tolerance
             else:
-                if words[current_cursor]['word'] not in '零一二三四五六七八九十百千万幺两点时分秒之':
+                # 数字（中文数字或规范化后的阿拉伯数字）在分行稿中可能写法不同，不计入失配
+                word = words[current_cursor]['word']
+                if word not in '零一二三四五六七八九十百千万幺两点时分秒之' and not word[:1].isdigit():
                     tolerance -= 1
                     scout.miss += 1
                 current_cursor += 1
@@ -102,6 +109,33 @@ def get_scout(line, words, cursor, config: Config = config):
     return max(scout_list, key=lambda x: x.score) if scout_list else None
 
 
+# 匹配时忽略的标点和空白，与 lines_match_words 中清理分行稿的正则一致
+_ignored_chars = str.maketrans('', '', ',.?，。？、 \t\r\n')
+
+
+def match_exact(line: str, words: Sequence[Dict[str, Union[str, float]]], cursor: int) -> Optional[int]:
+    """
+    分行稿的一行正好是从 cursor 开始的连续若干个词时（未经手动修改的转录结果），返回这些词之后的位置
+
+    Args:
+        line: 分行稿的一行
+        words: 单词信息列表
+        cursor: 起始位置
+
+    Returns:
+        匹配的最后一个词的下一个位置，不能逐词对上时返回None
+    """
+    remaining = line.lower().translate(_ignored_chars)
+    probe = cursor
+    while remaining and probe < len(words):
+        word = words[probe]['word'].lower().translate(_ignored_chars)
+        if not remaining.startswith(word):
+            return None
+        remaining = remaining[len(word):]
+        probe += 1
+    return probe if not remaining and probe > cursor else None
+
+
 def lines_match_words(text_lines: List[str], words: List[Dict[str, Union[str, float]]],
                       match_config: Config = config) -> \
         tuple[List[srt.Subtitle], List[str]]:
@@ -131,6 +165,17 @@ def lines_match_words(text_lines: List[str], words: List[Dict[str, Union[str, fl
         if not line.strip():
             continue
 
+        # 与接下来的词逐字一致时直接取这些词的时间，不必侦察
+        probe = match_exact(line, words, cursor)
+        if probe is not None:
+            subtitle_list.append(srt.Subtitle(index=index,
+                                              content=line,
+                                              start=timedelta(seconds=words[cursor]['start']),
+                                              end=timedelta(seconds=words[probe - 1]['end'])))
+            main_txt_content.append(f"{int(words[cursor]['start'])} {line}")
+            cursor = probe
+            continue
+
         # 侦察前方，得到起点、评分
         scout = get_scout(line, words, cursor, match_config)
         if scout is None:  # 没有结果表明出错，应提前结束
@@ -187,12 +232,20 @@ def get_words(json_file: Path) -> List[Dict[str, Union[str, float]]]:
     """
     从JSON文件中读取单词信息。
 
+    同名的 .tokens.bin 存在且不比JSON旧时，改用二进制文件一次读出全部分词，不解析JSON。
+
     Args:
         json_file (Path): JSON文件的路径。
 
     Returns:
         List[Dict[str, Union[str, float]]]: 包含单词信息的字典列表。
     """
+    tokens_file = tokens_file_for(json_file)
+    if tokens_file.exists() and (not json_file.exists() or
+                                 tokens_file.stat().st_mtime >= json_file.stat().st_mtime):
+        with TokenWords(tokens_file) as words:
+            return words.words()
+
     # 读取分词 json 文件
     with open(json_file, 'r', encoding='utf-8') as f:
         json_info = json.load(f)
@@ -224,14 +277,17 @@ def one_task(media_file: Path, original_url: Optional[str] = None) -> Optional[P
         file_stem = media_file.stem  # 获取文件名（无后缀）
         main_txt_file = media_file.parent / f"{file_stem}.main.txt"
 
-        if (not txt_file.exists()) or (not json_file.exists()):
+        if (not txt_file.exists()) or (not json_file.exists() and not tokens_file_for(json_file).exists()):
             print(f'无法找到 {media_file}对应的txt、json文件，跳过')
             return None
 
         # 获取带有时间戳的分词列表，获取分行稿件，匹配得到 srt 
-        words = get_words(json_file)
-        text_lines = get_lines(txt_file)
-        subtitle_list, main_txt_content = lines_match_words(text_lines, words)  # 现在函数同时返回字幕列表和main.txt内容
+        job = metrics.job_id(media_file)
+        with metrics.stage('align', job) as m, get_governor().stage('align', job, release=True):
+            words = get_words(json_file)
+            text_lines = get_lines(txt_file)
+            subtitle_list, main_txt_content = lines_match_words(text_lines, words)  # 现在函数同时返回字幕列表和main.txt内容
+            m.update(tokens=len(words), lines=len(subtitle_list))
 
         if not main_txt_content:
             print('警告：main_txt_content列表为空，没有内容可写入')
@@ -265,6 +321,16 @@ def one_task(media_file: Path, original_url: Optional[str] = None) -> Optional[P
                 except Exception as e:
                     print(f"读取URL文件出错: {str(e)}")
 
+        # 增量更新字幕检索索引
+        try:
+            index_main_txt(main_txt_file, url_to_use)
+        except Exception as e:
+            print(f"更新检索索引时出错: {str(e)}")
+        try:
+            index_semantic(main_txt_file, url_to_use)
+        except Exception as e:
+            print(f"更新语义索引时出错: {str(e)}")
+
         # 生成AI摘要
         if url_to_use:
             try:
@@ -0,0 +1,264 @@
+"""
+解码后音频的缓存
+
+转录、重试、重新转录和实时听写的文件音源都需要 16kHz 单声道 float32 采样，原来每次都要用 ffmpeg 把整个
+文件重新解码一遍。这里把解码结果按任务保存为「小头部 + 原始采样」的文件，之后通过 numpy.memmap 直接映射：
+不再解码，也不复制数据，按时间切片得到的是指向文件的视图，只有访问到的部分才会读入内存。
+
+缓存按任务编号（metrics.job_id）命名，音频被归档为 FLAC/Opus 后仍然命中，且保留的是原始 WAV 的解码结果。
+源文件的大小或修改时间变化时重新解码。缓存总大小超过预算时，按最近使用时间从旧到新淘汰。
+
+文件结构（小端序）：
+    头部 64 字节   魔数 b'VSPC'、版本号(u16)、声道数(u16)、采样率(u32)、保留(u32)、采样数 n(u64)、
+                   源文件大小(u64)、源文件修改时间(i64，纳秒)、源文件后缀(16 字节)、填充
+    采样           n 个 float32
+
+用法:
+    python -m utils.pcm_cache status          # 查看缓存的文件数和总大小
+    python -m utils.pcm_cache budget          # 按预算淘汰
+    python -m utils.pcm_cache clear           # 清空缓存
+"""
+
+import hashlib
+import os
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Union
+
+import numpy as np
+import typer
+
+from config import PcmCacheConfig
+from utils import metrics
+
+MAGIC = b'VSPC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIQQq16s8x')
+SOURCE = struct.Struct('<Qq16s')  # 头部中源文件大小、修改时间和后缀的部分
+SOURCE_OFFSET = 24
+SAMPLE_RATE = 16000
+
+_key_locks: Dict[str, threading.Lock] = {}
+_key_locks_lock = threading.Lock()
+
+
+def get_cache_dir() -> str:
+    if PcmCacheConfig.cache_dir:
+        return PcmCacheConfig.cache_dir
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "pcm-cache")
+
+
+def cache_file_for(media_file: Union[str, Path]) -> Path:
+    """任务的缓存文件：所在目录和任务编号的摘要，避免不同日期目录下的同名任务冲突，也不受文件名长度限制"""
+    media_file = Path(media_file).absolute()
+    key = f"{media_file.parent}/{metrics.job_id(media_file)}"
+    return Path(get_cache_dir()) / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]}.pcm"
+
+
+class Pcm(NamedTuple):
+    samples: np.ndarray  # float32 采样，命中或写入缓存时为只读的 numpy.memmap
+    cached: bool  # 是否命中缓存（没有调用 ffmpeg）
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / SAMPLE_RATE
+
+    def segment(self, start: float, end: Optional[float] = None) -> np.ndarray:
+        """start 到 end 秒之间的采样，是 samples 的视图，不复制数据"""
+        begin = max(0, int(start * SAMPLE_RATE))
+        return self.samples[begin:None if end is None else max(begin, int(end * SAMPLE_RATE))]
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _signature(media_file: Path):
+    stat = media_file.stat()
+    return stat.st_size, stat.st_mtime_ns, media_file.suffix.lower().encode('utf-8')[:16]
+
+
+def _open(cache_file: Path, media_file: Path) -> Optional[np.ndarray]:
+    """
+    映射缓存文件，源文件变化或缓存无效时返回None
+
+    源文件后缀不同时（WAV 已被归档为其他格式，原文件已经删除）仍然有效，头部改为记录归档后的文件。
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        magic, version, channels, sample_rate, _, count, size, mtime_ns, suffix = HEADER.unpack(header)
+    except OSError:
+        return None
+    if magic != MAGIC or version != VERSION or channels != 1 or sample_rate != SAMPLE_RATE:
+        return None
+    if cache_file.stat().st_size != HEADER.size + 4 * count:
+        return None
+    suffix = suffix.rstrip(b'\0')
+    current = _signature(media_file)
+    if current[2] == suffix:
+        if current[:2] != (size, mtime_ns):
+            return None
+    elif media_file.with_suffix(suffix.decode('utf-8', 'replace')).exists():
+        return None  # 同一任务的另一个音频文件，不是归档的结果
+    else:
+        with open(cache_file, 'r+b') as f:
+            f.seek(SOURCE_OFFSET)
+            f.write(SOURCE.pack(*current))
+    # 记录最近使用时间，淘汰时按修改时间排序（访问时间可能因 noatime 挂载而不更新）
+    os.utime(cache_file)
+    if not count:
+        return np.zeros(0, dtype='<f4')
+    return np.memmap(cache_file, dtype='<f4', mode='r', offset=HEADER.size, shape=(count,))
+
+
+def decode_pcm(media_file: Union[str, Path]) -> np.ndarray:
+    """不经过缓存，用 ffmpeg 把音视频文件解码为 16kHz 单声道 float32 采样"""
+    data = subprocess.run(['ffmpeg', '-nostdin', '-v', 'error', '-i', str(media_file), '-f', 'f32le', '-ac', '1',
+                           '-ar', str(SAMPLE_RATE), '-'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    return np.frombuffer(data, dtype='<f4')
+
+
+def _decode_to(media_file: Path, cache_file: Path) -> Optional[np.ndarray]:
+    """
+    把 ffmpeg 的输出分块写入临时文件，完成后替换为缓存文件，解码时内存占用与音频长度无关
+
+    Returns:
+        映射后的采样；ffmpeg 出错时不写入缓存，返回已解码的部分（读入内存）
+    """
+    signature = _signature(media_file)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    process = subprocess.Popen(['ffmpeg', '-nostdin', '-v', 'error', '-i', str(media_file), '-f', 'f32le',
+                                '-ac', '1', '-ar', str(SAMPLE_RATE), '-'],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    size = 0
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(bytes(HEADER.size))
+            while chunk := process.stdout.read(PcmCacheConfig.chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+            count = size // 4
+            f.truncate(HEADER.size + 4 * count)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, 1, SAMPLE_RATE, 0, count, *signature))
+        if process.wait() != 0:
+            samples = np.fromfile(temp_file, dtype='<f4', offset=HEADER.size)
+            print(f"解码 {media_file} 时出错，不写入缓存")
+            return samples
+        os.replace(temp_file, cache_file)
+    finally:
+        process.stdout.close()
+        process.wait()
+        if temp_file.exists():
+            temp_file.unlink()
+    return _open(cache_file, media_file)
+
+
+def load_pcm(media_file: Union[str, Path]) -> Pcm:
+    """
+    读取文件的 16kHz 单声道采样：命中缓存时直接映射，否则解码一次并写入缓存
+
+    Args:
+        media_file: 音视频文件路径
+
+    Returns:
+        Pcm，samples 为只读的采样数组；未启用缓存时为 ffmpeg 输出的内存副本
+    """
+    media_file = Path(media_file)
+    if not PcmCacheConfig.enabled:
+        return Pcm(decode_pcm(media_file), False)
+    cache_file = cache_file_for(media_file)
+    # 同一任务同时只解码一次，其他线程等待后直接命中
+    with _lock_for(str(cache_file)):
+        samples = _open(cache_file, media_file)
+        if samples is not None:
+            return Pcm(samples, True)
+        samples = _decode_to(media_file, cache_file)
+    enforce_budget(keep=cache_file)
+    return Pcm(samples, False)
+
+
+def enforce_budget(root: Optional[str] = None, budget_mb: float = None, keep: Optional[Path] = None) -> int:
+    """
+    总大小超过 budget_mb 时按最近使用时间从旧到新淘汰缓存文件
+
+    Args:
+        root: 缓存目录，默认为 get_cache_dir()
+        budget_mb: 预算（MB），默认为 PcmCacheConfig.budget_mb，0 表示不限制
+        keep: 不淘汰的文件（刚写入的缓存）
+
+    Returns:
+        淘汰的文件数
+    """
+    budget_mb = PcmCacheConfig.budget_mb if budget_mb is None else budget_mb
+    if not budget_mb:
+        return 0
+    candidates = []
+    total = 0
+    for cache_file in Path(root or get_cache_dir()).glob('*.pcm'):
+        try:
+            stat = cache_file.stat()
+        except OSError:
+            continue
+        total += stat.st_size
+        if cache_file != keep:
+            candidates.append((stat.st_mtime, stat.st_size, cache_file))
+    candidates.sort()
+
+    budget = budget_mb * 1024 * 1024
+    evicted = 0
+    for _, size, cache_file in candidates:
+        if total <= budget:
+            break
+        try:
+            # 已经映射的文件在 Linux/macOS 上删除后仍可读到关闭；Windows 上删除失败，下次再淘汰
+            cache_file.unlink()
+        except OSError as e:
+            print(f"删除 {cache_file} 时出错: {e}")
+            continue
+        total -= size
+        evicted += 1
+    return evicted
+
+
+app = typer.Typer()
+
+
+@app.command()
+def status():
+    """查看缓存的文件数、总大小和音频总时长"""
+    files = list(Path(get_cache_dir()).glob('*.pcm'))
+    size = sum(file.stat().st_size for file in files)
+    hours = sum(max(0, file.stat().st_size - HEADER.size) for file in files) / 4 / SAMPLE_RATE / 3600
+    print(f'{get_cache_dir()}：{len(files)} 个文件，{size / 1024 / 1024:.1f}MB，'
+          f'共 {hours:.1f} 小时音频，预算 {PcmCacheConfig.budget_mb}MB')
+    if files:
+        oldest = min(file.stat().st_mtime for file in files)
+        print(f'最久未使用：{time.strftime("%Y-%m-%d %H:%M", time.localtime(oldest))}')
+
+
+@app.command()
+def budget(budget_mb: float = PcmCacheConfig.budget_mb):
+    """按预算淘汰最久未使用的缓存"""
+    print(f'淘汰 {enforce_budget(budget_mb=budget_mb)} 个文件')
+
+
+@app.command()
+def clear():
+    """清空缓存"""
+    files = list(Path(get_cache_dir()).glob('*.pcm'))
+    for file in files:
+        file.unlink(missing_ok=True)
+    print(f'已删除 {len(files)} 个文件')
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,233 @@
+"""
+分P视频、合集和播放列表
+
+一次元数据请求把B站多P视频、合集/列表或 YouTube 播放列表展开为各个分P，每个分P作为单独的任务并行下载和转录
+（见 utils.job_queue），全部完成后合并为整个课程的 main.txt 和AI总结。
+
+合并后的 main.txt 使用课程内的累计时间，分P的链接和起始时间保存在同名的 parts.json 中；
+总结中的跳转链接按累计时间换算为对应分P的 ?p= 链接和分P内的 t=。
+
+用法:
+    python -m utils.playlist expand https://www.bilibili.com/video/BV...      # 列出展开后的分P
+"""
+
+import json
+import os
+import re
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+import typer
+
+from utils.common_utils import clean_url, jump_url
+from utils.file_manager import clean_filename, get_next_file_number, get_today_folder
+from utils.transcript_utils import format_timed_lines, parse_timed_lines, srt_duration
+
+# 带时间参数的链接，出现在总结的 markdown 中
+_timed_link_pattern = re.compile(r'https?://[^\s)\]|>"\']*?[?&]t=(\d+)[^\s)\]|>"\']*')
+
+
+class Part(NamedTuple):
+    index: int  # 分P序号，从 1 开始
+    title: str
+    url: str
+    duration: Optional[float] = None
+
+
+class Playlist(NamedTuple):
+    title: str
+    url: str
+    parts: List[Part]
+
+
+def needs_expansion(url: str) -> bool:
+    """可能包含多个分P的链接：没有指定分P的B站视频、合集/列表、带 list 参数的 YouTube 链接"""
+    if re.search(r'[?&]list=|/playlist|space\.bilibili\.com|/medialist/|/list/|/festival/', url):
+        return True
+    return bool(re.search(r'BV\w+', url)) and not re.search(r'[?&]p=\d+', url)
+
+
+def _entry_url(entry: dict) -> str:
+    url = entry.get('webpage_url') or entry.get('url') or ''
+    if not url.startswith('http') and entry.get('ie_key') == 'Youtube':
+        url = f"https://www.youtube.com/watch?v={entry.get('id') or url}"
+    return url
+
+
+def expand_url(url: str) -> Playlist:
+    """
+    用一次元数据请求展开分P视频、合集或播放列表，不下载音视频
+
+    链接中已经指定了 ?p= 时只返回该分P。
+
+    Args:
+        url: 视频、合集或播放列表的链接
+
+    Returns:
+        标题、链接和分P列表；单个视频返回只有一个分P的列表
+    """
+    import yt_dlp
+    from utils.host_limiter import get_limiter
+
+    url = clean_url(url)
+    opts = {'extract_flat': 'in_playlist', 'skip_download': True, 'quiet': True, 'no_warnings': True,
+            'noplaylist': bool(re.search(r'[?&]p=\d+', url))}
+    with get_limiter().slot(url), yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    title = info.get('title') or info.get('id') or url
+    entries = [entry for entry in info.get('entries') or [] if entry]
+    if not entries:
+        return Playlist(title, url, [Part(1, title, url, info.get('duration'))])
+    parts = []
+    for number, entry in enumerate(entries, 1):
+        part_url = _entry_url(entry)
+        if part_url:
+            parts.append(Part(number, entry.get('title') or f"P{number}", clean_url(part_url), entry.get('duration')))
+    return Playlist(title, url, parts)
+
+
+def course_stem(title: str) -> str:
+    """合并稿的文件名前缀，与下载的音频使用相同的命名方式"""
+    today_folder = get_today_folder()
+    date_str = datetime.now().strftime('%Y%m%d')
+    return os.path.join(today_folder, f"{get_next_file_number(today_folder)}.{clean_filename(title)}_{date_str}")
+
+
+def parts_file_for(main_txt_file) -> Path:
+    main_txt_file = Path(main_txt_file)
+    return main_txt_file.with_name(main_txt_file.name[:-len('.main.txt')] + '.parts.json')
+
+
+def is_course(main_txt_file) -> bool:
+    """合并稿旁边有 parts.json，各分P已经有自己的 main.txt"""
+    return parts_file_for(main_txt_file).exists()
+
+
+def write_manifest(path: str, playlist: Playlist, job_ids: List[int]):
+    manifest = {
+        'title': playlist.title,
+        'url': playlist.url,
+        'parts': [dict(part._asdict(), job_id=job_id) for part, job_id in zip(playlist.parts, job_ids)],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def read_manifest(path) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _part_duration(media_file: Path, lines: List[Tuple[int, str]], duration: Optional[float]) -> float:
+    srt_file = media_file.with_suffix('.srt')
+    measured = srt_duration(str(srt_file)) if srt_file.exists() else None
+    return float(duration or measured or (lines[-1][0] + 1 if lines else 0))
+
+
+def combine_parts(manifest_file: str, media_files: List[Optional[str]]) -> Optional[Path]:
+    """
+    把各分P的 main.txt 按顺序合并为课程的 main.txt，时间改为课程内的累计时间
+
+    Args:
+        manifest_file: parts.json 路径
+        media_files: 与分P顺序一致的音频文件路径，分P失败时为None
+
+    Returns:
+        合并后的 main.txt 路径，没有任何分P完成时返回None
+    """
+    manifest = read_manifest(manifest_file)
+    offset = 0.0
+    combined = []
+    for part, media_file in zip(manifest['parts'], media_files):
+        part['offset'] = None
+        main_txt = Path(media_file).parent / f"{Path(media_file).stem}.main.txt" if media_file else None
+        if not main_txt or not main_txt.exists():
+            print(f"分P {part['index']} {part['title']} 没有转录结果，合并时跳过")
+            continue
+        with open(main_txt, 'r', encoding='utf-8') as f:
+            lines = parse_timed_lines(f.read())
+        part['offset'] = int(offset)
+        part['main_txt'] = str(main_txt)
+        combined.append((int(offset), f"【P{part['index']} {part['title']}】"))
+        combined += [(int(offset) + second, text) for second, text in lines]
+        offset += _part_duration(Path(media_file), lines, part.get('duration'))
+    if not combined:
+        return None
+
+    main_txt_file = Path(manifest_file[:-len('.parts.json')] + '.main.txt')
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    with open(main_txt_file, 'w', encoding='utf-8') as f:
+        f.write(format_timed_lines(combined))
+    with open(main_txt_file.with_name(main_txt_file.name[:-len('.main.txt')] + '.audio_urls.json'),
+              'w', encoding='utf-8') as f:
+        json.dump({'original_url': manifest['url'], 'cleaned_url': manifest['url']}, f, ensure_ascii=False, indent=2)
+    return main_txt_file
+
+
+class CourseLinks:
+    """
+    把课程内的累计时间换算为分P链接
+    """
+
+    def __init__(self, parts: List[dict]):
+        self.parts = sorted((part for part in parts if part.get('offset') is not None), key=lambda p: p['offset'])
+        self.offsets = [part['offset'] for part in self.parts]
+
+    @classmethod
+    def load(cls, parts_file) -> 'CourseLinks':
+        return cls(read_manifest(parts_file)['parts'])
+
+    def locate(self, seconds: float) -> Tuple[Optional[dict], float]:
+        """返回累计时间所在的分P和分P内的时间"""
+        position = bisect_right(self.offsets, seconds) - 1
+        if position < 0:
+            return (self.parts[0], 0) if self.parts else (None, seconds)
+        part = self.parts[position]
+        return part, seconds - part['offset']
+
+    def url(self, seconds: float, fallback: str = '') -> str:
+        part, local = self.locate(seconds)
+        return jump_url(part['url'], local) if part else (jump_url(fallback, seconds) if fallback else '')
+
+    def rewrite(self, markdown: str) -> str:
+        """把总结中按累计时间生成的跳转链接替换为对应分P的链接"""
+        if not self.parts:
+            return markdown
+        return _timed_link_pattern.sub(lambda m: self.url(int(m.group(1))), markdown)
+
+
+def summarize_course(main_txt_file: Path, url: str) -> Optional[str]:
+    """总结合并后的课程稿，并把跳转链接换算到各分P"""
+    from utils.ai_summarizer import summarize_video
+
+    summary = summarize_video(main_txt_file, url)
+    final_md = Path(str(main_txt_file).replace('.main.txt', '.final.md'))
+    if not final_md.exists():
+        return summary
+    links = CourseLinks.load(parts_file_for(main_txt_file))
+    with open(final_md, 'r', encoding='utf-8') as f:
+        content = links.rewrite(f.read())
+    with open(final_md, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return content
+
+
+app = typer.Typer()
+
+
+@app.command()
+def expand(url: str):
+    """列出链接展开后的分P"""
+    playlist = expand_url(url)
+    print(f"{playlist.title}（{len(playlist.parts)} 个分P）")
+    for part in playlist.parts:
+        duration = f"{part.duration:.0f}s" if part.duration else ''
+        print(f"{part.index:>4}  {duration:>7}  {part.title}  {part.url}")
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,249 @@
+"""
+字幕全文检索
+
+把每个任务的 main.txt（每行 “秒数 字幕”）增量写入 SQLite FTS5 索引，查询时按相关度返回命中的字幕行，
+并附带可直接跳转到对应时间的视频链接。
+
+FTS5 自带的分词器会把连续的中文当成一个词，因此索引时在中文字符之间插入空格，
+查询时把关键词转换为短语查询，任意长度的中文关键词都能命中，并可用 bm25 排序。
+
+用法:
+    python -m utils.search_index index            # 增量索引 downloads 下的所有 main.txt
+    python -m utils.search_index query 关键词      # 查询
+"""
+
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+import typer
+
+from utils.common_utils import jump_url
+from utils.file_manager import ensure_dir_exists
+from utils.playlist import is_course
+from utils.transcript_utils import parse_timed_lines
+
+_cjk_pattern = re.compile(r'([\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef])')
+_date_pattern = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})')
+
+
+class SearchHit(NamedTuple):
+    text: str
+    start: int  # 字幕起始时间（秒）
+    url: str  # 跳转到该时间的链接
+    video_url: str
+    bv_id: str
+    date: str
+    main_txt: str
+    score: float  # bm25 分数，越小越相关
+
+
+def get_index_file():
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "search.db")
+
+
+def _tokenize(text: str) -> str:
+    """在中文字符两侧加空格，使每个字成为一个词"""
+    return ' '.join(_cjk_pattern.sub(r' \1 ', text.lower()).split())
+
+
+def _build_query(query: str) -> str:
+    """把用户输入转换为 FTS5 查询：每个空格分隔的关键词作为一个短语，多个关键词之间为 AND"""
+    phrases = []
+    for term in query.split():
+        tokens = _tokenize(term).replace('"', ' ').split()
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    return ' AND '.join(phrases)
+
+
+def _job_metadata(main_txt: Path):
+    """从同名的 audio_urls.json、文件名和所在目录推断视频URL、BV号和日期"""
+    stem = main_txt.name[:-len('.main.txt')] if main_txt.name.endswith('.main.txt') else main_txt.stem
+    video_url = ''
+    url_json_file = main_txt.parent / f"{stem}.audio_urls.json"
+    if url_json_file.exists():
+        try:
+            with open(url_json_file, 'r', encoding='utf-8') as f:
+                url_data = json.load(f)
+            video_url = url_data.get("cleaned_url") or url_data.get("original_url") or ''
+        except (OSError, ValueError):
+            pass
+    bv_match = re.search(r'(BV\w+)', video_url)
+    date_match = _date_pattern.search(main_txt.parent.name) or _date_pattern.search(stem)
+    date = '-'.join(date_match.groups()) if date_match else ''
+    return video_url, bv_match.group(1) if bv_match else '', date
+
+
+class SearchIndex:
+    """
+    基于 SQLite FTS5 的字幕索引
+    """
+
+    def __init__(self, index_file: Optional[str] = None):
+        self.index_file = index_file or get_index_file()
+        ensure_dir_exists(os.path.dirname(self.index_file))
+        self.conn = sqlite3.connect(self.index_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                main_txt TEXT UNIQUE NOT NULL,
+                video_url TEXT,
+                bv_id TEXT,
+                date TEXT,
+                mtime REAL,
+                first_rowid INTEGER,
+                last_rowid INTEGER
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(
+                tokens, text UNINDEXED, start UNINDEXED, job_id UNINDEXED
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def index_job(self, main_txt_file: Union[str, Path], video_url: Optional[str] = None,
+                  force: bool = False) -> bool:
+        """
+        索引一个任务的 main.txt，文件未变化时跳过
+
+        Args:
+            main_txt_file: main.txt 文件路径
+            video_url: 视频URL，如果为None则从同名的 audio_urls.json 读取
+            force: 是否忽略修改时间强制重建该任务的索引
+
+        Returns:
+            是否写入了索引
+        """
+        main_txt = Path(main_txt_file).resolve()
+        mtime = main_txt.stat().st_mtime
+        row = self.conn.execute('SELECT id, mtime, first_rowid, last_rowid FROM jobs WHERE main_txt = ?',
+                                (str(main_txt),)).fetchone()
+        if row and row[1] == mtime and not force:
+            return False
+
+        with open(main_txt, 'r', encoding='utf-8') as f:
+            lines = parse_timed_lines(f.read())
+        url, bv_id, date = _job_metadata(main_txt)
+        video_url = video_url or url
+        bv_match = re.search(r'(BV\w+)', video_url)
+        bv_id = bv_match.group(1) if bv_match else bv_id
+
+        with self.conn:
+            if row:
+                job_id = row[0]
+                self._delete_lines(row[2], row[3])
+            else:
+                job_id = self.conn.execute('INSERT INTO jobs (main_txt) VALUES (?)', (str(main_txt),)).lastrowid
+            # 同一任务的行在一个事务内连续插入，rowid 连续，删除时按范围删除，不必扫描全表
+            first_rowid = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) + 1 FROM lines').fetchone()[0]
+            self.conn.executemany(
+                'INSERT INTO lines (rowid, tokens, text, start, job_id) VALUES (?, ?, ?, ?, ?)',
+                ((first_rowid + i, _tokenize(text), text, start, job_id) for i, (start, text) in enumerate(lines))
+            )
+            self.conn.execute(
+                'UPDATE jobs SET video_url = ?, bv_id = ?, date = ?, mtime = ?, first_rowid = ?, last_rowid = ? '
+                'WHERE id = ?',
+                (video_url, bv_id, date, mtime, first_rowid, first_rowid + len(lines) - 1, job_id)
+            )
+        return True
+
+    def _delete_lines(self, first_rowid: Optional[int], last_rowid: Optional[int]):
+        if first_rowid is not None and last_rowid is not None and last_rowid >= first_rowid:
+            self.conn.execute('DELETE FROM lines WHERE rowid BETWEEN ? AND ?', (first_rowid, last_rowid))
+
+    def index_folder(self, folder: Union[str, Path]) -> int:
+        """
+        增量索引目录下所有的 main.txt，并清理已删除文件的索引
+
+        Returns:
+            本次写入索引的文件数
+        """
+        count = 0
+        seen = set()
+        for main_txt in Path(folder).rglob('*.main.txt'):
+            if is_course(main_txt):
+                continue  # 课程的合并稿，各分P已经单独索引
+            seen.add(str(main_txt.resolve()))
+            try:
+                if self.index_job(main_txt):
+                    count += 1
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"索引 {main_txt} 时出错: {e}")
+        folder = str(Path(folder).resolve())
+        stale = [row for row in self.conn.execute('SELECT id, main_txt, first_rowid, last_rowid FROM jobs')
+                 if row[1].startswith(folder) and row[1] not in seen]
+        if stale:
+            with self.conn:
+                for job_id, _, first_rowid, last_rowid in stale:
+                    self._delete_lines(first_rowid, last_rowid)
+                    self.conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        return count
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[SearchHit]:
+        """
+        查询字幕
+
+        Args:
+            query: 关键词，多个关键词用空格分隔，需同时命中
+            limit: 返回的最大条数
+            offset: 分页偏移
+
+        Returns:
+            按相关度排序的命中列表
+        """
+        fts_query = _build_query(query)
+        if not fts_query:
+            return []
+        rows = self.conn.execute("""
+            SELECT lines.text, lines.start, jobs.video_url, jobs.bv_id, jobs.date, jobs.main_txt, bm25(lines)
+            FROM lines JOIN jobs ON jobs.id = lines.job_id
+            WHERE lines MATCH ?
+            ORDER BY bm25(lines)
+            LIMIT ? OFFSET ?
+        """, (fts_query, limit, offset)).fetchall()
+        return [SearchHit(text, int(start), jump_url(video_url, start) if video_url else '', video_url or '',
+                          bv_id or '', date or '', main_txt, score)
+                for text, start, video_url, bv_id, date, main_txt, score in rows]
+
+
+def index_main_txt(main_txt_file: Union[str, Path], video_url: Optional[str] = None):
+    """任务完成后调用，把新的 main.txt 写入默认索引"""
+    index = SearchIndex()
+    try:
+        index.index_job(main_txt_file, video_url)
+    finally:
+        index.close()
+
+
+app = typer.Typer()
+
+
+@app.command()
+def index(folder: Path = typer.Argument(None, help='要索引的目录，默认为 downloads')):
+    """增量索引目录下所有的 main.txt"""
+    folder = folder or Path(get_index_file()).parent
+    search_index = SearchIndex()
+    count = search_index.index_folder(folder)
+    print(f'已更新 {count} 个文件的索引')
+    search_index.close()
+
+
+@app.command()
+def query(keywords: List[str], limit: int = 20):
+    """查询字幕，返回带跳转链接的结果"""
+    search_index = SearchIndex()
+    for hit in search_index.search(' '.join(keywords), limit):
+        print(f'[{hit.date}] {hit.start}s {hit.text}')
+        print(f'    {hit.url or hit.main_txt}')
+    search_index.close()
+
+
+if __name__ == '__main__':
+    app()
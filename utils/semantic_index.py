@@ -0,0 +1,393 @@
+"""
+字幕语义检索
+
+把 main.txt 按时间窗口切成片段，计算向量后追加写入磁盘上的 float32 矩阵（vectors.f32），
+每行对应 chunks.bin 中一条定长记录（任务编号、起止时间）。查询时用 np.memmap 按块读取矩阵，
+批量计算余弦相似度并取 top-k，不会把全部片段加载为 Python 对象，可以支撑几十万个片段。
+
+向量化后端可替换：
+- hashing（默认）：字符 n-gram 哈希向量，纯本地、无需下载模型
+- sentence-transformers:<模型名>：本地 CPU 语义模型，需要安装 sentence-transformers
+
+用法:
+    python -m utils.semantic_index index           # 增量索引 downloads 下的所有 main.txt
+    python -m utils.semantic_index query 问题       # 查询相关片段
+    python -m utils.semantic_index videos 问题      # 查询相关视频
+"""
+
+import json
+import os
+import re
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+import typer
+
+from utils.common_utils import jump_url
+from utils.file_manager import ensure_dir_exists
+from utils.playlist import is_course
+from utils.search_index import _job_metadata
+from utils.transcript_utils import parse_timed_lines, time_windows
+
+CHUNK_DTYPE = np.dtype([('job', '<i4'), ('start', '<i4'), ('end', '<i4')])
+
+_punc_pattern = re.compile(r'[\s,.?!:;，。？！：；、…~～"“”\'‘’()（）]+')
+
+
+class SemanticHit(NamedTuple):
+    score: float  # 余弦相似度
+    start: int  # 片段起始时间（秒）
+    end: int  # 片段结束时间（秒）
+    url: str  # 跳转到该时间的链接
+    main_txt: str
+    text: str
+
+
+class HashingEmbedder:
+    """
+    字符 n-gram 哈希向量，不依赖任何模型
+    """
+
+    def __init__(self, dim: int = 512, ngrams=(1, 2, 3)):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = _punc_pattern.sub('', text.lower())
+            cols = [zlib.crc32(text[i:i + n].encode('utf-8')) % self.dim
+                    for n in self.ngrams for i in range(len(text) - n + 1)]
+            if cols:
+                vectors[row] = np.log1p(np.bincount(cols, minlength=self.dim))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class SentenceTransformerEmbedder:
+    """
+    使用 sentence-transformers 的本地语义模型
+    """
+
+    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2'):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("使用语义模型需要先安装 sentence-transformers：pip install sentence-transformers")
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=64, normalize_embeddings=True).astype(np.float32)
+
+
+def get_embedder(name: str = 'hashing'):
+    """根据名称创建向量化后端：'hashing'、'hashing-<维度>' 或 'sentence-transformers:<模型名>'"""
+    if name.startswith('sentence-transformers'):
+        _, _, model_name = name.partition(':')
+        return SentenceTransformerEmbedder(model_name) if model_name else SentenceTransformerEmbedder()
+    if name.startswith('hashing-'):
+        return HashingEmbedder(int(name.split('-', 1)[1]))
+    return HashingEmbedder()
+
+
+def get_index_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads", "semantic-index")
+
+
+class SemanticIndex:
+    """
+    内存映射的向量索引
+
+    目录结构：
+        index.json   向量维度、后端名称、片段数和任务表
+        vectors.f32  N x dim 的 float32 矩阵
+        chunks.bin   N 条 CHUNK_DTYPE 记录
+    """
+
+    def __init__(self, index_dir: Optional[str] = None, embedder=None, chunk_seconds: int = 60):
+        """
+        Args:
+            index_dir: 索引目录，如果为None则使用 downloads/semantic-index
+            embedder: 向量化后端，如果为None则使用索引建立时的后端（新索引默认 hashing）
+            chunk_seconds: 每个片段的时长（秒）
+        """
+        self.index_dir = index_dir or get_index_dir()
+        ensure_dir_exists(self.index_dir)
+        self.header_file = os.path.join(self.index_dir, 'index.json')
+        self.vectors_file = os.path.join(self.index_dir, 'vectors.f32')
+        self.chunks_file = os.path.join(self.index_dir, 'chunks.bin')
+        self.lock_file = os.path.join(self.index_dir, 'index.lock')
+        self.chunk_seconds = chunk_seconds
+
+        self.header = {'backend': None, 'dim': None, 'count': 0, 'next_job': 0, 'jobs': {}}
+        self._load_header()
+        self.embedder = embedder or get_embedder(self.header['backend'] or 'hashing')
+        if self.header['backend'] is None:
+            self.header['backend'], self.header['dim'] = self.embedder.name, self.embedder.dim
+        elif self.header['backend'] != self.embedder.name:
+            raise ValueError(f"索引使用的后端是 {self.header['backend']}，与 {self.embedder.name} 不一致")
+
+    @property
+    def jobs(self) -> Dict[str, dict]:
+        return self.header['jobs']
+
+    def _load_header(self):
+        if os.path.exists(self.header_file):
+            with open(self.header_file, 'r', encoding='utf-8') as f:
+                self.header = json.load(f)
+
+    @contextmanager
+    def _locked(self):
+        """
+        跨进程独占索引：重新读取 index.json，并把向量和片段文件截断到 header['count'] 行，
+        丢掉上次写入到一半（追加后没来得及保存 index.json）时残留的数据
+        """
+        with open(self.lock_file, 'a+b') as lock:
+            if os.name == 'nt':
+                import msvcrt
+                while True:
+                    try:
+                        msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK 重试 10 秒后仍拿不到锁会抛出异常
+            else:
+                import fcntl
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                backend, dim = self.header['backend'], self.header['dim']
+                self._load_header()
+                if self.header['backend'] is None:
+                    self.header['backend'], self.header['dim'] = backend, dim
+                elif self.header['backend'] != self.embedder.name:
+                    raise ValueError(f"索引使用的后端是 {self.header['backend']}，与 {self.embedder.name} 不一致")
+                count = self.header['count']
+                for path, row_size in ((self.vectors_file, 4 * (self.header['dim'] or 0)),
+                                       (self.chunks_file, CHUNK_DTYPE.itemsize)):
+                    if os.path.exists(path) and os.path.getsize(path) > count * row_size:
+                        os.truncate(path, count * row_size)
+                yield
+            finally:
+                if os.name == 'nt':
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _save_header(self):
+        temp_file = f"{self.header_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.header, f, ensure_ascii=False)
+        os.replace(temp_file, self.header_file)
+
+    def index_job(self, main_txt_file: Union[str, Path], video_url: Optional[str] = None) -> bool:
+        """
+        索引一个任务的 main.txt，文件未变化时跳过；文件变化时旧片段作废，新片段追加到末尾
+
+        Args:
+            main_txt_file: main.txt 文件路径
+            video_url: 视频URL，如果为None则从同名的 audio_urls.json 读取
+
+        Returns:
+            是否写入了索引
+        """
+        main_txt = str(Path(main_txt_file).resolve())
+        mtime = os.path.getmtime(main_txt)
+        if self._job_id(main_txt, mtime) is False:
+            return False
+
+        # 向量在加锁前计算，其他进程不必等待模型推理
+        with open(main_txt, 'r', encoding='utf-8') as f:
+            windows = time_windows(parse_timed_lines(f.read()), self.chunk_seconds)
+        vectors = self.embedder.embed([' '.join(text for _, text in window) for window in windows]) \
+            if windows else None
+
+        with self._locked():
+            job_id = self._job_id(main_txt, mtime)
+            if job_id is False:
+                return False  # 其他进程已经索引了同一版本
+            if job_id is not None:
+                # 旧片段留在文件中，查询时按任务表过滤，compact() 时才真正删除
+                video_url = video_url or self.jobs[job_id]['video_url']
+                del self.jobs[job_id]
+            video_url = video_url or _job_metadata(Path(main_txt))[0]
+
+            new_id = self.header['next_job']
+            self.header['next_job'] += 1
+            if windows:
+                chunks = np.zeros(len(windows), dtype=CHUNK_DTYPE)
+                chunks['job'] = new_id
+                chunks['start'] = [window[0][0] for window in windows]
+                chunks['end'] = [window[-1][0] for window in windows]
+                with open(self.vectors_file, 'ab') as f:
+                    f.write(np.ascontiguousarray(vectors, dtype='<f4').tobytes())
+                with open(self.chunks_file, 'ab') as f:
+                    f.write(chunks.tobytes())
+                self.header['count'] += len(windows)
+            self.jobs[str(new_id)] = {'main_txt': main_txt, 'video_url': video_url or '', 'mtime': mtime}
+            self._save_header()
+        return True
+
+    def _job_id(self, main_txt: str, mtime: float):
+        """main.txt 在任务表中的编号，没有索引过时返回 None，已经索引了同一版本时返回 False"""
+        job_id = next((job_id for job_id, job in self.jobs.items() if job['main_txt'] == main_txt), None)
+        if job_id is not None and self.jobs[job_id]['mtime'] == mtime:
+            return False
+        return job_id
+
+    def index_folder(self, folder: Union[str, Path]) -> int:
+        """
+        增量索引目录下所有的 main.txt
+
+        Returns:
+            本次写入索引的文件数
+        """
+        count = 0
+        for main_txt in Path(folder).rglob('*.main.txt'):
+            if is_course(main_txt):
+                continue  # 课程的合并稿，各分P已经单独索引
+            try:
+                if self.index_job(main_txt):
+                    count += 1
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"索引 {main_txt} 时出错: {e}")
+        return count
+
+    def _open(self):
+        count, dim = self.header['count'], self.header['dim']
+        if not count:
+            return None, None
+        vectors = np.memmap(self.vectors_file, dtype='<f4', mode='r', shape=(count, dim))
+        chunks = np.memmap(self.chunks_file, dtype=CHUNK_DTYPE, mode='r', shape=(count,))
+        return vectors, chunks
+
+    def _active_mask(self, chunks) -> np.ndarray:
+        active = np.array(sorted(int(job_id) for job_id in self.jobs), dtype=np.int32)
+        return np.isin(chunks['job'], active)
+
+    def search_many(self, queries: List[str], k: int = 10, block_rows: int = 65536) -> List[List[SemanticHit]]:
+        """
+        批量查询，每个查询返回 k 个最相似的片段
+
+        向量矩阵按 block_rows 行分块读取，每块一次矩阵乘法算出所有查询的相似度，
+        用 argpartition 保留每块的前 k 个候选，最后合并排序。
+
+        Args:
+            queries: 查询文本列表
+            k: 每个查询返回的片段数
+            block_rows: 每次从磁盘读取的行数
+
+        Returns:
+            与 queries 顺序一致的命中列表
+        """
+        vectors, chunks = self._open()
+        if vectors is None or not queries:
+            return [[] for _ in queries]
+        query_vectors = self.embedder.embed(queries)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+        for begin in range(0, len(vectors), block_rows):
+            block = np.asarray(vectors[begin:begin + block_rows])
+            scores = query_vectors @ block.T
+            scores[:, ~self._active_mask(chunks[begin:begin + block_rows])] = -np.inf
+            top = min(k, scores.shape[1])
+            rows = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, rows + begin], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([self._hit(chunks[rows[i]], float(scores[i])) for i in order if np.isfinite(scores[i])])
+        return results
+
+    def search(self, query: str, k: int = 10) -> List[SemanticHit]:
+        return self.search_many([query], k)[0]
+
+    def search_videos(self, query: str, k: int = 10, per_video: int = 3) -> List[List[SemanticHit]]:
+        """查询相关的视频：按视频聚合片段，按视频内最高分排序，每个视频最多返回 per_video 个片段"""
+        videos = {}
+        for hit in self.search(query, k * per_video * 2):
+            hits = videos.setdefault(hit.main_txt, [])
+            if len(hits) < per_video:
+                hits.append(hit)
+        return sorted(videos.values(), key=lambda hits: -hits[0].score)[:k]
+
+    def _hit(self, chunk, score: float) -> SemanticHit:
+        job = self.jobs[str(int(chunk['job']))]
+        start, end = int(chunk['start']), int(chunk['end'])
+        text = ''
+        try:
+            with open(job['main_txt'], 'r', encoding='utf-8') as f:
+                text = ' '.join(t for s, t in parse_timed_lines(f.read()) if start <= s <= end)
+        except OSError:
+            pass
+        url = jump_url(job['video_url'], start) if job['video_url'] else ''
+        return SemanticHit(score, start, end, url, job['main_txt'], text)
+
+    def compact(self):
+        """删除作废的片段，重写向量和片段文件"""
+        with self._locked():
+            vectors, chunks = self._open()
+            if vectors is None:
+                return
+            mask = self._active_mask(chunks)
+            if mask.all():
+                return
+            for path, data in ((self.vectors_file, vectors), (self.chunks_file, chunks)):
+                with open(f"{path}.tmp", 'wb') as f:
+                    for begin in range(0, len(mask), 65536):
+                        f.write(np.ascontiguousarray(data[begin:begin + 65536][mask[begin:begin + 65536]]).tobytes())
+            del vectors, chunks
+            os.replace(f"{self.vectors_file}.tmp", self.vectors_file)
+            os.replace(f"{self.chunks_file}.tmp", self.chunks_file)
+            self.header['count'] = int(mask.sum())
+            self._save_header()
+
+
+def index_main_txt(main_txt_file: Union[str, Path], video_url: Optional[str] = None):
+    """任务完成后调用，把新的 main.txt 写入默认索引"""
+    SemanticIndex().index_job(main_txt_file, video_url)
+
+
+app = typer.Typer()
+
+
+@app.command()
+def index(folder: Path = typer.Argument(None, help='要索引的目录，默认为 downloads'), backend: str = 'hashing'):
+    """增量索引目录下所有的 main.txt"""
+    folder = folder or Path(get_index_dir()).parent
+    semantic_index = SemanticIndex(embedder=get_embedder(backend))
+    print(f'已更新 {semantic_index.index_folder(folder)} 个文件的索引')
+
+
+@app.command()
+def query(question: List[str], k: int = 10):
+    """查询最相关的字幕片段"""
+    for hit in SemanticIndex().search(' '.join(question), k):
+        print(f'{hit.score:.3f} {hit.start}s {hit.text[:80]}')
+        print(f'    {hit.url or hit.main_txt}')
+
+
+@app.command()
+def videos(question: List[str], k: int = 10):
+    """查询最相关的视频"""
+    for hits in SemanticIndex().search_videos(' '.join(question), k):
+        print(f'{hits[0].score:.3f} {hits[0].main_txt}')
+        for hit in hits:
+            print(f'    {hit.start}s {hit.url} {hit.text[:60]}')
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,131 @@
+"""
+结构化总结
+
+时间线表格（分段、时长、占比、跳转链接）是确定性的数据，在本地根据 main.txt 和 srt 计算；
+模型只需要返回一个很短的 JSON：总体总结、适合人群和每个片段的标题，最后在本地渲染为 .final.md。
+相比让模型生成整个 markdown 文档，输出 token 数大幅减少。
+"""
+
+import json
+import re
+from typing import List, NamedTuple, Optional
+
+from utils.common_utils import jump_url
+from utils.topic_segmenter import segment_topics
+from utils.transcript_utils import TimedLine, format_timed_lines
+
+
+class Segment(NamedTuple):
+    start: int  # 起始时间（秒）
+    end: int  # 结束时间（秒）
+    lines: List[TimedLine]
+
+
+class StructuredSummary(NamedTuple):
+    summary: str
+    audience: str
+    titles: List[str]
+
+
+def build_segments(lines: List[TimedLine], duration: float, max_segments: int = 20,
+                   min_segment_seconds: int = 120) -> List[Segment]:
+    """
+    按话题把字幕切分为片段，片段数不超过 max_segments
+
+    Args:
+        lines: (秒数, 文本) 列表
+        duration: 视频总时长（秒），最后一个片段在此结束
+        max_segments: 最多的片段数
+        min_segment_seconds: 单个片段的最短时长（秒）
+
+    Returns:
+        片段列表，首尾相接覆盖整个视频
+    """
+    if not lines:
+        return []
+    min_seconds = max(min_segment_seconds, int(duration // max_segments) + 1)
+    topics = segment_topics(lines, min_topic_seconds=min_seconds)
+    end = max(int(duration), lines[-1][0])
+    segments = []
+    for i, topic in enumerate(topics):
+        # 第一个片段从 0 秒开始，最后一个片段延伸到视频结尾，保证占比之和为 100%
+        start = 0 if i == 0 else topic.start
+        segment_end = end if i == len(topics) - 1 else topics[i + 1].start
+        segments.append(Segment(start, segment_end, topic.lines))
+    return segments
+
+
+def build_prompt(segments: List[Segment], original_url: str) -> str:
+    """构建只要求返回 JSON 的 prompt"""
+    parts = []
+    for i, segment in enumerate(segments):
+        parts.append(f"[{i + 1}] {segment.start}-{segment.end}秒\n{format_timed_lines(segment.lines)}")
+    body = '\n'.join(parts)
+    return f"""你现在是一个视频总结小助手。下面是一个视频的字幕，已经按话题分成{len(segments)}个片段，每个片段以“[序号] 起止时间”开头，每行字幕以时间戳（秒）开头。
+
+视频链接: {original_url}
+
+请只输出JSON，不要输出其他内容，格式如下：
+{{"summary": "视频大总结，100字以内", "audience": "这个视频适合哪些人看，有什么特色，50字以内", "titles": ["片段1的标题", "片段2的标题"]}}
+titles 必须恰好有{len(segments)}项，按片段顺序排列，每项不超过20字。
+
+以下是我的输入，
+{body}"""
+
+
+def parse_response(response: str, segment_count: int) -> Optional[StructuredSummary]:
+    """
+    解析模型返回的 JSON，兼容外层包裹的代码块
+
+    Returns:
+        解析结果，无法解析时返回None；标题不足时用空字符串补齐
+    """
+    match = re.search(r'\{.*\}', response, re.S)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    titles = [str(title).strip() for title in data.get('titles') or [] if title is not None]
+    titles = (titles + [''] * segment_count)[:segment_count]
+    return StructuredSummary(str(data.get('summary', '')).strip(), str(data.get('audience', '')).strip(), titles)
+
+
+def _format_time(seconds: int) -> str:
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def _fallback_title(segment: Segment) -> str:
+    text = segment.lines[0][1] if segment.lines else ''
+    return text[:20] + ('…' if len(text) > 20 else '')
+
+
+def render_markdown(segments: List[Segment], result: StructuredSummary, original_url: str) -> str:
+    """把片段和模型返回的文字渲染为与普通模式相同结构的 markdown 文档"""
+    total = max(segments[-1].end - segments[0].start, 1) if segments else 1
+    rows = []
+    for segment, title in zip(segments, result.titles):
+        share = (segment.end - segment.start) / total * 100
+        link = f"[{_format_time(segment.start)}]({jump_url(original_url, segment.start)})"
+        title = (title or _fallback_title(segment)).replace('|', '｜')
+        rows.append(f"|{link}|{share:.1f}%|{title}|")
+    table = '\n'.join(rows)
+    return f"""## 视频大总结
+
+{result.summary}
+
+## 视频小总结
+
+|时间线|内容在整个视频中的占比|视频内容|
+|----|----|----|
+{table}
+
+## 适合人群与特色
+
+{result.audience}
+"""
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+AISummarizer 性能测试
+
+在本地替身接口（fake_llm_server）上端到端运行 AISummarizer，不需要API密钥，输出：
+1. 单个视频的延迟分位数（端到端耗时、首字延迟）
+2. 不同并发数下批量总结的吞吐量
+3. 429 突发和 5xx 错误下的重试情况与成功率
+
+用法:
+    python -m utils.test.bench_ai_summarizer --videos 20 --lines 600
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from config import MetricsConfig, SummaryConfig
+from utils.ai_summarizer import AISummarizer, summarize_videos_async
+from utils.llm_client import LLMClient
+from utils.test.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+TEST_URL = "https://www.bilibili.com/video/BV1xx411c7mD"
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def make_transcripts(folder: Path, count: int, lines: int) -> List[Path]:
+    """生成 count 个内容各不相同的 main.txt，避免互相命中缓存"""
+    files = []
+    for n in range(count):
+        path = folder / f"{n + 1}.bench_{n}.main.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            for i in range(lines):
+                f.write(f"{i * 4} 第{n}个视频的第{i}句，我们讨论Python处理视频和音频的第{i % 7}种方法\n")
+        files.append(path)
+    return files
+
+
+def make_summarizer(server: FakeLLMServer, max_in_flight: int, rate_per_minute: float = 0) -> AISummarizer:
+    summarizer = AISummarizer(api_key="bench-key-0123456789", api_base=server.base_url, use_cache=False)
+    # 每组测试使用独立的客户端，避免共享客户端的并发设置互相影响
+    summarizer.client = LLMClient(max_in_flight=max_in_flight, rate_per_minute=rate_per_minute,
+                                  max_retries=SummaryConfig.max_retries, backoff_base=0.1, backoff_max=2)
+    return summarizer
+
+
+def run_batch(summarizer: AISummarizer, files: List[Path]) -> List[str]:
+    return asyncio.run(summarize_videos_async([(file, TEST_URL) for file in files], summarizer=summarizer))
+
+
+def bench_latency(server: FakeLLMServer, files: List[Path]):
+    print("\n[1] 单视频延迟（顺序执行）")
+    summarizer = make_summarizer(server, max_in_flight=SummaryConfig.max_in_flight)
+    totals = []
+    for file in files:
+        start = time.perf_counter()
+        summarizer.generate_summary(file, TEST_URL)
+        totals.append(time.perf_counter() - start)
+    ttfts = [m['ttft'] for m in summarizer.call_metrics]
+    print(f"    端到端: p50={percentile(totals, 50):.3f}s p90={percentile(totals, 90):.3f}s "
+          f"p99={percentile(totals, 99):.3f}s")
+    summarizer.client.close()
+    print(f"    每次调用首字延迟: p50={percentile(ttfts, 50):.3f}s p90={percentile(ttfts, 90):.3f}s "
+          f"（共{len(ttfts)}次调用）")
+
+
+def bench_throughput(server: FakeLLMServer, files: List[Path], levels: List[int]):
+    print("\n[2] 批量总结吞吐量")
+    for level in levels:
+        summarizer = make_summarizer(server, max_in_flight=level)
+        server.reset_stats()
+        start = time.perf_counter()
+        run_batch(summarizer, files)
+        elapsed = time.perf_counter() - start
+        summarizer.client.close()
+        print(f"    并发 {level:>3}: {len(files)} 个视频耗时 {elapsed:.2f}s，"
+              f"{len(files) / elapsed:.2f} 视频/s，{server.requests / elapsed:.1f} 请求/s")
+
+
+def bench_retry(server: FakeLLMServer, files: List[Path]):
+    print("\n[3] 429 突发与 5xx 错误下的重试")
+    server.config.burst_every = 10
+    server.config.burst_length = 3
+    server.config.error_rate = 0.05
+    summarizer = make_summarizer(server, max_in_flight=SummaryConfig.max_in_flight)
+    server.reset_stats()
+    start = time.perf_counter()
+    results = run_batch(summarizer, files)
+    elapsed = time.perf_counter() - start
+    summarizer.client.close()
+    failed = sum(1 for r in results if r.startswith("API调用失败") or r.startswith("错误"))
+    successful_calls = server.status_counts.get(200, 0)
+    print(f"    耗时 {elapsed:.2f}s，成功 {len(files) - failed}/{len(files)} 个视频")
+    print(f"    服务端收到 {server.requests} 个请求，状态码分布 {dict(sorted(server.status_counts.items()))}，"
+          f"平均每次成功调用 {server.requests / max(successful_calls, 1):.2f} 个请求")
+    server.config.burst_every = 0
+    server.config.error_rate = 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AISummarizer 性能测试')
+    parser.add_argument('--videos', type=int, default=12, help='每组测试的视频数')
+    parser.add_argument('--lines', type=int, default=300, help='每个视频的字幕行数')
+    parser.add_argument('--latency', type=float, default=0.05, help='替身接口每个请求的固定延迟（秒）')
+    parser.add_argument('--token-delay', type=float, default=0.001, help='替身接口每个 token 的延迟（秒）')
+    parser.add_argument('--levels', type=str, default='1,4,16', help='吞吐量测试的并发数列表')
+    args = parser.parse_args()
+
+    config = FakeLLMConfig()
+    config.latency = args.latency
+    config.token_delay = args.token_delay
+
+    print("AISummarizer 性能测试")
+    print("-" * 40)
+    with FakeLLMServer(config=config) as server, tempfile.TemporaryDirectory() as temp_dir:
+        print(f"替身接口: {server.base_url}")
+        MetricsConfig.events_file = str(Path(temp_dir) / "metrics.jsonl")
+        files = make_transcripts(Path(temp_dir), args.videos, args.lines)
+        bench_latency(server, files)
+        bench_throughput(server, files, [int(level) for level in args.levels.split(',')])
+        bench_retry(server, files)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+热词纠正性能测试
+
+随机生成大量中文、英文热词和长篇识别结果，输出：
+1. 编译自动机的耗时和节点数
+2. 纠正文本和分词列表的速度（字/秒），分别在多音字模式开启和关闭时测量
+3. 正确性检查：读音相同的错字被替换为热词，分词数量不变
+
+用法:
+    python -m utils.test.bench_hot_words --words 30000 --hours 3
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from utils.hot_words import HotWordCorrector
+
+# 常用字，生成热词和识别结果
+COMMON = ('的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定'
+          '行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然'
+          '前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系')
+ENGLISH = ['GitHub', 'PyTorch', 'CapsWriter', 'Visual Studio', 'FastGPT', 'OpenAI', 'WebSocket', 'FFmpeg']
+CHARS_PER_HOUR = 14000  # 中文语速约每分钟 230 字
+
+
+def make_words(rng: random.Random, count: int):
+    words = {''.join(rng.choice(COMMON) for _ in range(rng.randint(2, 4))) for _ in range(count)}
+    return sorted(words)
+
+
+def make_transcript(rng: random.Random, hot_words, chars: int):
+    """识别结果：随机文本中穿插热词的同音字写法和英文热词的小写写法"""
+    parts, length = [], 0
+    while length < chars:
+        roll = rng.random()
+        if roll < 0.02:
+            piece = rng.choice(hot_words)
+        elif roll < 0.025:
+            piece = ' ' + rng.choice(ENGLISH).lower() + ' '
+        elif roll < 0.1:
+            piece = '，'
+        else:
+            piece = rng.choice(COMMON)
+        parts.append(piece)
+        length += len(piece)
+    text = ''.join(parts)
+    tokens = [char for char in text if char.strip() and char != '，']
+    return text, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热词纠正性能测试')
+    parser.add_argument('--words', type=int, default=30000, help='中文热词数')
+    parser.add_argument('--hours', type=float, default=3, help='识别结果相当于多少小时的语音')
+    parser.add_argument('--min-speed', type=float, default=100000, help='纠正速度的下限（字/秒）')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    hot_words = make_words(rng, args.words)
+    text, tokens = make_transcript(rng, hot_words, int(args.hours * CHARS_PER_HOUR))
+    print("热词纠正性能测试")
+    print("-" * 40)
+    print(f"中文热词 {len(hot_words)} 个，识别结果 {len(text)} 字")
+
+    failures = []
+    for polyphone in (True, False):
+        start = time.perf_counter()
+        corrector = HotWordCorrector(hot_words, ENGLISH, tone=False, polyphone=polyphone)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        corrected, corrected_tokens = corrector.correct(text, tokens)
+        elapsed = time.perf_counter() - start
+        speed = len(text) / elapsed if elapsed else float('inf')
+        print(f"多音字={polyphone}: 编译 {build:.2f}s（{len(corrector.automaton.children)} 个节点），"
+              f"纠正 {elapsed:.3f}s，{speed:,.0f} 字/秒")
+
+        if len(corrected_tokens) != len(tokens):
+            failures.append('分词数量发生变化')
+        if 'GitHub' in ENGLISH and ' github ' in text and 'GitHub' not in corrected:
+            failures.append('英文热词没有被纠正')
+        if speed < args.min_speed:
+            failures.append(f"多音字={polyphone} 时速度 {speed:,.0f} 字/秒 低于阈值")
+
+    sample = HotWordCorrector(['黄章', '重庆']).correct_text('慌张地去了虫青')
+    print(f"示例：慌张地去了虫青 -> {sample}")
+    if sample != '黄章地去了重庆':
+        failures.append('同音字没有被替换为热词')
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务调度测试
+
+在虚拟时钟上模拟混合流量：每隔几秒到达一个几分钟的短视频，期间成批到达几个几小时的直播回放，
+若干工作进程从同一个 SQLite 队列领取任务，处理耗时与音频时长成正比。分别用以下策略运行同一组到达序列：
+1. fifo：按加入顺序领取
+2. sjf：短任务优先，不老化、不为长任务保留名额（长任务可能一直被插队）
+3. sjf + aging + 保留名额：默认配置
+
+输出短任务的等待时间中位数和 P95、长任务的最长等待时间，并检查默认配置下：短任务等待的中位数明显短于 fifo，
+P95 不明显长于 fifo；长任务的最长等待不长于不老化、不保留名额的 sjf，且不超过上限；只有一个工作进程时
+同时加入的任务按时长从短到长领取。最后测量队列中有大量排队任务时单次领取的耗时。
+
+用法:
+    python -m utils.test.bench_job_scheduler --workers 4 --hours 3
+"""
+
+import argparse
+import heapq
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import MetricsConfig, QueueConfig
+from utils import job_queue
+from utils.job_queue import JobQueue
+
+
+class VirtualClock:
+    """替换 job_queue 模块中的 time，让排队和执行不必真的等待"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def make_arrivals(hours: float, short_interval: float, long_batches: int, long_batch_size: int, seed: int = 0):
+    """(到达时间, 音频时长)，短视频 2-10 分钟，直播回放 2-6 小时成批到达"""
+    rng = np.random.default_rng(seed)
+    horizon = hours * 3600
+    arrivals = []
+    t = 0.0
+    while t < horizon:
+        t += rng.exponential(short_interval)
+        arrivals.append((t, float(rng.uniform(120, 600))))
+    for batch in range(long_batches):
+        start = horizon * (batch + 0.5) / long_batches
+        arrivals += [(start + i, float(rng.uniform(2, 6) * 3600)) for i in range(long_batch_size)]
+    return sorted(arrivals)
+
+
+def simulate(db_file: str, arrivals, workers: int, speed: float, clock: VirtualClock) -> dict:
+    """
+    离散事件模拟：到达的任务加入队列，空闲的工作进程立即领取，处理 时长/speed 秒后完成
+
+    Returns:
+        短任务和长任务的等待时间列表
+    """
+    queue = JobQueue(db_file)
+    base = clock.now
+    durations = {}
+    idle = [f"worker-{i}" for i in range(workers)]
+    running = []  # (完成时间, 任务编号, 工作进程)
+    index = 0
+    while index < len(arrivals) or running:
+        next_arrival = base + arrivals[index][0] if index < len(arrivals) else float('inf')
+        next_done = running[0][0] if running else float('inf')
+        clock.now = min(next_arrival, next_done)
+        if next_done <= next_arrival:
+            _, job_id, worker = heapq.heappop(running)
+            queue.advance(job_id, 'done')
+            idle.append(worker)
+        else:
+            duration = arrivals[index][1]
+            job_id, _ = queue.enqueue(f"/sim/{index}.wav", 'file', duration=duration)
+            durations[job_id] = duration
+            index += 1
+        for _, job_id, worker in running:
+            queue.heartbeat(job_id, worker)
+        while idle:
+            job = queue.claim(idle[-1])
+            if job is None:
+                break
+            heapq.heappush(running, (clock.now + job.duration / speed, job.id, idle.pop()))
+
+    waits = {'short': [], 'long': []}
+    with queue.lock:
+        for job_id, waited in queue.conn.execute('SELECT id, waited FROM jobs'):
+            waits['long' if durations[job_id] >= QueueConfig.long_job_seconds else 'short'].append(waited)
+    queue.close()
+    return waits
+
+
+def measure_claim(db_file: str, depth: int, clock: VirtualClock) -> float:
+    """队列中有 depth 个排队任务时，单次领取的平均耗时（秒，真实时间）"""
+    queue = JobQueue(db_file)
+    rng = np.random.default_rng(1)
+    with queue._transaction() as conn:
+        conn.executemany("""
+            INSERT INTO jobs (source, kind, stage, status, duration, created, queued, updated)
+            VALUES (?, 'file', 'ingest', 'queued', ?, ?, ?, ?)
+        """, [(f"/deep/{i}.wav", float(duration), clock.now + i, clock.now + i, clock.now + i)
+              for i, duration in enumerate(rng.uniform(60, 21600, depth))])
+    clock.now += depth
+    claims = 200
+    start = time.perf_counter()
+    for i in range(claims):
+        queue.claim(f"worker-{i}")
+    elapsed = (time.perf_counter() - start) / claims
+    queue.close()
+    return elapsed
+
+
+def single_worker_order(db_file: str, clock: VirtualClock) -> list:
+    """只有一个工作进程时，同时加入的长短任务依次领取的音频时长顺序"""
+    queue = JobQueue(db_file)
+    for i, duration in enumerate([60, 7200, 60, 60, 7200, 60]):
+        queue.enqueue(f"/single/{i}.wav", 'file', duration=duration)
+    order = []
+    while (job := queue.claim('worker-0')) is not None:
+        order.append(int(job.duration))
+        clock.now += job.duration / 30
+        queue.advance(job.id, 'done')
+    queue.close()
+    return order
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='任务调度测试')
+    parser.add_argument('--workers', type=int, default=4, help='工作进程数')
+    parser.add_argument('--hours', type=float, default=3, help='到达任务的时间跨度（小时）')
+    parser.add_argument('--speed', type=float, default=30, help='处理速度（音频秒/秒），包括下载和转录')
+    parser.add_argument('--short-interval', type=float, default=4, help='短视频的平均到达间隔（秒）')
+    parser.add_argument('--long-batches', type=int, default=3, help='直播回放成批到达的次数')
+    parser.add_argument('--long-batch-size', type=int, default=4, help='每批直播回放的数量')
+    parser.add_argument('--min-improvement', type=float, default=3, help='短任务等待中位数相对 fifo 的最低改善倍数')
+    parser.add_argument('--max-p95-ratio', type=float, default=1.2, help='短任务等待 P95 相对 fifo 的上限倍数')
+    parser.add_argument('--max-long-wait', type=float, default=3600, help='默认配置下长任务最长等待时间的上限（秒）')
+    parser.add_argument('--depth', type=int, default=20000, help='测量领取耗时时的排队任务数')
+    args = parser.parse_args()
+
+    print("任务调度测试")
+    print("-" * 40)
+    arrivals = make_arrivals(args.hours, args.short_interval, args.long_batches, args.long_batch_size)
+    audio = sum(duration for _, duration in arrivals)
+    long_count = sum(duration >= QueueConfig.long_job_seconds for _, duration in arrivals)
+    print(f"{len(arrivals)} 个任务（长任务 {long_count} 个），共 {audio / 3600:.0f} 小时音频，"
+          f"{args.workers} 个工作进程，负载 {audio / args.speed / args.workers / (args.hours * 3600):.0%}")
+
+    clock = VirtualClock()
+    original_time = job_queue.time
+    policies = [
+        ('fifo', {'scheduling': 'fifo'}),
+        ('sjf', {'scheduling': 'sjf', 'aging_rate': 0, 'long_job_slots': 0}),
+        ('sjf + aging + 保留名额', {'scheduling': 'sjf'}),
+    ]
+    defaults = {name: getattr(QueueConfig, name) for name in ('scheduling', 'aging_rate', 'long_job_slots')}
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        MetricsConfig.events_file = str(Path(temp_dir) / 'metrics.jsonl')
+        job_queue.time = clock
+        try:
+            for number, (name, overrides) in enumerate(policies):
+                for key, value in {**defaults, **overrides}.items():
+                    setattr(QueueConfig, key, value)
+                start = time.perf_counter()
+                waits = simulate(str(Path(temp_dir) / f'sim-{number}.db'), arrivals, args.workers, args.speed, clock)
+                results[name] = waits
+                short, long = waits['short'], waits['long']
+                print(f"{name:<22}短任务等待 P50 {percentile(short, 0.5):6.0f}s  P95 {percentile(short, 0.95):6.0f}s  "
+                      f"长任务等待 P50 {percentile(long, 0.5):6.0f}s  最长 {max(long, default=0):6.0f}s"
+                      f"（模拟耗时 {time.perf_counter() - start:.1f}s）")
+            for key, value in defaults.items():
+                setattr(QueueConfig, key, value)
+            claim_time = measure_claim(str(Path(temp_dir) / 'deep.db'), args.depth, clock)
+            single_order = single_worker_order(str(Path(temp_dir) / 'single.db'), clock)
+        finally:
+            job_queue.time = original_time
+            for key, value in defaults.items():
+                setattr(QueueConfig, key, value)
+
+    print(f"排队 {args.depth} 个任务时单次领取耗时 {claim_time * 1000:.2f}ms")
+    print(f"单个工作进程的领取顺序：{single_order}")
+    if single_order != sorted(single_order):
+        failures.append('只有一个工作进程时长任务插到了短任务之前')
+    fifo, sjf, scheduled = (results[name] for name, _ in policies)
+    improvement = percentile(fifo['short'], 0.5) / max(percentile(scheduled['short'], 0.5), 1.0)
+    print(f"短任务等待中位数相对 fifo 改善 {improvement:.1f} 倍")
+    if improvement < args.min_improvement:
+        failures.append(f"短任务等待中位数只改善了 {improvement:.1f} 倍")
+    if percentile(scheduled['short'], 0.95) > percentile(fifo['short'], 0.95) * args.max_p95_ratio:
+        failures.append('短任务等待 P95 明显长于 fifo')
+    if max(scheduled['long'], default=0) > max(sjf['long'], default=0):
+        failures.append('老化和保留名额反而延长了长任务的最长等待')
+    if max(scheduled['long'], default=0) > args.max_long_wait:
+        failures.append(f"长任务最长等待 {max(scheduled['long']):.0f}s 超过 {args.max_long_wait:.0f}s")
+    if claim_time > 0.05:
+        failures.append('大量任务排队时领取耗时超过 50ms')
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
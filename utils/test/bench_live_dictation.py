@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+实时听写性能测试
+
+在本地语音识别替身（fake_asr_server）上，用循环播放的合成音频加速模拟几个小时的连续听写，输出：
+1. 结束说话到出字的延迟：整体的中位数和 P95，以及开头和结尾各 20% 次听写的中位数，检查延迟不随时间增长
+2. 进程内存在开头和结尾的差值，检查没有随听写次数增长
+3. 录音回调单次写入的最长耗时；网络卡住（没有消费者）时写入仍然立即返回，放不下的录音被丢弃
+
+用法:
+    python -m utils.test.bench_live_dictation --hours 1 --speed 100
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import ClientConfig, DictationConfig, MetricsConfig
+from utils.live_audio import SAMPLE_RATE, ArraySource, RingBuffer
+from utils.live_dictation import LiveDictation, play_sessions
+from utils.memory_governor import MB, current_rss
+from utils.test.fake_asr_server import FakeASRConfig, FakeASRServer
+
+
+def check_stalled_ring(failures: list):
+    """没有消费者时写满缓冲区：写入不阻塞，超出的部分计入 dropped"""
+    ring = RingBuffer(seconds=1)
+    block = np.ones(int(DictationConfig.block_seconds * SAMPLE_RATE), dtype='<f4')
+    slowest = 0.0
+    for _ in range(int(3 / DictationConfig.block_seconds)):
+        start = time.perf_counter()
+        ring.write(block)
+        slowest = max(slowest, time.perf_counter() - start)
+    print(f"网络卡住时：写入 3s 录音，缓冲区 1s，丢弃 {ring.dropped / SAMPLE_RATE:.1f}s，"
+          f"单次写入最长 {slowest * 1e6:.0f}µs")
+    if abs(ring.dropped - 2 * SAMPLE_RATE) > len(block):
+        failures.append('缓冲区写满后丢弃的录音时长不正确')
+    if slowest > 0.005:
+        failures.append('缓冲区写满后写入耗时超过 5ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='实时听写性能测试')
+    parser.add_argument('--hours', type=float, default=1, help='模拟的听写总时长（小时）')
+    parser.add_argument('--speed', type=float, default=100, help='送入音频的速度（相对实时）')
+    parser.add_argument('--session', type=float, default=10, help='每次听写的时长（秒）')
+    parser.add_argument('--gap', type=float, default=2, help='两次听写之间的停顿（秒）')
+    parser.add_argument('--rtf', type=float, default=0.002, help='识别替身的实时率')
+    parser.add_argument('--max-growth', type=float, default=1.5, help='结尾与开头延迟中位数之比的上限')
+    parser.add_argument('--max-rss-growth-mb', type=float, default=50, help='内存增长的上限（MB）')
+    args = parser.parse_args()
+
+    print("实时听写性能测试")
+    print("-" * 40)
+    failures = []
+    check_stalled_ring(failures)
+
+    config = FakeASRConfig()
+    config.rtf = args.rtf
+    rng = np.random.default_rng(0)
+    clip = (rng.standard_normal(SAMPLE_RATE * 30) * 0.1).astype('<f4')
+    with FakeASRServer(config=config) as server, tempfile.TemporaryDirectory() as temp_dir:
+        ClientConfig.addr, ClientConfig.port = server.host, str(server.port)
+        MetricsConfig.events_file = str(Path(temp_dir) / 'metrics.jsonl')
+        source = ArraySource(clip, speed=args.speed, duration=args.hours * 3600)
+        results = []
+        dictation = LiveDictation(source, output=results.append, save_audio=False, threshold=0)
+        dictation.latencies = []  # 保留全部延迟，比较开头和结尾
+        rss = {}
+
+        script = play_sessions(args.session, args.gap)
+
+        async def watched(dictation):
+            rss['start'] = current_rss()
+            await script(dictation)
+
+        start = time.perf_counter()
+        asyncio.run(dictation.run(watched))
+        elapsed = time.perf_counter() - start
+        rss['end'] = current_rss()
+
+    latencies = dictation.latencies
+    sessions = int(args.hours * 3600 // (args.session + args.gap))
+    print(f"语音识别替身 rtf={args.rtf}，{args.speed:.0f} 倍速模拟 {args.hours} 小时，耗时 {elapsed:.1f}s")
+    if not latencies:
+        print("\n测试失败：没有收到任何识别结果")
+        sys.exit(1)
+    tail = max(1, len(latencies) // 5)
+    head_median = statistics.median(latencies[:tail])
+    tail_median = statistics.median(latencies[-tail:])
+    ordered = sorted(latencies)
+    print(f"听写 {len(latencies)} 次（预计约 {sessions} 次），有结果 {len(results)} 次")
+    print(f"出字延迟：中位数 {statistics.median(latencies) * 1000:.0f}ms，"
+          f"P95 {ordered[int(len(ordered) * 0.95)] * 1000:.0f}ms，"
+          f"开头 20% {head_median * 1000:.0f}ms，结尾 20% {tail_median * 1000:.0f}ms")
+    growth = (rss['end'] - rss['start']) / MB
+    print(f"内存：开始 {rss['start'] / MB:.0f}MB，结束 {rss['end'] / MB:.0f}MB（增长 {growth:.1f}MB）")
+    print(f"录音回调单次写入最长 {source.max_write * 1e6:.0f}µs，丢弃录音 {dictation.ring.dropped / SAMPLE_RATE:.1f}s")
+
+    if len(latencies) < sessions * 0.9:
+        failures.append(f"只完成了 {len(latencies)} 次听写")
+    if tail_median > head_median * args.max_growth + 0.02:
+        failures.append('结尾的出字延迟明显高于开头')
+    if growth > args.max_rss_growth_mb:
+        failures.append(f"内存增长 {growth:.1f}MB 超过阈值")
+    if dictation.ring.dropped:
+        failures.append('正常网络下丢弃了录音')
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+解码缓存性能测试
+
+用 ffmpeg 生成一段长音频（44.1kHz 双声道 WAV，需要重采样），比较：
+1. 多次读取同一文件时，每次用 ffmpeg 解码与经过 pcm_cache（第一次解码，之后直接映射）的耗时
+2. 缓存的采样与直接解码的结果一致，按时间切片不复制数据
+3. 音频归档为 FLAC 后仍然命中，源文件被修改后重新解码
+4. 超出预算时淘汰最久未使用的缓存
+
+用法:
+    python -m utils.test.bench_pcm_cache --minutes 30 --passes 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import PcmCacheConfig
+from utils.pcm_cache import SAMPLE_RATE, cache_file_for, decode_pcm, load_pcm
+
+
+def make_audio(path: Path, seconds: float, rate: int = 44100, channels: int = 2):
+    subprocess.run(['ffmpeg', '-nostdin', '-y', '-v', 'error', '-f', 'lavfi', '-i',
+                    f'anoisesrc=d={seconds}:c=pink:r={rate}:a=0.1', '-ac', str(channels), str(path)], check=True)
+
+
+def check_slices(samples: np.ndarray, pcm, failures: list):
+    """随机切出 30 秒的片段，检查是缓存文件的视图且内容正确"""
+    rng = np.random.default_rng(0)
+    starts = rng.uniform(0, max(0.0, pcm.duration - 30), 1000)
+    start_time = time.perf_counter()
+    segments = [pcm.segment(start, start + 30) for start in starts]
+    elapsed = time.perf_counter() - start_time
+    print(f"切出 {len(segments)} 个 30 秒片段：{elapsed * 1000:.1f}ms")
+    if not all(isinstance(segment, np.memmap) and np.shares_memory(segment, pcm.samples) for segment in segments):
+        failures.append('切片不是缓存文件的视图')
+    start = int(starts[0] * SAMPLE_RATE)
+    if not np.array_equal(segments[0], samples[start:start + 30 * SAMPLE_RATE]):
+        failures.append('切片内容与直接解码不一致')
+
+
+def check_archive(folder: Path, failures: list):
+    """归档为 FLAC 后命中缓存，修改源文件后重新解码"""
+    before = len(failures)
+    wav_file = folder / 'archived.wav'
+    make_audio(wav_file, 20, rate=SAMPLE_RATE, channels=1)
+    if load_pcm(wav_file).cached:
+        failures.append('第一次读取不应命中缓存')
+    flac_file = wav_file.with_suffix('.flac')
+    subprocess.run(['ffmpeg', '-nostdin', '-y', '-v', 'error', '-i', str(wav_file), str(flac_file)], check=True)
+    wav_file.unlink()
+    if not load_pcm(flac_file).cached:
+        failures.append('归档为 FLAC 后没有命中缓存')
+    stat = flac_file.stat()
+    os.utime(flac_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    if load_pcm(flac_file).cached:
+        failures.append('源文件修改后仍然命中了旧的缓存')
+    print("归档与失效：通过" if len(failures) == before else "归档与失效：未通过")
+
+
+def check_eviction(folder: Path, failures: list):
+    """预算只能容纳两个文件时，读取第三个文件淘汰最久未使用的一个"""
+    files = [folder / f'evict-{name}.wav' for name in 'abc']
+    for file in files:
+        make_audio(file, 10, rate=SAMPLE_RATE, channels=1)
+    first, second, third = files
+    budget = PcmCacheConfig.budget_mb
+    PcmCacheConfig.budget_mb = 2.5 * 10 * SAMPLE_RATE * 4 / 1024 / 1024
+    try:
+        load_pcm(first)
+        time.sleep(0.05)
+        load_pcm(second)
+        time.sleep(0.05)
+        load_pcm(first)  # 再次使用，second 成为最久未使用的
+        time.sleep(0.05)
+        load_pcm(third)
+    finally:
+        PcmCacheConfig.budget_mb = budget
+    kept = [cache_file_for(file).exists() for file in files]
+    print(f"淘汰：保留 {[file.stem for file, exists in zip(files, kept) if exists]}")
+    if kept != [True, False, True]:
+        failures.append('没有按最近使用时间淘汰')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解码缓存性能测试')
+    parser.add_argument('--minutes', type=float, default=30, help='测试音频的时长（分钟）')
+    parser.add_argument('--passes', type=int, default=5, help='读取同一文件的次数')
+    parser.add_argument('--min-speedup', type=float, default=100, help='命中缓存相对重新解码的最低加速比')
+    parser.add_argument('--max-first-overhead', type=float, default=1.5, help='首次读取（解码并写入缓存）相对直接解码的耗时上限')
+    args = parser.parse_args()
+
+    print("解码缓存性能测试")
+    print("-" * 40)
+    failures = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = Path(temp_dir)
+        PcmCacheConfig.cache_dir = str(folder / 'pcm-cache')
+        media_file = folder / 'long.wav'
+        make_audio(media_file, args.minutes * 60)
+        print(f"测试音频：{args.minutes:.0f} 分钟，{media_file.stat().st_size / 1024 / 1024:.0f}MB")
+
+        start = time.perf_counter()
+        for _ in range(args.passes):
+            samples = decode_pcm(media_file)
+        decode_time = time.perf_counter() - start
+
+        timings = []
+        for _ in range(args.passes):
+            start = time.perf_counter()
+            pcm = load_pcm(media_file)
+            np.add.reduce(pcm.samples[::SAMPLE_RATE])  # 访问整个文件范围，确保映射可用
+            timings.append(time.perf_counter() - start)
+        cached_time = sum(timings)
+        print(f"每次解码：{args.passes} 次共 {decode_time:.2f}s（每次 {decode_time / args.passes:.2f}s）")
+        print(f"经过缓存：{args.passes} 次共 {cached_time:.2f}s（首次 {timings[0]:.2f}s，"
+              f"之后每次 {sum(timings[1:]) / max(1, len(timings) - 1) * 1000:.1f}ms）")
+        per_decode = decode_time / args.passes
+        per_hit = sum(timings[1:]) / max(1, len(timings) - 1)
+        speedup = per_decode / per_hit if per_hit else float('inf')
+        print(f"总耗时加速比：{decode_time / cached_time:.1f}x，命中缓存相对重新解码：{speedup:.0f}x")
+
+        if not pcm.cached or not isinstance(pcm.samples, np.memmap):
+            failures.append('重复读取没有命中缓存')
+        if not np.array_equal(pcm.samples, samples):
+            failures.append('缓存的采样与直接解码的结果不一致')
+        if speedup < args.min_speedup:
+            failures.append(f"命中缓存的加速比 {speedup:.0f}x 低于 {args.min_speedup:.0f}x")
+        if timings[0] > per_decode * args.max_first_overhead:
+            failures.append(f"首次读取耗时 {timings[0]:.2f}s 超过直接解码的 {args.max_first_overhead} 倍")
+        check_slices(samples, pcm, failures)
+        del pcm, samples
+
+        check_archive(folder, failures)
+        check_eviction(folder, failures)
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
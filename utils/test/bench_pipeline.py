@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+转录流程端到端性能测试
+
+用 ffmpeg 生成不同时长的合成音频（正弦波、粉红噪声），在本地语音识别替身（fake_asr_server）上
+运行与 process_audio_file.py 相同的 process_file 流程：ffmpeg 解码、上传、识别、对齐生成 srt 和 main.txt。
+输出每个文件的吞吐量（音频秒数/耗时）和各阶段耗时（来自 utils.metrics 的事件），以及进程的峰值内存，
+超出回归阈值时以非零状态码退出。
+
+需要 ffmpeg；不调用AI总结（合成音频没有视频链接）。
+
+用法:
+    python -m utils.test.bench_pipeline --lengths 30,300,1800 --rtf 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from config import ArchiveConfig, ClientConfig, MetricsConfig, PcmCacheConfig
+from utils import metrics, search_index, semantic_index
+from utils.test.fake_asr_server import FakeASRConfig, FakeASRServer
+
+# 回归阈值
+MIN_THROUGHPUT = 5.0  # 每秒处理的音频秒数下限（识别替身的 rtf 为 0.02 时）
+MAX_RSS_MB = 1024  # 进程峰值内存上限（MB）
+MAX_STAGE_RTF = {'decode': 0.05, 'upload': 0.05, 'align': 0.05}  # 各阶段耗时 / 音频时长 的上限
+
+FIXTURES = {
+    'tone': 'sine=frequency=440:sample_rate=16000:duration={seconds}',
+    'noise': 'anoisesrc=color=pink:amplitude=0.3:sample_rate=16000:duration={seconds}',
+}
+
+
+def make_fixture(folder: Path, kind: str, seconds: int, number: int) -> Path:
+    """用 ffmpeg 的 lavfi 音源生成单声道 WAV"""
+    path = folder / f"{number}.{kind}_{seconds}s.wav"
+    subprocess.run(['ffmpeg', '-nostdin', '-y', '-v', 'error', '-f', 'lavfi',
+                    '-i', FIXTURES[kind].format(seconds=seconds), '-ac', '1', str(path)], check=True)
+    return path
+
+
+def peak_rss_mb() -> float:
+    """本进程和已结束的子进程（ffmpeg）中较大的峰值内存，不支持的平台返回 0"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / scale
+
+
+async def run_files(files: List[Path]) -> List[float]:
+    from process_audio_file import process_file
+    from utils.client_ws import Cosmic
+
+    elapsed = []
+    for file in files:
+        start = time.perf_counter()
+        await process_file(file)
+        elapsed.append(time.perf_counter() - start)
+    if Cosmic.websocket:
+        await Cosmic.websocket.close()
+        Cosmic.websocket = None
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='转录流程端到端性能测试')
+    parser.add_argument('--lengths', type=str, default='30,300,1200', help='合成音频的时长列表（秒）')
+    parser.add_argument('--kinds', type=str, default='tone,noise', help='合成音频的类型：tone、noise')
+    parser.add_argument('--rtf', type=float, default=0.02, help='识别替身的实时率')
+    parser.add_argument('--min-throughput', type=float, default=MIN_THROUGHPUT)
+    parser.add_argument('--max-rss-mb', type=float, default=MAX_RSS_MB)
+    args = parser.parse_args()
+
+    config = FakeASRConfig()
+    config.rtf = args.rtf
+
+    print("转录流程端到端性能测试")
+    print("-" * 40)
+    with FakeASRServer(config=config) as server, tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        # 客户端连接替身服务；指标、检索索引都写到临时目录，不归档音频
+        ClientConfig.addr, ClientConfig.port = server.host, str(server.port)
+        ArchiveConfig.archive = False
+        MetricsConfig.events_file = str(temp_dir / 'metrics.jsonl')
+        PcmCacheConfig.cache_dir = str(temp_dir / 'pcm-cache')
+        search_index.get_index_file = lambda: str(temp_dir / 'search.db')
+        semantic_index.get_index_dir = lambda: str(temp_dir / 'semantic-index')
+        print(f"语音识别替身: {server.url}，rtf={args.rtf}")
+
+        files = []
+        for kind in args.kinds.split(','):
+            for seconds in (int(length) for length in args.lengths.split(',')):
+                files.append(make_fixture(temp_dir, kind, seconds, len(files) + 1))
+        elapsed = asyncio.run(run_files(files))
+
+        stages = {}
+        for event in metrics.read_events():
+            stages.setdefault(event['job'], {})[event['stage']] = event
+
+    failures = []
+    print(f"\n{'文件':<24}{'音频(s)':>9}{'耗时(s)':>9}{'吞吐':>8}{'解码':>8}{'上传':>8}{'识别':>8}{'对齐':>8}")
+    total_audio = 0.0
+    for file, seconds in zip(files, elapsed):
+        job = stages.get(metrics.job_id(file), {})
+        audio = job.get('decode', {}).get('audio_seconds', 0)
+        total_audio += audio
+        throughput = audio / seconds if seconds else 0
+        columns = [job.get(stage, {}).get('seconds', float('nan')) for stage in ('decode', 'upload', 'asr', 'align')]
+        print(f"{file.name:<24}{audio:>9.0f}{seconds:>9.2f}{throughput:>8.1f}" + ''.join(f"{c:>8.2f}" for c in columns))
+        if 'align' not in job:
+            failures.append(f"{file.name} 没有生成字幕")
+        for stage, limit in MAX_STAGE_RTF.items():
+            if audio and job.get(stage, {}).get('seconds', 0) / audio > limit:
+                failures.append(f"{file.name} 的 {stage} 阶段耗时超过音频时长的 {limit:.0%}")
+
+    throughput = total_audio / sum(elapsed) if sum(elapsed) else 0
+    rss = peak_rss_mb()
+    print(f"\n总吞吐量: {throughput:.1f} 音频秒/秒，峰值内存: {rss:.0f}MB，"
+          f"服务端收到 {server.messages_received} 条消息、{server.bytes_received / 1024 / 1024:.1f}MB")
+    if throughput < args.min_throughput:
+        failures.append(f"总吞吐量 {throughput:.1f} 低于阈值 {args.min_throughput}")
+    if rss > args.max_rss_mb:
+        failures.append(f"峰值内存 {rss:.0f}MB 超过阈值 {args.max_rss_mb:.0f}MB")
+
+    print(json.dumps({'throughput': round(throughput, 2), 'peak_rss_mb': round(rss), 'failures': failures},
+                     ensure_ascii=False))
+    if failures:
+        print("\n性能回归：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
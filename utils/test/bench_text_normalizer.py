@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文本规范化性能测试
+
+随机生成长篇识别结果（中文、中文数字、@@ 续接的英文子词、服务端标点和停顿），输出：
+1. 单次扫描的 normalize 与多次 re.sub 串联的写法在整篇文本上的速度
+2. 按 25 秒一段逐段输入时，TextNormalizer 与每来一段就对累计文本重跑 re.sub 的总耗时
+3. 正确性检查：逐段输入与一次输入的结果一致，词的位置与文本一致，按规范化后的词生成的字幕起始时间
+   与分词时间戳一致（对照：分行稿转换了数字、仍按原始分词匹配时的一致率）
+
+用法:
+    python -m utils.test.bench_text_normalizer --hours 3
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+
+from utils.multi_from_txt import lines_match_words
+from utils.text_normalizer import BREAK_STRENGTH, TextNormalizer, chinese_to_arabic, normalize
+
+COMMON = '的是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定'
+NUMBERS = ['一百二十三', '三点五', '百分之五十', '二零二四', '两千', '十二万三千', '七八', '一万五', '三十', '零点六']
+ENGLISH = [['python'], ['git@@', 'hub'], ['vs', 'code'], ['open@@', 'ai'], ['docker']]
+SEGMENT_SECONDS = 25
+TOKEN_SECONDS = 0.25
+
+_numeral_pattern = re.compile('[零〇幺一二三四五六七八九两十百千万亿点]+')
+_percent_pattern = re.compile('百分之([0-9.]+)')
+
+
+def make_transcript(rng: random.Random, hours: float):
+    """返回按 25 秒分段的 (文本, 分词, 时间戳) 列表"""
+    segments, tokens, timestamps, text = [], [], [], []
+    now = 0.0
+    while now < hours * 3600:
+        roll = rng.random()
+        if roll < 0.05:
+            words = list(rng.choice(NUMBERS))
+        elif roll < 0.08:
+            words = rng.choice(ENGLISH)
+            text.append(' ' + ' '.join(w.replace('@@', '') for w in words).replace('  ', ' ') + ' ')
+            text[-1] = text[-1].replace('git hub', 'github').replace('open ai', 'openai')
+            tokens += words
+            timestamps += [now + TOKEN_SECONDS * i for i in range(len(words))]
+            now += TOKEN_SECONDS * len(words)
+            words = []
+        else:
+            words = [rng.choice(COMMON) for _ in range(rng.randint(2, 8))]
+        for word in words:
+            text.append(word)
+            tokens.append(word)
+            timestamps.append(now)
+            now += TOKEN_SECONDS
+        if rng.random() < 0.3:
+            text.append(rng.choice('，，，。？,'))
+        if rng.random() < 0.02:
+            now += 2.5  # 长停顿，服务端没有加标点
+        if timestamps and timestamps[-1] >= (len(segments) + 1) * SEGMENT_SECONDS:
+            segments.append((''.join(text), tokens, timestamps))
+            text, tokens, timestamps = [], [], []
+    if tokens:
+        segments.append((''.join(text), tokens, timestamps))
+    return segments
+
+
+def naive_normalize(text: str) -> str:
+    """多次 re.sub 串联的写法：数字、百分号、标点宽度、重复标点、中英空格、分行各扫描一遍"""
+    text = _numeral_pattern.sub(lambda m: chinese_to_arabic(m.group()) or m.group(), text)
+    text = _percent_pattern.sub(r'\1%', text)
+    for half, full in ((',', '，'), ('.', '。'), ('?', '？'), ('!', '！'), (';', '；')):
+        text = re.sub(rf'(?<=[^\x00-\x7f]){re.escape(half)}', full, text)
+        text = re.sub(rf'(?<=[\x00-\x7f]){re.escape(full)}(?=[\x00-\x7f])', half, text)
+    text = re.sub('[，。？！；]{2,}', lambda m: max(m.group(), key=BREAK_STRENGTH.get), text)
+    text = re.sub(r'([一-鿿])([A-Za-z])', r'\1 \2', text)
+    text = re.sub(r'([A-Za-z])([一-鿿])', r'\1 \2', text)
+    text = re.sub(' +', ' ', text)
+    re.split('[，。？！；]', text)
+    return text
+
+
+def expected_starts(lines, words, timestamps):
+    """每行第一个词的时间戳：行内去掉空格后正好是连续的若干个词"""
+    starts, position = [], 0
+    for line in lines:
+        remaining = line.replace(' ', '')
+        if not remaining:
+            continue
+        starts.append(timestamps[position])
+        while remaining and position < len(words):
+            remaining = remaining[len(words[position]):]
+            position += 1
+    return starts
+
+
+def start_accuracy(lines, words, timestamps, expected) -> float:
+    """按 words 生成字幕，起始时间与期望一致的比例"""
+    entries = [{'word': word, 'start': start, 'end': start + 0.2} for word, start in zip(words, timestamps)]
+    subtitles, _ = lines_match_words(lines, entries)
+    hits = sum(abs(subtitle.start.total_seconds() - start) < 1e-6 for subtitle, start in zip(subtitles, expected))
+    return hits / max(1, len(expected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本规范化性能测试')
+    parser.add_argument('--hours', type=float, default=3, help='识别结果相当于多少小时的语音')
+    parser.add_argument('--min-speed', type=float, default=100000, help='单次扫描速度的下限（分词/秒）')
+    parser.add_argument('--min-accuracy', type=float, default=0.98, help='字幕起始时间一致率的下限')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    segments = make_transcript(rng, args.hours)
+    text = ''.join(segment[0] for segment in segments)
+    tokens = [token for segment in segments for token in segment[1]]
+    timestamps = [timestamp for segment in segments for timestamp in segment[2]]
+    print("文本规范化性能测试")
+    print("-" * 40)
+    print(f"识别结果 {len(text)} 字，{len(tokens)} 个分词，{len(segments)} 段")
+
+    failures = []
+    start = time.perf_counter()
+    result = normalize(text, tokens, timestamps, num=True, punc=True, spell=True)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    naive_normalize(text)
+    naive = time.perf_counter() - start
+    speed = len(tokens) / single if single else float('inf')
+    print(f"整篇：单次扫描 {single:.3f}s（{speed:,.0f} 分词/秒，含分词映射和分行），re.sub 串联 {naive:.3f}s（只有文本）")
+
+    start = time.perf_counter()
+    normalizer = TextNormalizer(num=True, punc=True, spell=True)
+    pieces = [normalizer.feed(segment_tokens, segment_timestamps, segment_text)
+              for segment_text, segment_tokens, segment_timestamps in segments]
+    streamed = normalizer.finish()
+    streaming = time.perf_counter() - start
+    start = time.perf_counter()
+    accumulated = ''
+    for segment_text, _, _ in segments:
+        accumulated += segment_text
+        naive_normalize(accumulated)
+    naive_streaming = time.perf_counter() - start
+    print(f"逐段输入：TextNormalizer {streaming:.3f}s，每段对累计文本重跑 re.sub {naive_streaming:.3f}s "
+          f"（{naive_streaming / streaming if streaming else float('inf'):.0f} 倍）")
+
+    if streamed.text != result.text or streamed.lines != result.lines or streamed.words != result.words:
+        failures.append('逐段输入与一次输入的结果不一致')
+    if not streamed.text.startswith(''.join(pieces)):
+        failures.append('逐段返回的文本不是最终文本的前缀')
+    if any(result.text[a:b] != word for word, (a, b) in zip(result.words, result.spans)):
+        failures.append('词的位置与文本不一致')
+    if len(result.token_words) != len(tokens) or any(i < 0 for i in result.token_words):
+        failures.append('分词映射不完整')
+    if speed < args.min_speed:
+        failures.append(f"单次扫描速度 {speed:,.0f} 分词/秒 低于阈值")
+
+    expected = expected_starts(result.lines, result.words, result.timestamps)
+    accuracy = start_accuracy(result.lines, result.words, result.timestamps, expected)
+    raw_accuracy = start_accuracy(result.lines, [token.replace('@', '') for token in tokens], timestamps, expected)
+    print(f"字幕起始时间一致率：按规范化后的词 {accuracy:.1%}，按原始分词 {raw_accuracy:.1%}")
+    if accuracy < args.min_accuracy:
+        failures.append(f"字幕起始时间一致率 {accuracy:.1%} 低于阈值")
+
+    sample = normalize('我今年二十五岁，用python写了一百二十三行代码,增长百分之三点五', list('我今年二十五岁用')
+                       + ['py@@', 'thon'] + list('写了一百二十三行代码增长百分之三点五'), [i * 0.25 for i in range(29)])
+    print(f"示例：{sample.text}")
+    if sample.text != '我今年25岁，用 python 写了123行代码，增长3.5%。':
+        failures.append('示例的规范化结果不正确')
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地的语音识别服务端替身，用于离线测试和压测 transcribe_send / transcribe_recv
+
+与 CapsWriter 服务端使用相同的 websocket 消息协议：
+- 客户端发送 JSON 文本消息：task_id、seg_duration、seg_overlap、is_final、time_start、time_frame、source、
+  data（base64 编码的 16kHz 单声道 float32 音频）
+- 也可以发送二进制消息，内容是原始的 float32 音频，归属于该连接上最近一个 JSON 消息的任务
+- 服务端每识别完一个分段发送一条进度消息（is_final 为 False），包含累计的 duration 和该分段的 tokens、
+  timestamps、text；收到 is_final 的消息并识别完剩余音频后，发送包含全部结果和 time_complete 的最终消息
+
+识别结果是确定性的假数据：每 token_interval 秒的非静音音频产生一个汉字，每 punc_every 个字插入标点，
+按 rtf（实时率）模拟识别耗时，workers 限制同时识别的分段数。
+
+用法:
+    python -m utils.test.fake_asr_server --port 16006 --rtf 0.05
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import websockets
+
+SAMPLE_RATE = 16000
+VOCABULARY = '我们今天来讨论一下视频音频处理的方法首先需要安装工具然后编写代码最后生成字幕大家好谢谢观看'
+
+
+class FakeASRConfig:
+    rtf = 0.05  # 实时率：识别 1 秒音频耗时 rtf 秒
+    token_interval = 0.3  # 每隔多少秒音频产生一个 token
+    silence_threshold = 1e-3  # RMS 低于该值的音频视为静音，不产生 token
+    punc_every = 8  # 每多少个 token 插入一个标点
+    workers = 2  # 同时识别的分段数，模拟服务端的算力
+    seed = 0
+
+
+class _Task:
+    def __init__(self, task_id: str, time_start: float, seg_duration: float):
+        self.task_id = task_id
+        self.time_start = time_start
+        self.time_submit = time.time()
+        self.seg_duration = seg_duration
+        self.chunks: List[np.ndarray] = []
+        self.received = 0  # 已接收的采样数
+        self.processed = 0  # 已识别的采样数
+        self.is_final = False
+        self.tokens: List[str] = []
+        self.timestamps: List[float] = []
+        self.text = ''
+        self.arrived = asyncio.Event()
+
+    def append(self, data: bytes):
+        samples = np.frombuffer(data[:len(data) // 4 * 4], dtype='<f4')
+        self.chunks.append(samples)
+        self.received += len(samples)
+        self.arrived.set()
+
+    def take(self, count: int) -> np.ndarray:
+        """取出接下来 count 个未识别的采样"""
+        audio = np.concatenate(self.chunks) if len(self.chunks) > 1 else (self.chunks[0] if self.chunks else
+                                                                           np.zeros(0, dtype='<f4'))
+        self.chunks = [audio[count:]] if len(audio) > count else []
+        return audio[:count]
+
+
+class FakeASRServer:
+    """
+    在后台线程运行的替身服务，可用作上下文管理器
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, config: Optional[FakeASRConfig] = None):
+        self.host = host
+        self.port = port
+        self.config = config or FakeASRConfig()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.tasks_completed = 0
+        self.audio_seconds = 0.0
+        self.messages_received = 0
+        self.bytes_received = 0
+        self._stopped: Optional[asyncio.Event] = None
+
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop and self._stopped:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+            self.thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, e, exc_tb):
+        self.stop()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._workers = asyncio.Semaphore(self.config.workers)
+        async with websockets.serve(self._handle, self.host, self.port, max_size=None,
+                                    subprotocols=['binary']) as server:
+            self.port = next(iter(server.sockets)).getsockname()[1]
+            self.ready.set()
+            await self._stopped.wait()
+
+    def recognize(self, audio: np.ndarray, offset: float) -> Tuple[List[str], List[float]]:
+        """确定性地为一段音频生成 token 和时间戳"""
+        interval = int(self.config.token_interval * SAMPLE_RATE)
+        tokens, timestamps = [], []
+        for start in range(0, len(audio) - interval // 2, interval):
+            frame = audio[start:start + interval]
+            if np.sqrt(np.mean(np.square(frame, dtype=np.float64))) < self.config.silence_threshold:
+                continue
+            timestamp = round(offset + start / SAMPLE_RATE, 2)
+            # 同一时间点总是得到同一个字，与分段方式无关
+            index = random.Random(f'{self.config.seed}-{timestamp}').randrange(len(VOCABULARY))
+            tokens.append(VOCABULARY[index])
+            timestamps.append(timestamp)
+        return tokens, timestamps
+
+    async def _process(self, websocket, task: _Task):
+        """按分段识别任务的音频，每个分段完成后发送进度，全部完成后发送最终结果"""
+        token_count = 0
+        while True:
+            segment = int(task.seg_duration * SAMPLE_RATE)
+            pending = task.received - task.processed
+            if pending < segment and not task.is_final:
+                task.arrived.clear()
+                await task.arrived.wait()
+                continue
+            if pending <= 0 and task.is_final:
+                break
+            audio = task.take(min(segment, pending))
+            offset = task.processed / SAMPLE_RATE
+            async with self._workers:
+                await asyncio.sleep(len(audio) / SAMPLE_RATE * self.config.rtf)
+            tokens, timestamps = self.recognize(audio, offset)
+            text = ''
+            for token in tokens:
+                token_count += 1
+                text += token + ('，' if token_count % self.config.punc_every == 0 else '')
+            task.processed += len(audio)
+            task.tokens += tokens
+            task.timestamps += timestamps
+            task.text += text
+            await websocket.send(json.dumps({
+                'task_id': task.task_id,
+                'duration': task.processed / SAMPLE_RATE,
+                'time_start': task.time_start,
+                'time_submit': task.time_submit,
+                'tokens': tokens,
+                'timestamps': timestamps,
+                'text': text,
+                'is_final': False,
+            }, ensure_ascii=False))
+
+        text = task.text.rstrip('，') + ('。' if task.text else '')
+        await websocket.send(json.dumps({
+            'task_id': task.task_id,
+            'duration': task.processed / SAMPLE_RATE,
+            'time_start': task.time_start,
+            'time_submit': task.time_submit,
+            'time_complete': time.time(),
+            'tokens': task.tokens,
+            'timestamps': task.timestamps,
+            'text': text,
+            'is_final': True,
+        }, ensure_ascii=False))
+        with self.lock:
+            self.tasks_completed += 1
+            self.audio_seconds += task.processed / SAMPLE_RATE
+
+    async def _handle(self, websocket):
+        tasks: Dict[str, _Task] = {}
+        workers = []
+        current: Optional[_Task] = None
+        try:
+            async for message in websocket:
+                with self.lock:
+                    self.messages_received += 1
+                    self.bytes_received += len(message)
+                if isinstance(message, bytes):
+                    if current is not None:
+                        current.append(message)
+                    continue
+                message = json.loads(message)
+                task = tasks.get(message['task_id'])
+                if task is None:
+                    task = tasks[message['task_id']] = _Task(
+                        message['task_id'], message.get('time_start', time.time()),
+                        message.get('seg_duration', 25)
+                    )
+                    workers.append(asyncio.create_task(self._process(websocket, task)))
+                current = task
+                if message.get('data'):
+                    task.append(base64.b64decode(message['data']))
+                if message.get('is_final'):
+                    task.is_final = True
+                    task.arrived.set()
+            await asyncio.gather(*workers)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地的语音识别服务端替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=16006)
+    parser.add_argument('--rtf', type=float, default=FakeASRConfig.rtf)
+    parser.add_argument('--workers', type=int, default=FakeASRConfig.workers)
+    args = parser.parse_args()
+
+    config = FakeASRConfig()
+    config.rtf = args.rtf
+    config.workers = args.workers
+    server = FakeASRServer(args.host, args.port, config).start()
+    print(f'语音识别服务端替身: {server.url}')
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地的 OpenAI 兼容接口替身，用于离线测试和压测 AISummarizer
+
+支持：
+- POST {base}/chat/completions，普通和 stream: true（SSE，chunked 传输）两种响应
+- FastGPT 风格的接口：路径以 /ziki.top 开头，只有 fastgpt_method 指定的方式返回 200，其他方式返回 403
+- 可配置的固定延迟、每 token 延迟、5xx 错误率和周期性的 429 突发（带 Retry-After）
+
+返回内容根据 prompt 中的时间戳确定性地生成，格式与真实总结一致。
+
+用法:
+    python -m utils.test.fake_llm_server --port 18080 --latency 0.2 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+FASTGPT_PREFIX = '/ziki.top'
+
+
+class FakeLLMConfig:
+    latency = 0.05  # 每个请求的固定延迟（秒）
+    token_delay = 0.002  # 每输出一个 token 的延迟（秒）
+    error_rate = 0.0  # 返回 500 的概率
+    burst_every = 0  # 每多少个请求触发一次 429 突发，0 表示不触发
+    burst_length = 3  # 每次 429 突发持续的请求数
+    retry_after = 0.2  # 429 响应的 Retry-After（秒）
+    fastgpt_method = 'Authorization header + 基础格式'  # FastGPT 接口接受的调用方式
+    seed = 0
+
+
+def fake_completion(prompt: str) -> str:
+    """根据 prompt 确定性地生成回复"""
+    seconds = [int(s) for s in re.findall(r'^\s*(\d+)\s', prompt, re.M)]
+    if '提炼这一段' in prompt:
+        # 分块总结的中间结果：每 5 行取一个要点
+        return '\n'.join(f'{s} 第{s}秒的要点' for s in seconds[::5]) or '0 要点'
+    if '请只输出JSON' in prompt:
+        # 结构化总结：只返回标题和总结
+        count = len(re.findall(r'^\[\d+\] ', prompt, re.M)) or 1
+        return json.dumps({'summary': '这是一个用于测试的视频。', 'audience': '适合测试人员。',
+                           'titles': [f'第{i + 1}个片段' for i in range(count)]}, ensure_ascii=False)
+    bv_match = re.search(r'(BV\w+)', prompt)
+    bv_id = bv_match.group(1) if bv_match else ''
+    rows = '\n'.join(f'|{s}|{100 // max(len(seconds), 1)}%|[第{s}秒](https://www.bilibili.com/video/{bv_id}?t={s})|'
+                     for s in seconds[:20])
+    return f"""## 视频大总结
+这是一个用于测试的视频，共有{len(seconds)}个时间点。
+
+## 视频小总结
+||||
+|----|----|----|
+|时间线|内容在整个视频中的占比|视频内容|
+{rows}
+
+## 适合人群
+适合测试人员。
+"""
+
+
+def split_tokens(text: str):
+    """把文本切成近似 token 的小段，用于流式输出"""
+    return re.findall(r'[\u4e00-\u9fff]|[^\u4e00-\u9fff]{1,4}', text, re.S)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端关闭 keep-alive 连接属于正常情况，不打印堆栈
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeLLMServer:
+    """
+    在后台线程运行的替身服务，可用作上下文管理器
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, config: Optional[FakeLLMConfig] = None):
+        self.config = config or FakeLLMConfig()
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.status_counts = {}
+        self.httpd = _QuietHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def fastgpt_url(self) -> str:
+        return f'{self.base_url}{FASTGPT_PREFIX}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, e, exc_tb):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.status_counts = {}
+
+    def _pick_status(self) -> int:
+        """按配置决定本次请求是否返回错误"""
+        with self.lock:
+            self.requests += 1
+            n = self.requests
+            config = self.config
+            if config.burst_every and (n - 1) % config.burst_every < config.burst_length:
+                return 429
+            if config.error_rate and self.random.random() < config.error_rate:
+                return 500
+        return 200
+
+    def _count(self, status: int):
+        with self.lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body, headers: Optional[dict] = None):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+                server._count(status)
+
+            def _send_stream(self, text: str):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def send_chunk(data: bytes):
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    self.wfile.flush()
+
+                tokens = split_tokens(text)
+                for token in tokens:
+                    time.sleep(server.config.token_delay)
+                    event = {'choices': [{'index': 0, 'delta': {'content': token}}]}
+                    send_chunk(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+                usage = {'choices': [], 'usage': {'completion_tokens': len(tokens)}}
+                send_chunk(f'data: {json.dumps(usage)}\n\n'.encode('utf-8'))
+                send_chunk(b'data: [DONE]\n\n')
+                self.wfile.write(b'0\r\n\r\n')
+                server._count(200)
+
+            def _fastgpt_method(self, payload: dict) -> str:
+                """推断请求使用的是哪种 FastGPT 调用方式，名称与 AISummarizer 中一致"""
+                path = self.path.split('?')[0]
+                if 'key=' in self.path:
+                    return 'API密钥作为URL参数'
+                if 'apiKey' in payload:
+                    return 'apiKey参数'
+                if 'key' in payload:
+                    return 'key参数'
+                if path.endswith('/v1/chat/completions'):
+                    return 'Authorization header + OpenAI 格式'
+                return 'Authorization header + 基础格式'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._send_json(400, {'error': 'invalid json'})
+
+                if self.path.startswith(FASTGPT_PREFIX):
+                    if self._fastgpt_method(payload) != server.config.fastgpt_method:
+                        return self._send_json(403, {'code': 403, 'message': '403 unauthorized'})
+                elif not self.path.endswith('/chat/completions'):
+                    return self._send_json(404, {'error': 'not found'})
+
+                status = server._pick_status()
+                time.sleep(server.config.latency)
+                if status == 429:
+                    return self._send_json(429, {'error': 'rate limited'},
+                                           {'Retry-After': str(server.config.retry_after)})
+                if status != 200:
+                    return self._send_json(status, {'error': 'internal error'})
+
+                messages = payload.get('messages') or []
+                prompt = payload.get('prompt') or (messages[-1]['content'] if messages else '')
+                text = fake_completion(prompt)
+                if payload.get('stream'):
+                    return self._send_stream(text)
+                time.sleep(server.config.token_delay * len(split_tokens(text)))
+                if self.path.startswith(FASTGPT_PREFIX):
+                    return self._send_json(200, {'text': text})
+                return self._send_json(200, {
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}}],
+                    'usage': {'completion_tokens': len(split_tokens(text))},
+                })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地的 OpenAI 兼容接口替身')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--latency', type=float, default=FakeLLMConfig.latency)
+    parser.add_argument('--token-delay', type=float, default=FakeLLMConfig.token_delay)
+    parser.add_argument('--error-rate', type=float, default=FakeLLMConfig.error_rate)
+    parser.add_argument('--burst-every', type=int, default=FakeLLMConfig.burst_every)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig()
+    config.latency = args.latency
+    config.token_delay = args.token_delay
+    config.error_rate = args.error_rate
+    config.burst_every = args.burst_every
+    server = FakeLLMServer(port=args.port, config=config)
+    print(f'OpenAI 兼容接口: {server.base_url}')
+    print(f'FastGPT 风格接口: {server.fastgpt_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,17 @@
 
 """
 测试AI摘要生成器
+
+设置了 OPENAI_API_KEY 时调用真实接口，否则使用本地替身接口（fake_llm_server），可离线运行。
 """
 
 import os
+import tempfile
 from pathlib import Path
 
+from config import MetricsConfig
 from utils.ai_summarizer import summarize_video
+from utils.test.fake_llm_server import FakeLLMServer
 
 # 测试数据
 TEST_DATA = """
@@ -24,12 +29,18 @@ def main():
     print("AI摘要生成器测试程序")
     print("-" * 40)
 
-    # 确保存在.env文件
-    if not os.path.exists("../../.env"):
-        print("警告：.env文件不存在。如果您还没有创建，请复制.env.example为.env")
-
-    # 创建临时测试文件
-    test_file = Path("test_summary_input.txt")
+    # 没有API密钥时使用本地替身接口
+    server = None
+    api_key = api_base = None
+    if not os.environ.get("OPENAI_API_KEY"):
+        server = FakeLLMServer().start()
+        api_key, api_base = "fake-key-0123456789", server.base_url
+        print(f"未设置OPENAI_API_KEY，使用本地替身接口：{api_base}")
+
+    # 在临时目录中创建测试文件
+    temp_dir = Path(tempfile.mkdtemp())
+    MetricsConfig.events_file = str(temp_dir / "metrics.jsonl")
+    test_file = temp_dir / "test_summary_input.main.txt"
     with open(test_file, "w", encoding="utf-8") as f:
         f.write(TEST_DATA)
     print(f"已创建测试输入文件：{test_file}")
@@ -39,10 +50,10 @@ def main():
 
     try:
         print(f"\n正在使用URL '{test_url}'生成摘要...")
-        result = summarize_video(test_file, test_url)
+        result = summarize_video(test_file, test_url, api_key=api_key, api_base=api_base, use_cache=False)
 
         # 保存结果
-        output_file = Path("test_summary_output.md")
+        output_file = temp_dir / "test_summary_output.md"
         with open(output_file, "w", encoding="utf-8") as f:
             f.write(result)
 
@@ -61,11 +72,8 @@ def main():
     except Exception as e:
         print(f"生成摘要时出错：{str(e)}")
     finally:
-        # 清理测试文件（可选）
-        # if test_file.exists():
-        #     test_file.unlink()
-        #     print(f"已删除测试文件：{test_file}")
-        pass
+        if server:
+            server.stop()
 
     print("\n测试完成！")
 
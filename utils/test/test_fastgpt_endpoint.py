@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试 FastGPT 已记录的调用方式只在授权或格式错误时失效
+
+在本地替身接口（fake_llm_server）的 FastGPT 风格地址上：
+1. 已记录的方式遇到 429 时按客户端的设置重试，不重新探测
+2. 重试后仍然返回 500 时保留记录，不重新探测
+3. 已记录的方式返回 403 时忘掉记录，重新探测并记录可用的方式
+
+用法:
+    python -m utils.test.test_fastgpt_endpoint
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from config import MetricsConfig
+from utils.ai_summarizer import AISummarizer
+from utils.endpoint_registry import EndpointRegistry
+from utils.llm_client import LLMClient
+from utils.test.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+
+def main():
+    print("FastGPT 调用方式测试")
+    print("-" * 40)
+    failures = []
+    config = FakeLLMConfig()
+    config.retry_after = 0.05
+    with FakeLLMServer(config=config) as server, tempfile.TemporaryDirectory() as temp_dir:
+        MetricsConfig.events_file = str(Path(temp_dir) / 'metrics.jsonl')
+        summarizer = AISummarizer(api_key='fake-key-0123456789', api_base=server.fastgpt_url, use_cache=False)
+        summarizer.client = LLMClient(max_retries=3)
+        summarizer.endpoints = EndpointRegistry(str(Path(temp_dir) / 'endpoint_methods.json'))
+        summarizer.endpoints.remember(server.fastgpt_url, config.fastgpt_method)
+
+        def call(name: str, **overrides) -> int:
+            """按 overrides 修改替身接口后调用一次，返回替身接口收到的请求数"""
+            for key, value in overrides.items():
+                setattr(config, key, value)
+            before = server.requests
+            response = summarizer._call_fastgpt('0 你好')
+            requests = server.requests - before
+            print(f"{name}：状态码 {response.status_code if response is not None else None}，请求 {requests} 次，"
+                  f"记录的方式 {summarizer.endpoints.get(server.fastgpt_url)}")
+            return requests
+
+        server.reset_stats()
+        requests = call('429 后重试', burst_every=100, burst_length=2)
+        if requests != 3 or summarizer.endpoints.get(server.fastgpt_url) != config.fastgpt_method:
+            failures.append('已记录的方式遇到 429 时没有重试，或者重新探测了')
+
+        requests = call('持续 500', burst_every=0, error_rate=1.0)
+        if requests != 4:
+            failures.append(f"持续 500 时应当重试 3 次后返回，实际请求了 {requests} 次")
+        if summarizer.endpoints.get(server.fastgpt_url) != config.fastgpt_method:
+            failures.append('暂时的 500 错误不应忘掉已记录的方式')
+
+        summarizer.endpoints.remember(server.fastgpt_url, 'apiKey参数')
+        call('403 后重新探测', error_rate=0.0)
+        if summarizer.endpoints.get(server.fastgpt_url) != config.fastgpt_method:
+            failures.append('已记录的方式返回 403 后没有重新探测出可用的方式')
+        summarizer.client.close()
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试自定义规则（hot_rule.txt）的替换写入转录产物
+
+用一条固定的识别结果代替服务端的 websocket 连接，经过 transcribe_recv 写出 .merge.txt、.txt、.srt 和 main.txt，
+检查规则的替换出现在每个文件中、原来的写法不再出现，字幕仍然逐词对齐（每条字幕都有时间）。
+再检查实时听写使用同一个纠正流程。
+
+用法:
+    python -m utils.test.test_hot_rules
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from config import ArchiveConfig, MetricsConfig
+from utils import hot_words, search_index, semantic_index
+from utils.hot_words import HotWordCorrector, correct_and_normalize
+
+RULES = ['毛病 = 问题', 'github = GitHub', r'(\d+)块钱 = \1元']
+TEXT = '这个毛病在github上，修好它一共花了一百二十块钱。下次再说'
+TOKENS = list('这个毛病在') + ['github'] + list('上修好它一共花了一百二十块钱下次再说')
+EXPECTED = ['问题', 'GitHub', '120元']
+REPLACED = ['毛病', 'github', '块钱']
+
+
+class FakeWebsocket:
+    """只返回一条最终结果的 websocket"""
+
+    def __init__(self, message: dict):
+        self.messages = [json.dumps(message, ensure_ascii=False)]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.messages:
+            raise StopAsyncIteration
+        return self.messages.pop(0)
+
+
+def main():
+    from utils.client_transcribe import transcribe_recv
+    from utils.client_ws import Cosmic
+
+    print("自定义规则测试")
+    print("-" * 40)
+    failures = []
+    corrector = HotWordCorrector(rules=RULES)
+    original_get_corrector = hot_words.get_corrector
+    hot_words.get_corrector = lambda: corrector
+    timestamps = [round(i * 0.4, 2) for i in range(len(TOKENS))]
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            ArchiveConfig.archive = False
+            MetricsConfig.events_file = str(temp_dir / 'metrics.jsonl')
+            search_index.get_index_file = lambda: str(temp_dir / 'search.db')
+            semantic_index.get_index_dir = lambda: str(temp_dir / 'semantic-index')
+
+            media_file = temp_dir / 'sample.wav'
+            Cosmic.websocket = FakeWebsocket({
+                'task_id': 'test', 'duration': timestamps[-1] + 1, 'time_start': 0, 'time_complete': 1,
+                'is_final': True, 'text': TEXT, 'tokens': TOKENS, 'timestamps': timestamps,
+            })
+            asyncio.run(transcribe_recv(media_file))
+            Cosmic.websocket = None
+
+            for suffix in ('.merge.txt', '.txt', '.srt', '.main.txt'):
+                output = media_file.with_suffix(suffix) if suffix != '.main.txt' else \
+                    temp_dir / f'{media_file.stem}.main.txt'
+                content = output.read_text(encoding='utf-8') if output.exists() else ''
+                print(f"{output.name}：{content.strip().splitlines()}")
+                missing = [word for word in EXPECTED if word not in content]
+                left = [word for word in REPLACED if word in content]
+                if missing or left:
+                    failures.append(f"{output.name} 缺少 {missing}，仍有 {left}")
+            srt_lines = media_file.with_suffix('.srt').read_text(encoding='utf-8').count(' --> ')
+            txt_lines = len(media_file.with_suffix('.txt').read_text(encoding='utf-8').splitlines())
+            if srt_lines != txt_lines:
+                failures.append(f"字幕 {srt_lines} 条，分行稿 {txt_lines} 行，没有全部对齐")
+
+        # 实时听写与转录文件使用同一个流程
+        dictated = correct_and_normalize(TEXT, TOKENS, timestamps).text
+        print(f"听写结果：{dictated}")
+        if any(word not in dictated for word in EXPECTED):
+            failures.append('实时听写的结果没有执行自定义规则')
+    finally:
+        hot_words.get_corrector = original_get_corrector
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
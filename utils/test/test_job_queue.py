@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试任务队列的崩溃恢复和本地文件的 ingest 阶段
+
+1. add 加入的用户文件（不在监视目录中）在原来的位置转录，不被移动
+2. 监视目录中的文件：工作进程记录目标位置后、移动前崩溃，心跳超时后另一个进程从 ingest 阶段接手，
+   把文件移动到记录的位置
+3. 移动完成后在转录阶段崩溃，心跳超时后从 transcribe 阶段继续，不再重复 ingest
+
+用虚拟时钟代替 job_queue.time，让心跳超时不必真的等待；转录阶段只记录调用，不连接服务端。
+
+用法:
+    python -m utils.test.test_job_queue
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from config import MetricsConfig, QueueConfig
+from utils import job_queue
+from utils.job_queue import JobQueue, run_job
+
+
+class VirtualClock:
+    """代替 time 模块，只提供 job_queue 用到的函数"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+def crash(media_file):
+    """转录途中工作进程被终止"""
+    raise SystemExit(f"转录 {media_file} 时崩溃")
+
+
+def main():
+    print("任务队列崩溃恢复测试")
+    print("-" * 40)
+    failures = []
+    clock = VirtualClock()
+    transcribed = []
+    originals = (job_queue.time, job_queue.get_today_folder, job_queue._transcribe,
+                 QueueConfig.db_file, QueueConfig.watch_dir)
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            today_folder = temp_dir / 'downloads' / '2026-10-19'
+            today_folder.mkdir(parents=True)
+            inbox = temp_dir / 'inbox'
+            inbox.mkdir()
+            QueueConfig.db_file = str(temp_dir / 'jobs.db')
+            QueueConfig.watch_dir = str(inbox)
+            MetricsConfig.events_file = str(temp_dir / 'metrics.jsonl')
+            job_queue.time = clock
+            job_queue.get_today_folder = lambda: str(today_folder)
+            job_queue._transcribe = lambda media_file: transcribed.append(str(media_file))
+            queue = JobQueue()
+
+            def expire():
+                """让正在执行的任务心跳超时，相当于所在的工作进程已崩溃"""
+                clock.now += QueueConfig.lease_seconds + 1
+
+            # 1. 用户文件在原来的位置转录
+            user_file = temp_dir / 'lecture.wav'
+            user_file.write_bytes(b'RIFF')
+            job_id, _ = queue.enqueue(str(user_file), duration=60)
+            run_job(queue, queue.claim('worker-a'))
+            print(f"用户文件：{transcribed}")
+            if not user_file.exists() or transcribed != [str(user_file.resolve())]:
+                failures.append(f"add 加入的文件应在原来的位置转录，实际转录了 {transcribed}")
+            if any(today_folder.iterdir()):
+                failures.append(f"add 加入的文件被移动到了 {list(today_folder.iterdir())}")
+
+            # 2. 记录目标位置后、移动前崩溃
+            inbox_file = inbox / 'meeting.wav'
+            inbox_file.write_bytes(b'RIFF')
+            job_id, _ = queue.enqueue(str(inbox_file), duration=60)
+            job = queue.claim('worker-a')
+            destination = str(today_folder / '1.meeting_20261019.wav')
+            queue.advance(job.id, 'ingest', destination)
+            if queue.claim('worker-b') is not None:
+                failures.append('心跳未超时的任务被其他工作进程领取')
+            expire()
+            job = queue.claim('worker-b')
+            print(f"接手：{job}")
+            if job is None or (job.id, job.stage, job.media_file, job.attempts) != (job_id, 'ingest', destination, 2):
+                failures.append(f"心跳超时后应从 ingest 阶段接手并保留目标位置，实际为 {job}")
+            else:
+                # 3. 移动完成后在转录阶段崩溃
+                transcribed.clear()
+                job_queue._transcribe = crash
+                try:
+                    run_job(queue, job)
+                except SystemExit:
+                    pass
+                if inbox_file.exists() or not Path(destination).exists():
+                    failures.append('监视目录中的文件没有移动到记录的位置')
+                expire()
+                job_queue._transcribe = lambda media_file: transcribed.append(str(media_file))
+                job = queue.claim('worker-c')
+                print(f"接手：{job}")
+                if job is None or (job.stage, job.media_file) != ('transcribe', destination):
+                    failures.append(f"心跳超时后应从 transcribe 阶段继续，实际为 {job}")
+                else:
+                    run_job(queue, job)
+                    if transcribed != [destination]:
+                        failures.append(f"应转录移动后的文件，实际转录了 {transcribed}")
+            print(f"任务状态：{queue.counts()}")
+            if queue.counts() != {'done': 2}:
+                failures.append(f"两个任务都应完成，实际为 {queue.counts()}")
+            queue.close()
+    finally:
+        (job_queue.time, job_queue.get_today_folder, job_queue._transcribe,
+         QueueConfig.db_file, QueueConfig.watch_dir) = originals
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
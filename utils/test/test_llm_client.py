@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试共享 HTTP 客户端的并发名额在出错的流式请求后被归还
+
+本地替身接口（fake_llm_server）对每个请求都返回 500，客户端最多同时 2 个请求、不重试。
+连续发出多于并发数的流式请求，每次都应在超时前返回，结束后名额全部归还。
+分别测试直接调用 LLMClient.post_sync 和经过 AISummarizer._request_api 两种方式。
+
+用法:
+    python -m utils.test.test_llm_client
+"""
+
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from config import MetricsConfig
+from utils.ai_summarizer import AISummarizer
+from utils.llm_client import LLMClient
+from utils.test.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+MAX_IN_FLIGHT = 2
+CALLS = MAX_IN_FLIGHT * 3
+TIMEOUT = 10
+
+
+def call_with_timeout(func) -> bool:
+    """在后台线程中调用 func，超时未返回（名额耗尽后一直等待）时返回 False"""
+    thread = threading.Thread(target=func, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    return not thread.is_alive()
+
+
+def free_slots(client: LLMClient) -> int:
+    return client._semaphore._value
+
+
+def main():
+    print("共享客户端名额测试")
+    print("-" * 40)
+    failures = []
+    config = FakeLLMConfig()
+    config.error_rate = 1.0
+    with FakeLLMServer(config=config) as server, tempfile.TemporaryDirectory() as temp_dir:
+        MetricsConfig.events_file = str(Path(temp_dir) / 'metrics.jsonl')
+
+        client = LLMClient(max_in_flight=MAX_IN_FLIGHT, max_retries=0)
+        url = f"{server.base_url}/chat/completions"
+        payload = {'model': 'test', 'stream': True, 'messages': [{'role': 'user', 'content': '0 你好'}]}
+        statuses = []
+        for i in range(CALLS):
+            # 调用方不关闭出错的响应，名额也应当归还
+            if not call_with_timeout(lambda: statuses.append(
+                    client.post_sync(url, headers={}, payload=payload, stream=True).status_code)):
+                failures.append(f"post_sync 第 {i + 1} 次调用超过 {TIMEOUT}s 没有返回")
+                break
+        print(f"post_sync：{len(statuses)} 次返回 {sorted(set(statuses))}，剩余名额 {free_slots(client)}")
+        if free_slots(client) != MAX_IN_FLIGHT:
+            failures.append('post_sync 出错的流式响应没有归还名额')
+        client.close()
+
+        client = LLMClient(max_in_flight=MAX_IN_FLIGHT, max_retries=0)
+        summarizer = AISummarizer(api_key='fake-key-0123456789', api_base=server.base_url, use_cache=False)
+        summarizer.client = client
+        results = []
+        for i in range(CALLS):
+            if not call_with_timeout(lambda: results.append(summarizer._request_api('0 你好', on_delta=print))):
+                failures.append(f"_request_api 第 {i + 1} 次调用超过 {TIMEOUT}s 没有返回")
+                break
+        print(f"_request_api：{len(results)} 次返回，剩余名额 {free_slots(client)}")
+        if any(result is not None for result in results):
+            failures.append('出错的请求不应返回内容')
+        if free_slots(client) != MAX_IN_FLIGHT:
+            failures.append('_request_api 出错的流式响应没有归还名额')
+        client.close()
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试字幕压缩去掉语气词时不破坏正常的词
+
+“额”“诶”既是语气词，也出现在金额、额度、名额、额外等词中，只有单独出现（前后是标点、空白或行首行尾）时才去掉。
+
+用法:
+    python -m utils.test.test_transcript_utils
+"""
+
+import sys
+
+from utils.transcript_utils import compact_lines
+
+CASES = [
+    ('这笔金额很大', '这笔金额很大'),
+    ('额度用完了', '额度用完了'),
+    ('名额有限', '名额有限'),
+    ('额外的费用', '额外的费用'),
+    ('诶呀，忘了', '诶呀，忘了'),
+    ('额，我觉得可以', '我觉得可以'),
+    ('额额额 那个方案', '那个方案'),
+    ('诶，你看这里', '你看这里'),
+    ('好的，额，然后呢', '好的，然后呢'),
+    ('嗯嗯这个问题', '这个问题'),
+    ('um so basically', 'so basically'),
+]
+
+
+def main():
+    print("字幕压缩语气词测试")
+    print("-" * 40)
+    failures = []
+    for text, expected in CASES:
+        result = compact_lines([(0, text)], bucket_seconds=0)
+        actual = result[0][1] if result else ''
+        print(f"{text} -> {actual}")
+        if actual != expected:
+            failures.append(f"{text!r} 压缩为 {actual!r}，应为 {expected!r}")
+
+    if failures:
+        print("\n测试失败：\n" + '\n'.join(f"  - {failure}" for failure in failures))
+        sys.exit(1)
+    print("\n测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""
+识别结果的文本规范化
+
+按 ServerConfig 的开关，在一次扫描分词列表的过程中完成三种处理：
+- format_num：中文数字转为阿拉伯数字，如 一百二十三 → 123、三点五 → 3.5、百分之五十 → 50%、二零二四 → 2024。
+  单个数字（一个、三天）和 七八个、三四天 这类约数保持不变
+- format_punc：沿用服务端文本中的标点，中文旁边用全角、英文和数字之间用半角，连续的断句标点只保留最强的一个；
+  服务端没有加标点的长停顿处按时间戳补上逗号或句号。关闭时输出不含标点，但仍在原来的位置分行
+- format_spell：中文和英文之间、相邻的英文单词之间加空格，合并 @@ 续接的英文子词
+
+每个分词只处理一次，同时记录分词到输出的映射：转换后的数字、合并后的英文单词作为一个词，带有其第一个分词的
+时间戳，和分好行的文本一起写入，生成 SRT 时按规范化后的文字匹配，字幕时间不会因为数字转换而错位。
+TextNormalizer 可以随识别进度逐段输入，每次返回已经确定的文本。
+
+用法:
+    python -m utils.text_normalizer 识别结果文本        # 查看规范化结果
+"""
+
+import re
+from typing import List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+import typer
+
+from config import ServerConfig
+from utils import metrics
+
+DIGITS = {'零': 0, '〇': 0, '幺': 1, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4,
+          '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+SMALL_UNITS = {'十': 10, '百': 100, '千': 1000}
+LARGE_UNITS = {'万': 10 ** 4, '亿': 10 ** 8}
+NUMERAL_CHARS = frozenset(DIGITS) | frozenset(SMALL_UNITS) | frozenset(LARGE_UNITS) | {'点'}
+PERCENT_PREFIXES = (('百分之', '%'), ('千分之', '‰'))
+MIN_DIGIT_SEQUENCE = 3  # 没有单位的数字串（年份、编号）至少几位才转换，避免把 七八个、三四天 转成数字
+
+# 断句标点的强弱，连续出现时只保留最强的一个，并在这里分行
+BREAK_STRENGTH = {'，': 1, ',': 1, '；': 2, ';': 2, '。': 3, '.': 3, '？': 4, '?': 4, '！': 4, '!': 4}
+FULL_WIDTH = {',': '，', '.': '。', '?': '？', '!': '！', ';': '；', ':': '：'}
+HALF_WIDTH = {full: half for half, full in FULL_WIDTH.items()}
+PAUSE_COMMA = 1.0  # 相邻分词的开始时间相差多少秒、且服务端没有标点时补逗号
+PAUSE_PERIOD = 2.0  # 停顿超过多少秒时补句号
+MAX_SKIP = 16  # 在文本中查找分词时最多跳过的字符数（标点、空格、自定义规则插入的文字）
+# format_spell 时需要空格隔开的 (当前词, 上一个输出) 类别：中英之间、英文单词之间、数字和英文之间，中文和数字之间不加
+_SPACED = {('latin', 'cjk'), ('cjk', 'latin'), ('latin', 'latin'), ('num', 'latin'), ('latin', 'num'), ('num', 'num'),
+           ('latin', 'half'), ('num', 'half')}
+
+_cli_token_pattern = re.compile(r'[㐀-鿿]|[A-Za-z0-9]+')
+
+
+class Normalized(NamedTuple):
+    text: str  # 规范化后的整段文本
+    lines: List[str]  # 在断句标点处分行，行内不含断句标点
+    words: List[str]  # 规范化后的词，数字串和英文单词各为一个词
+    timestamps: List[float]  # 每个词的开始时间，取其第一个分词的时间戳
+    spans: List[Tuple[int, int]]  # 每个词在 text 中的位置
+    token_words: List[int]  # 每个输入分词对应的词的序号，没有输出的分词为 -1
+
+
+def _integer(chars: str, single: bool) -> Optional[str]:
+    """整数部分：数字串逐位转换，带单位的按数值转换；single 为 False 时不转换单个数字"""
+    if all(char in DIGITS for char in chars):
+        if len(chars) == 1:
+            return str(DIGITS[chars]) if single else None
+        if len(chars) < MIN_DIGIT_SEQUENCE or '两' in chars:
+            return None
+        return ''.join(str(DIGITS[char]) for char in chars)
+
+    total = section = 0
+    digit = None
+    last_unit = 1
+    zero = False
+    for char in chars:
+        if char in DIGITS:
+            if digit is not None:
+                return None
+            if char in '零〇':
+                zero = True
+            else:
+                digit = DIGITS[char]
+        elif char in SMALL_UNITS:
+            if digit is None:
+                # 只有「十」可以省略前面的一：十二、三百一十
+                if char != '十' or zero:
+                    return None
+                digit = 1
+            last_unit = SMALL_UNITS[char]
+            section += digit * last_unit
+            digit, zero = None, False
+        elif char in LARGE_UNITS:
+            section += digit or 0
+            if not section:
+                return None
+            last_unit = LARGE_UNITS[char]
+            total = (total + section) * last_unit if last_unit > total else total + section * last_unit
+            section, digit, zero = 0, None, False
+        else:
+            return None
+    if digit is not None:
+        # 一百五、三万六：末尾的数字是上一个单位的下一级
+        section += digit * (1 if zero else max(1, last_unit // 10))
+    return str(total + section)
+
+
+def chinese_to_arabic(chars: str, single: bool = False) -> Optional[str]:
+    """
+    把一串中文数字转为阿拉伯数字
+
+    Args:
+        chars: 只包含中文数字、单位、「点」和百分号前缀的字符串
+        single: 是否转换单个数字
+
+    Returns:
+        转换结果，不是合法的数字、或属于不转换的约数和单字时返回None
+    """
+    for prefix, sign in PERCENT_PREFIXES:
+        if chars.startswith(prefix) and len(chars) > len(prefix):
+            number = chinese_to_arabic(chars[len(prefix):], single=True)
+            return number + sign if number else None
+    integer, dot, fraction = chars.partition('点')
+    if dot:
+        if not integer or not fraction or any(char not in DIGITS or char == '两' for char in fraction):
+            return None
+        value = _integer(integer, single=True)
+        return f"{value}.{''.join(str(DIGITS[char]) for char in fraction)}" if value is not None else None
+    return _integer(chars, single)
+
+
+def _kind(word: str) -> str:
+    char = word[0]
+    if char >= '⺀':
+        return 'cjk'
+    return 'num' if '0' <= char <= '9' else 'latin'
+
+
+class TextNormalizer:
+    """
+    流式的文本规范化：按顺序输入分词，每个分词只处理一次
+    """
+
+    def __init__(self, num: Optional[bool] = None, punc: Optional[bool] = None, spell: Optional[bool] = None):
+        """
+        Args:
+            num: 中文数字转阿拉伯数字，默认取 ServerConfig.format_num
+            punc: 规范化并补充标点，默认取 ServerConfig.format_punc
+            spell: 调整中英之间的空格，默认取 ServerConfig.format_spell
+        """
+        self.num = ServerConfig.format_num if num is None else num
+        self.punc = ServerConfig.format_punc if punc is None else punc
+        self.spell = ServerConfig.format_spell if spell is None else spell
+
+        self._pieces: List[str] = []
+        self._length = 0
+        self._returned = 0  # feed 已经返回到 _pieces 的第几段
+        self._lines: List[str] = []
+        self._line: List[str] = []
+        self.words: List[str] = []
+        self.timestamps: List[float] = []
+        self.spans: List[Tuple[int, int]] = []
+        self.token_words: List[int] = []
+
+        self._kind: Optional[str] = None  # 上一个输出的类别：cjk、latin、num、full（全角标点）、half（半角标点）
+        self._punct: List[str] = []  # 等待输出的标点，确定下一个词的类别后才能决定全角还是半角
+        self._space = False  # 服务端文本中上一个词后面有空格
+        self._run: List[Tuple[int, str, float]] = []  # 连续的中文数字
+        self._subword: List[Tuple[int, str, float]] = []  # @@ 续接的英文子词
+        self._last_timestamp: Optional[float] = None
+
+    def _write(self, piece: str, line: bool = True):
+        self._pieces.append(piece)
+        self._length += len(piece)
+        if line:
+            self._line.append(piece)
+
+    def _break_line(self):
+        self._lines.append(''.join(self._line))
+        self._line = []
+
+    @staticmethod
+    def _width(char: str, half: bool, keep: bool) -> str:
+        if keep:
+            return char
+        return HALF_WIDTH.get(char, char) if half else FULL_WIDTH.get(char, char)
+
+    def _write_punct(self, next_kind: Optional[str]):
+        """输出等待中的标点：断句标点只保留最强的一个并在此分行，关闭标点时只分行不输出"""
+        punct, self._punct = self._punct, []
+        if not self.words:
+            return  # 开头的标点没有意义
+        # 两边都是英文或数字时用半角，中文旁边用全角，结尾处保持服务端的写法
+        half = self._kind in ('latin', 'num') and next_kind in ('latin', 'num')
+        keep = next_kind is None and self._kind in ('latin', 'num')
+        strongest = max((char for char in punct if char in BREAK_STRENGTH), key=BREAK_STRENGTH.get, default=None)
+        for char in punct:
+            if char in BREAK_STRENGTH:
+                if strongest is None:
+                    continue
+                char, strongest = strongest, None
+                if self.punc:
+                    self._write(self._width(char, half, keep), line=False)
+                    self._kind = 'half' if half else 'full'
+                self._break_line()
+            elif self.punc:
+                self._write(self._width(char, half, keep))
+                self._kind = 'half' if half else 'full'
+
+    def _emit(self, word: str, indexes: Sequence[int], timestamp: float):
+        """输出一个词：先输出前面的标点和空格，再记录词的位置和时间戳"""
+        kind = _kind(word)
+        if self._punct:
+            self._write_punct(kind)
+        if self._kind is not None and (self.spell and (kind, self._kind) in _SPACED or not self.spell and self._space):
+            self._write(' ', line=bool(self._line))
+        self._space = False
+        start = self._length
+        self._write(word)
+        self._kind = kind
+        position = len(self.words)
+        self.words.append(word)
+        self.timestamps.append(timestamp)
+        self.spans.append((start, self._length))
+        for index in indexes:
+            self.token_words[index] = position
+
+    def _emit_numeral(self, run: List[Tuple[int, str, float]]):
+        number = chinese_to_arabic(''.join(char for _, char, _ in run)) if len(run) > 1 else None
+        if number is not None:
+            self._emit(number, [index for index, _, _ in run], run[0][2])
+        else:
+            for index, char, timestamp in run:
+                self._emit(char, (index,), timestamp)
+
+    def _flush_run(self):
+        run, self._run = self._run, []
+        while run:
+            chars = ''.join(char for _, char, _ in run)
+            if '点' not in chars or chinese_to_arabic(chars) is not None:
+                self._emit_numeral(run)
+                return
+            # 三点、十二点三十：整体不是小数时，「点」两边分别转换
+            cut = chars.index('点')
+            self._emit_numeral(run[:cut])
+            self._emit_numeral(run[cut:cut + 1])
+            run = run[cut + 1:]
+
+    def _flush_subword(self):
+        subword, self._subword = self._subword, []
+        if subword:
+            self._emit(''.join(piece for _, piece, _ in subword), [index for index, _, _ in subword], subword[0][2])
+
+    def _flush(self):
+        self._flush_run()
+        self._flush_subword()
+
+    def _is_numeral(self, char: str) -> bool:
+        if char in NUMERAL_CHARS:
+            return True
+        # 百分之、千分之 作为数字的前缀
+        prefix = ''.join(c for _, c, _ in self._run) + char
+        return any(full.startswith(prefix) for full, _ in PERCENT_PREFIXES)
+
+    def _gap(self, punct: List[str], space: bool):
+        """两个分词之间的标点和空格，数字在这里断开；@@ 续接的英文子词之间的标点和空格忽略"""
+        if (punct or space) and not self._subword:
+            self._flush()
+            self._punct.extend(punct)
+            self._space = self._space or space
+
+    def _token(self, index: int, token: str, timestamp: float):
+        joined = token.endswith('@@')
+        token = token.replace('@', '')
+        if not token:
+            return
+        if self._subword or joined:
+            self._flush_run()
+            self._subword.append((index, token, timestamp))
+            if not joined:
+                self._flush_subword()
+        elif self.num and len(token) == 1 and self._is_numeral(token):
+            self._run.append((index, token, timestamp))
+        else:
+            self._flush_run()
+            self._emit(token, (index,), timestamp)
+
+    def feed(self, tokens: Sequence[str], timestamps: Sequence[float], text: Optional[str] = None) -> str:
+        """
+        输入一段识别结果
+
+        Args:
+            tokens: 分词
+            timestamps: 每个分词的开始时间（秒）
+            text: 服务端返回的这段文本，用于取得标点和空格；为None时只按停顿补标点
+
+        Returns:
+            这次新确定的输出文本；末尾的数字、英文子词和标点要等下一段才能确定，留到之后返回
+        """
+        lowered = text.lower() if text else ''
+        position = 0
+        for token, timestamp in zip(tokens, timestamps):
+            index = len(self.token_words)
+            self.token_words.append(-1)
+            clean = token.replace('@', '')
+            punct, space = [], False
+            if lowered and clean:
+                found = lowered.find(clean.lower(), position, position + len(clean) + MAX_SKIP)
+                if found >= 0:
+                    for char in text[position:found]:
+                        if char.isspace():
+                            space = True
+                        elif not char.isalnum():
+                            punct.append(char)
+                    position = found + len(clean)
+            if self._last_timestamp is not None and not self._subword and \
+                    timestamp - self._last_timestamp >= PAUSE_COMMA and \
+                    not any(char in BREAK_STRENGTH for char in punct + self._punct):
+                punct.append('。' if timestamp - self._last_timestamp >= PAUSE_PERIOD else '，')
+            self._last_timestamp = timestamp
+            self._gap(punct, space)
+            self._token(index, token, timestamp)
+        if lowered:
+            tail = text[position:]
+            self._gap([char for char in tail if not char.isspace() and not char.isalnum()],
+                      any(char.isspace() for char in tail))
+
+        new_text = ''.join(self._pieces[self._returned:])
+        self._returned = len(self._pieces)
+        return new_text
+
+    def finish(self) -> Normalized:
+        """输出剩余的内容，补上句末标点，返回完整的结果"""
+        self._flush()
+        if self.words and not any(char in BREAK_STRENGTH for char in self._punct) and \
+                self._kind not in ('full', 'half'):
+            self._punct.append('。')
+        self._write_punct(None)
+        if self._line:
+            self._break_line()
+        return Normalized(''.join(self._pieces), self._lines, self.words, self.timestamps, self.spans,
+                          self.token_words)
+
+
+def normalize(text: Optional[str], tokens: Sequence[str], timestamps: Sequence[float],
+              num: Optional[bool] = None, punc: Optional[bool] = None, spell: Optional[bool] = None) -> Normalized:
+    """一次性规范化完整的识别结果，参数同 TextNormalizer.feed"""
+    normalizer = TextNormalizer(num, punc, spell)
+    normalizer.feed(tokens, timestamps, text)
+    return normalizer.finish()
+
+
+def replace_text(result: Normalized, rules: Sequence[Tuple[Pattern, str]]) -> Normalized:
+    """
+    对规范化后的结果依次执行 “正则 = 替换” 规则（hot_rule.txt），同时更新分行稿和词
+
+    与替换位置重叠的词合并为一个词，取其中第一个词的时间戳，分词到词的映射随之更新，生成 SRT 时仍能逐词对齐。
+    分行稿逐行替换，规则不会跨行生效。
+
+    Args:
+        result: normalize 的结果
+        rules: (正则, 替换) 列表
+
+    Returns:
+        替换后的结果，没有规则时原样返回
+    """
+    if not rules:
+        return result
+    text, lines = result.text, list(result.lines)
+    owners = [-1] * len(text)  # 每个字符属于第几个词，标点和空格为 -1
+    for index, (start, end) in enumerate(result.spans):
+        owners[start:end] = [index] * (end - start)
+    merged = list(range(len(result.words)))  # 每个词并入了哪个词
+
+    def find(index: int) -> int:
+        while index >= 0 and merged[index] != index:
+            index = merged[index]
+        return index
+
+    for pattern, replacement in rules:
+        lines = [pattern.sub(replacement, line) for line in lines]
+        matches = list(pattern.finditer(text))
+        if not matches:
+            continue
+        pieces, new_owners, last = [], [], 0
+        for number, match in enumerate(matches):
+            start, end = match.span()
+            limit = matches[number + 1].start() if number + 1 < len(matches) else len(text)
+            touched = {find(owner) for owner in owners[start:end]}
+            if start == end and 0 < start < len(text) and find(owners[start - 1]) == find(owners[start]):
+                touched.add(find(owners[start]))  # 在词的中间插入文字
+            touched.discard(-1)
+            target = min(touched) if touched else -1
+            for index in touched:
+                merged[index] = target
+            # 被合并的词在替换位置两侧的部分一起并入
+            low, high = start, end
+            while touched and low > last and find(owners[low - 1]) in touched:
+                low -= 1
+            while touched and high < limit and find(owners[high]) in touched:
+                high += 1
+            pieces.append(text[last:low])
+            new_owners.extend(owners[last:low])
+            piece = text[low:start] + match.expand(replacement) + text[end:high]
+            pieces.append(piece)
+            new_owners.extend([target] * len(piece))
+            last = high
+        pieces.append(text[last:])
+        new_owners.extend(owners[last:])
+        text, owners = ''.join(pieces), new_owners
+
+    spans = {}
+    for position, owner in enumerate(owners):
+        owner = find(owner)
+        if owner >= 0:
+            spans[owner] = (spans.get(owner, (position,))[0], position + 1)
+    order = sorted(spans, key=lambda owner: spans[owner][0])
+    renumber = {owner: position for position, owner in enumerate(order)}
+    token_words = [renumber.get(find(word), -1) if word >= 0 else -1 for word in result.token_words]
+    return Normalized(text, lines, [text[slice(*spans[owner])] for owner in order],
+                      [result.timestamps[owner] for owner in order], [spans[owner] for owner in order], token_words)
+
+
+def normalize_transcript(text: str, tokens: Sequence[str], timestamps: Sequence[float],
+                         job: Optional[str] = None) -> Normalized:
+    """按 ServerConfig 的开关规范化转录结果，并记录耗时"""
+    with metrics.stage('normalize', job, bytes=len(text.encode('utf-8')), tokens=len(tokens)):
+        return normalize(text, tokens, timestamps)
+
+
+def main(text: str):
+    """规范化一段文本，分词按汉字和英文单词切分"""
+    tokens = _cli_token_pattern.findall(text)
+    result = normalize(text, tokens, [i * 0.25 for i in range(len(tokens))])
+    print(result.text)
+    print('\n'.join(f"  {line}" for line in result.lines))
+
+
+if __name__ == '__main__':
+    typer.run(main)
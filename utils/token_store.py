@@ -0,0 +1,136 @@
+"""
+分词时间戳的二进制存储
+
+转录结果中每个分词都有一个时间戳，长视频可能有几十万个分词。JSON 格式读取时要解析整个文件并为每个分词创建
+Python 对象；这里改用定长的二进制格式，读取时通过 mmap 直接映射，不复制数据，访问到哪个分词才解码哪个。
+
+文件结构（小端序）：
+    头部 32 字节   魔数 b'VSTK'、版本号(u16)、保留(u16)、分词数 n(u64)、文本区字节数(u64)、填充
+    时间戳         n 个 float32（秒）
+    偏移表         n+1 个 uint32，第 i 个分词的文本为 文本区[偏移[i]:偏移[i+1]]
+    文本区         所有分词的 UTF-8 编码依次拼接
+"""
+
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+MAGIC = b'VSTK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQ8x')
+WORD_DURATION = 0.2  # 每个分词的默认时长（秒），不超过下一个分词的开始时间
+
+
+def tokens_file_for(path: Union[str, Path]) -> Path:
+    """与转录结果 json 同名的二进制文件路径"""
+    return Path(path).with_suffix('.tokens.bin')
+
+
+def write_tokens(path: Union[str, Path], timestamps: Sequence[float], tokens: Sequence[str]):
+    """
+    写入二进制分词文件，先写临时文件再替换，避免读到写了一半的文件
+
+    Args:
+        path: 输出文件路径
+        timestamps: 每个分词的开始时间（秒）
+        tokens: 分词文本，与 timestamps 一一对应
+    """
+    if len(timestamps) != len(tokens):
+        raise ValueError(f"时间戳数量 {len(timestamps)} 与分词数量 {len(tokens)} 不一致")
+    encoded = [token.encode('utf-8') for token in tokens]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(token) for token in encoded], out=offsets[1:])
+    blob = b''.join(encoded)
+
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(encoded), len(blob)))
+        f.write(np.asarray(timestamps, dtype='<f4').tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(temp_file, path)
+
+
+class TokenWords(Sequence):
+    """
+    内存映射的分词序列，按下标访问时返回与 get_words 相同结构的 {'word', 'start', 'end'} 字典
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        with open(path, 'rb') as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件不能映射
+                raise ValueError(f"{path} 不是有效的分词文件") from None
+        self.timestamps = self.offsets = None
+        try:
+            self._load(path)
+        except BaseException:
+            self.close()
+            raise
+
+    def _load(self, path: Union[str, Path]):
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"{path} 不是有效的分词文件")
+        magic, version, _, count, blob_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是有效的分词文件")
+        offset = HEADER.size
+        self._blob_start = offset + 4 * count + 4 * (count + 1)
+        if self._blob_start + blob_size > len(self._mmap):
+            raise ValueError(f"{path} 文件不完整")
+        self.timestamps = np.frombuffer(self._mmap, dtype='<f4', count=count, offset=offset)
+        offset += 4 * count
+        self.offsets = np.frombuffer(self._mmap, dtype='<u4', count=count + 1, offset=offset)
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def token(self, i: int) -> str:
+        """第 i 个分词的原始文本"""
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._mmap[self._blob_start + start:self._blob_start + end].decode('utf-8')
+
+    def __getitem__(self, i: int) -> Dict[str, Union[str, float]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        start = float(self.timestamps[i])
+        end = start + WORD_DURATION
+        if i + 1 < self._count:
+            end = min(end, float(self.timestamps[i + 1]))
+        return {'word': self.token(i).replace('@', ''), 'start': start, 'end': end}
+
+    def tokens(self) -> List[str]:
+        """一次读出全部分词的原始文本"""
+        blob = self._mmap[self._blob_start:self._blob_start + int(self.offsets[-1])] if self._count else b''
+        offsets = self.offsets.tolist()
+        return [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def words(self) -> List[Dict[str, Union[str, float]]]:
+        """一次读出全部分词，与逐个按下标访问的结果相同；需要遍历所有分词时（如对齐字幕）比按下标访问快得多"""
+        starts = self.timestamps.astype(np.float64)
+        ends = starts + WORD_DURATION
+        np.minimum(ends[:-1], starts[1:], out=ends[:-1])
+        return [{'word': token.replace('@', ''), 'start': start, 'end': end}
+                for token, start, end in zip(self.tokens(), starts.tolist(), ends.tolist())]
+
+    def close(self):
+        # numpy 视图释放后才能关闭 mmap
+        self.timestamps = self.offsets = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,126 @@
+"""
+本地主题分段
+
+在 main.txt 上做 TextTiling 风格的分段，只用 CPU 和 NumPy：
+1. 按固定时长把字幕切成小窗口，每个窗口提取字符 n-gram，哈希到固定维度并计算 TF-IDF
+2. 对每个窗口间隙，计算左右各 block_size 个窗口的向量余弦相似度（前缀和向量化计算）
+3. 相似度的“谷深”越大，越可能是话题切换点，取超过阈值的谷作为主题边界
+
+输出的每个主题带起止时间，可以分别用简短的 prompt 并发总结。
+"""
+
+import re
+import zlib
+from typing import List, NamedTuple
+
+import numpy as np
+
+from utils.transcript_utils import TimedLine, time_windows
+
+_punc_pattern = re.compile(r'[\s,.?!:;，。？！：；、…~～"“”\'‘’()（）]+')
+
+
+class Topic(NamedTuple):
+    start: int  # 起始时间（秒）
+    end: int  # 结束时间（秒），即下一个主题的起始时间
+    lines: List[TimedLine]
+
+
+def _tfidf_matrix(texts: List[str], ngram: int, dim: int) -> np.ndarray:
+    """计算哈希字符 n-gram 的 TF-IDF 矩阵，每行一个窗口"""
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        text = _punc_pattern.sub('', text.lower())
+        grams = [text[i:i + ngram] for i in range(max(len(text) - ngram + 1, 0))] or ([text] if text else [])
+        rows.extend([row] * len(grams))
+        cols.extend(zlib.crc32(gram.encode('utf-8')) % dim for gram in grams)
+    counts = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(counts, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1)
+    df = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(texts)) / (1 + df)).astype(np.float32) + 1
+    return np.log1p(counts) * idf
+
+
+def gap_similarities(matrix: np.ndarray, block_size: int) -> np.ndarray:
+    """
+    计算每个窗口间隙两侧的块相似度
+
+    Args:
+        matrix: 每行一个窗口的特征向量
+        block_size: 每侧参与比较的窗口数
+
+    Returns:
+        长度为 窗口数-1 的余弦相似度数组，第 i 个值对应第 i 和第 i+1 个窗口之间的间隙
+    """
+    n = matrix.shape[0]
+    csum = np.zeros((n + 1, matrix.shape[1]), dtype=np.float32)
+    np.cumsum(matrix, axis=0, out=csum[1:])
+    gaps = np.arange(1, n)
+    left = csum[gaps] - csum[np.maximum(gaps - block_size, 0)]
+    right = csum[np.minimum(gaps + block_size, n)] - csum[gaps]
+    norms = np.linalg.norm(left, axis=1) * np.linalg.norm(right, axis=1)
+    return np.einsum('ij,ij->i', left, right) / np.maximum(norms, 1e-9)
+
+
+def depth_scores(similarities: np.ndarray) -> np.ndarray:
+    """TextTiling 的谷深：向左右两侧爬到各自的局部最高点，两侧高度差之和"""
+    n = len(similarities)
+    depths = np.zeros(n, dtype=np.float32)
+    for i in range(n):
+        left = i
+        while left > 0 and similarities[left - 1] >= similarities[left]:
+            left -= 1
+        right = i
+        while right < n - 1 and similarities[right + 1] >= similarities[right]:
+            right += 1
+        depths[i] = similarities[left] + similarities[right] - 2 * similarities[i]
+    return depths
+
+
+def segment_topics(lines: List[TimedLine], window_seconds: int = 30, block_size: int = 4,
+                   min_topic_seconds: int = 120, ngram: int = 2, dim: int = 4096) -> List[Topic]:
+    """
+    把字幕按话题切分
+
+    Args:
+        lines: (秒数, 文本) 列表
+        window_seconds: 计算相似度的基本窗口时长（秒）
+        block_size: 比较时每侧的窗口数
+        min_topic_seconds: 单个主题的最短时长（秒）
+        ngram: 字符 n-gram 的长度
+        dim: 哈希特征的维度
+
+    Returns:
+        按时间排序的主题列表，至少包含一个主题
+    """
+    if not lines:
+        return []
+    windows = time_windows(lines, window_seconds)
+    end = lines[-1][0]
+    if len(windows) < 3:
+        return [Topic(lines[0][0], end, lines)]
+
+    matrix = _tfidf_matrix([''.join(text for _, text in window) for window in windows], ngram, dim)
+    depths = depth_scores(gap_similarities(matrix, block_size))
+
+    # TextTiling 的阈值：谷深超过 均值 - 标准差/2 才算边界，按谷深从大到小选取并保证最短时长
+    cutoff = depths.mean() - depths.std() / 2
+    starts = [window[0][0] for window in windows]
+    chosen = []
+    for gap in np.argsort(-depths, kind='stable'):
+        if depths[gap] <= cutoff or depths[gap] <= 0:
+            break
+        boundary = starts[gap + 1]
+        edges = [starts[0], end] + [starts[g + 1] for g in chosen]
+        if all(abs(boundary - edge) >= min_topic_seconds for edge in edges):
+            chosen.append(gap)
+
+    topics = []
+    first = 0
+    for gap in sorted(chosen):
+        topic_lines = [line for window in windows[first:gap + 1] for line in window]
+        topics.append(Topic(topic_lines[0][0], starts[gap + 1], topic_lines))
+        first = gap + 1
+    topic_lines = [line for window in windows[first:] for line in window]
+    topics.append(Topic(topic_lines[0][0], end, topic_lines))
+    return topics
@@ -0,0 +1,209 @@
+"""
+main.txt 相关的工具函数
+
+main.txt 每行格式为 “整数秒 字幕内容”，由 multi_from_txt.one_task 生成，
+这里提供解析、token 估算和按时间窗口切分等功能，供 AI 总结使用。
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+# 一行带时间戳的字幕：(秒数, 文本)
+TimedLine = Tuple[int, str]
+
+_line_pattern = re.compile(r'^\s*[-*]?\s*(\d+)\s+(.*\S)\s*$')
+_cjk_pattern = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算文本的 token 数，不依赖分词器
+
+    中日韩字符按每字约 1 个 token 计算，其余字符按每 4 个字符约 1 个 token 计算，
+    对 gpt-3.5 / gpt-4 系列的分词结果是偏保守的估计。
+
+    Args:
+        text: 要估算的文本
+
+    Returns:
+        估算的 token 数
+    """
+    cjk = len(_cjk_pattern.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def parse_timed_lines(content: str) -> List[TimedLine]:
+    """
+    解析 main.txt 格式的文本
+
+    Args:
+        content: 每行以整数秒开头的文本
+
+    Returns:
+        (秒数, 文本) 列表，无法解析的行会被跳过
+    """
+    lines = []
+    for raw in content.splitlines():
+        match = _line_pattern.match(raw)
+        if match:
+            lines.append((int(match.group(1)), match.group(2)))
+    return lines
+
+
+def format_timed_lines(lines: List[TimedLine]) -> str:
+    """将 (秒数, 文本) 列表还原为 main.txt 格式"""
+    return ''.join(f'{second} {text}\n' for second, text in lines)
+
+
+def time_windows(lines: List[TimedLine], window_seconds: int) -> List[List[TimedLine]]:
+    """
+    按固定时长把字幕切分为时间窗口，每个窗口从其第一行的时间开始计算
+
+    Args:
+        lines: (秒数, 文本) 列表
+        window_seconds: 窗口时长（秒）
+
+    Returns:
+        时间窗口列表
+    """
+    windows = []
+    for line in lines:
+        if windows and line[0] - windows[-1][0][0] < window_seconds:
+            windows[-1].append(line)
+        else:
+            windows.append([line])
+    return windows
+
+
+def split_windows(lines: List[TimedLine], token_budget: int) -> List[List[TimedLine]]:
+    """
+    按时间顺序把字幕切分为若干时间窗口，每个窗口的估算 token 数不超过预算
+
+    单行超过预算时独占一个窗口。
+
+    Args:
+        lines: (秒数, 文本) 列表
+        token_budget: 每个窗口的 token 上限
+
+    Returns:
+        时间窗口列表
+    """
+    windows = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        # 每行额外算上时间戳和换行的开销
+        line_tokens = estimate_tokens(line[1]) + 2
+        if current and current_tokens + line_tokens > token_budget:
+            windows.append(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        windows.append(current)
+    return windows
+
+
+# 语气词和口头禅，压缩时直接去掉；“额”“诶”也出现在金额、额度、名额等词中，只去掉前后是标点、空白或行首行尾的
+_filler_pattern = re.compile(
+    r'[嗯呃唔]+'
+    r'|(?:^|(?<=[\s,.?!:;，。？！：；、…~～]))[额诶]+(?:[\s,，、…~～]+|$|(?=[.?!:;。？！：；]))'
+    r'|(?<![a-zA-Z])(?:um+|uh+|erm+)(?![a-zA-Z])',
+    re.IGNORECASE
+)
+# 连续重复的短语（“就是就是”、“对对对”），压缩为一次
+_repeat_pattern = re.compile(r'([\u4e00-\u9fff]{2,4})\1+|([\u4e00-\u9fff])\2{2,}')
+_punc_pattern = re.compile(r'[\s,.?!:;，。？！：；、…~～"“”\'‘’]+')
+
+
+def _strip_fillers(text: str) -> str:
+    text = _filler_pattern.sub('', text)
+    text = _repeat_pattern.sub(lambda m: m.group(1) or m.group(2), text)
+    return text.strip(' ，,。.、')
+
+
+def _normalize(text: str) -> str:
+    return _punc_pattern.sub('', text).lower()
+
+
+def compact_lines(lines: List[TimedLine], bucket_seconds: int, token_budget: int = 0) -> List[TimedLine]:
+    """
+    压缩字幕以减少发送给模型的 token 数
+
+    依次执行：去掉语气词和重复短语、丢弃与上一行重复或被其包含的行、
+    把 bucket_seconds 秒内的相邻行合并为一行（保留第一行的时间戳）。
+    合并后仍超出 token_budget 时，按比例截短每一行，时间戳保持不变，
+    因此输出仍可用于生成跳转链接。
+
+    Args:
+        lines: (秒数, 文本) 列表
+        bucket_seconds: 合并的时间粒度（秒），小于等于0时不合并
+        token_budget: 输出的 token 上限，0 表示不限制
+
+    Returns:
+        压缩后的 (秒数, 文本) 列表
+    """
+    cleaned = []
+    prev_norm = ''
+    for second, text in lines:
+        text = _strip_fillers(text)
+        norm = _normalize(text)
+        if not norm:
+            continue
+        if prev_norm and norm in prev_norm:
+            continue
+        if prev_norm and prev_norm in norm and cleaned and second - cleaned[-1][0] <= bucket_seconds:
+            # 新行是上一行的扩展，用新行替换上一行
+            cleaned[-1] = (cleaned[-1][0], text)
+        else:
+            cleaned.append((second, text))
+        prev_norm = norm
+
+    merged = []
+    for second, text in cleaned:
+        if merged and second - merged[-1][0] < bucket_seconds:
+            merged[-1] = (merged[-1][0], f'{merged[-1][1]}，{text}')
+        else:
+            merged.append((second, text))
+
+    if token_budget > 0:
+        total = sum(estimate_tokens(text) + 2 for _, text in merged)
+        if total > token_budget:
+            # 时间戳和换行的开销不可压缩，只按比例截短文本
+            overhead = 2 * len(merged)
+            ratio = max(token_budget - overhead, 0) / max(total - overhead, 1)
+            merged = [(second, _truncate(text, ratio)) for second, text in merged]
+    return merged
+
+
+def _truncate(text: str, ratio: float) -> str:
+    keep = max(8, int(len(text) * ratio))
+    return text if keep >= len(text) else text[:keep] + '…'
+
+
+_srt_time_pattern = re.compile(r'(\d+):(\d{2}):(\d{2})[,.](\d{3})')
+
+
+def srt_duration(srt_file) -> Optional[float]:
+    """
+    从 srt 文件读取最后一条字幕的结束时间（秒）
+
+    Args:
+        srt_file: srt 文件路径
+
+    Returns:
+        结束时间，文件不存在或无法解析时返回None
+    """
+    try:
+        with open(srt_file, 'rb') as f:
+            # 只需要读取文件末尾
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - 4096))
+            tail = f.read().decode('utf-8', errors='ignore')
+    except OSError:
+        return None
+    times = _srt_time_pattern.findall(tail)
+    if not times:
+        return None
+    h, m, s, ms = (int(x) for x in times[-1])
+    return h * 3600 + m * 60 + s + ms / 1000
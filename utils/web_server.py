@@ -0,0 +1,674 @@
+"""
+结果展示网页
+
+基于 asyncio 的轻量 HTTP 服务，直接读取 downloads 目录下的任务产物：
+    /                           视频列表（分页，?page=2&q=关键词）
+    /api/videos                 视频列表 JSON（分页，?page=&per_page=&q=）
+    /v/<日期>/<文件名>/          总结页面（.final.md 渲染为 HTML，附主题、字幕和音频）
+    /v/<日期>/<文件名>/json      字幕行、主题和总结的 JSON
+    /v/<日期>/<文件名>/srt       SRT 字幕
+    /v/<日期>/<文件名>/vtt       WebVTT 字幕
+    /v/<日期>/<文件名>/audio     音频，支持 Range 请求
+
+渲染结果按产物文件的 mtime 和大小缓存，ETag 取内容哈希，并预先压缩好 gzip 版本；
+目录扫描和渲染都在线程池中进行，事件循环只负责收发数据，音频用 sendfile 发送。
+
+用法:
+    python -m utils.web_server --port 8080
+"""
+
+import asyncio
+import gzip
+import hashlib
+import html
+import json
+import mimetypes
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import typer
+
+from config import WebConfig
+from utils.audio_archive import find_audio
+from utils.common_utils import jump_url
+from utils.playlist import CourseLinks, read_manifest
+from utils.topic_segmenter import segment_topics
+from utils.transcript_utils import parse_timed_lines, srt_duration
+
+# 文件名后缀与产物类型的对应关系，较长的后缀在前
+ARTIFACT_SUFFIXES = [
+    ('.audio_urls.json', 'urls'),
+    ('.parts.json', 'parts'),
+    ('.main.txt', 'main'),
+    ('.final.md', 'summary'),
+    ('.srt', 'srt'),
+    ('.wav', 'audio'),
+    ('.flac', 'audio'),
+    ('.opus', 'audio'),
+    ('.mp3', 'audio'),
+    ('.m4a', 'audio'),
+]
+SKIP_FOLDERS = {'temp-dir', 'llm-cache', 'semantic-index', 'pcm-cache', 'inbox', 'dictation'}
+STATUS_TEXT = {200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 400: 'Bad Request',
+               404: 'Not Found', 405: 'Method Not Allowed', 416: 'Range Not Satisfiable',
+               500: 'Internal Server Error'}
+COMPRESSIBLE = ('text/', 'application/json', 'application/x-subrip')
+
+_title_pattern = re.compile(r'^\d+\.(.*?)(?:_\d{8})?$')
+_range_pattern = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class VideoEntry(NamedTuple):
+    id: str  # “日期目录/文件名”
+    title: str
+    date: str
+    files: Dict[str, str]  # 产物类型 -> 文件路径
+    mtime: float  # 最新产物的修改时间
+
+
+class Rendered(NamedTuple):
+    signature: tuple
+    content_type: str
+    body: bytes
+    gzipped: Optional[bytes]
+    etag: str
+
+
+def get_downloads_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "downloads")
+
+
+def scan_downloads(root: str) -> List[VideoEntry]:
+    """
+    扫描 downloads 下每个日期目录，按文件名前缀把产物归为一个视频
+
+    Returns:
+        至少有 main.txt、final.md 或 srt 之一的视频，按修改时间从新到旧排序
+    """
+    entries = []
+    try:
+        folders = sorted((f for f in os.scandir(root) if f.is_dir() and f.name not in SKIP_FOLDERS),
+                         key=lambda f: f.name)
+    except FileNotFoundError:
+        return entries
+    for folder in folders:
+        videos: Dict[str, Dict[str, str]] = {}
+        mtimes: Dict[str, float] = {}
+        for item in os.scandir(folder.path):
+            if not item.is_file():
+                continue
+            for suffix, kind in ARTIFACT_SUFFIXES:
+                if item.name.endswith(suffix):
+                    stem = item.name[:-len(suffix)]
+                    videos.setdefault(stem, {})[kind] = item.path
+                    mtimes[stem] = max(mtimes.get(stem, 0), item.stat().st_mtime)
+                    break
+        for stem, files in videos.items():
+            if {'main', 'summary', 'srt'} & files.keys():
+                match = _title_pattern.match(stem)
+                title = match.group(1) if match else stem
+                entries.append(VideoEntry(f"{folder.name}/{stem}", title, folder.name, files, mtimes[stem]))
+    entries.sort(key=lambda entry: (-entry.mtime, entry.id))
+    return entries
+
+
+_scheme_pattern = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+
+
+def _link(label: str, target: str) -> str:
+    """只允许 http(s) 和相对地址的链接，其他协议（如 javascript:）只保留链接文字"""
+    target = html.unescape(target)
+    # 浏览器解析协议前会去掉控制字符
+    scheme = _scheme_pattern.match(re.sub(r'[\x00-\x20]', '', target))
+    if scheme and scheme.group(1).lower() not in ('http', 'https'):
+        return label
+    return f'<a href="{html.escape(target)}" target="_blank">{label}</a>'
+
+
+def _inline_markdown(text: str) -> str:
+    text = html.escape(text, quote=False)
+    text = re.sub(r'`([^`]+)`', r'<code>\1</code>', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
+    return re.sub(r'\[([^\]]*)\]\(([^)\s]+)\)', lambda m: _link(m.group(1), m.group(2)), text)
+
+
+def markdown_to_html(markdown: str) -> str:
+    """
+    把总结文档转换为 HTML，只支持总结中用到的语法：标题、表格、列表、代码块、段落、链接、加粗和行内代码
+    """
+    out = []
+    lines = markdown.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        stripped = line.strip()
+        if not stripped:
+            i += 1
+        elif stripped.startswith('```'):
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith('```'):
+                code.append(lines[i])
+                i += 1
+            out.append(f"<pre><code>{html.escape(chr(10).join(code))}</code></pre>")
+            i += 1
+        elif re.match(r'#{1,6}\s', stripped):
+            level = len(stripped) - len(stripped.lstrip('#'))
+            out.append(f"<h{level}>{_inline_markdown(stripped[level:].strip())}</h{level}>")
+            i += 1
+        elif stripped.startswith('|'):
+            rows = []
+            while i < len(lines) and lines[i].strip().startswith('|'):
+                cells = [cell.strip() for cell in lines[i].strip().strip('|').split('|')]
+                if not all(re.fullmatch(r':?-+:?', cell) for cell in cells):
+                    rows.append(cells)
+                i += 1
+            head = ''.join(f"<th>{_inline_markdown(cell)}</th>" for cell in rows[0]) if rows else ''
+            body = ''.join('<tr>' + ''.join(f"<td>{_inline_markdown(cell)}</td>" for cell in row) + '</tr>'
+                           for row in rows[1:])
+            out.append(f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>")
+        elif re.match(r'([-*]|\d+\.)\s', stripped):
+            tag = 'ol' if stripped[0].isdigit() else 'ul'
+            items = []
+            while i < len(lines) and re.match(r'\s*([-*]|\d+\.)\s', lines[i]):
+                items.append(f"<li>{_inline_markdown(re.sub(r'^\s*([-*]|\d+\.)\s+', '', lines[i].strip()))}</li>")
+                i += 1
+            out.append(f"<{tag}>{''.join(items)}</{tag}>")
+        else:
+            paragraph = []
+            while i < len(lines) and lines[i].strip() and not re.match(r'(#{1,6}\s|\||```|[-*]\s|\d+\.\s)',
+                                                                        lines[i].strip()):
+                paragraph.append(_inline_markdown(lines[i].strip()))
+                i += 1
+            out.append(f"<p>{'<br>'.join(paragraph)}</p>")
+    return '\n'.join(out)
+
+
+def srt_to_vtt(srt_text: str) -> str:
+    """SRT 转 WebVTT：加文件头，时间戳的毫秒分隔符由逗号改为点"""
+    body = re.sub(r'(\d{2}:\d{2}:\d{2}),(\d{3})', r'\1.\2', srt_text.replace('\r\n', '\n').lstrip('\ufeff'))
+    return f"WEBVTT\n\n{body}"
+
+
+def _read_text(path: Optional[str]) -> str:
+    if not path:
+        return ''
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def _video_url(entry: VideoEntry) -> str:
+    try:
+        data = json.loads(_read_text(entry.files.get('urls')) or '{}')
+        return data.get('cleaned_url') or data.get('original_url') or ''
+    except ValueError:
+        return ''
+
+
+def video_data(entry: VideoEntry) -> dict:
+    """单个视频的 JSON 数据：元信息、字幕行、本地识别的主题和总结原文"""
+    lines = parse_timed_lines(_read_text(entry.files.get('main')))
+    video_url = _video_url(entry)
+    duration = srt_duration(entry.files['srt']) if 'srt' in entry.files else None
+    duration = duration or (lines[-1][0] if lines else 0)
+    topics = segment_topics(lines) if lines else []
+    # 课程的合并稿使用累计时间，跳转链接换算到对应的分P
+    parts = read_manifest(entry.files['parts'])['parts'] if 'parts' in entry.files else []
+    links = CourseLinks(parts) if parts else None
+    return {
+        'id': entry.id,
+        'title': entry.title,
+        'date': entry.date,
+        'video_url': video_url,
+        'duration': duration,
+        'topics': [{'start': topic.start, 'end': topic.end, 'text': topic.lines[0][1] if topic.lines else '',
+                    'url': links.url(topic.start, video_url) if links else
+                    (jump_url(video_url, topic.start) if video_url else '')} for topic in topics],
+        'parts': [{'index': part['index'], 'title': part['title'], 'start': part.get('offset'),
+                   'url': part['url']} for part in parts],
+        'lines': [{'start': start, 'text': text} for start, text in lines],
+        'summary': _read_text(entry.files.get('summary')),
+        'files': sorted(entry.files),
+    }
+
+
+def _page(title: str, body: str) -> str:
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(title)}</title>
+<style>
+body{{max-width:960px;margin:0 auto;padding:1em;font-family:sans-serif;line-height:1.6}}
+table{{border-collapse:collapse;width:100%}}td,th{{border:1px solid #ddd;padding:4px 8px;text-align:left}}
+a{{color:#0366d6;text-decoration:none}}.meta{{color:#666}}.nav a{{margin-right:1em}}audio{{width:100%}}
+</style></head><body>
+{body}
+</body></html>"""
+
+
+def _format_time(seconds: float) -> str:
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def video_page(entry: VideoEntry) -> str:
+    data = video_data(entry)
+    base = f"/v/{quote(entry.id)}/"
+    parts = [f'<p class="nav"><a href="/">返回列表</a>'
+             + ''.join(f'<a href="{base}{kind}">{kind.upper()}</a>' for kind in ('json', 'srt', 'vtt')
+                       if kind == 'json' or 'srt' in entry.files) + '</p>',
+             f"<h1>{html.escape(entry.title)}</h1>",
+             f'<p class="meta">{html.escape(entry.date)} · {_format_time(data["duration"])}'
+             + (f' · {_link("原视频", data["video_url"])}' if data['video_url'] else '')
+             + '</p>']
+    if 'audio' in entry.files:
+        parts.append(f'<audio controls preload="none" src="{base}audio"></audio>')
+    parts.append(markdown_to_html(data['summary']) if data['summary'] else '<p>暂无总结</p>')
+    if data['parts']:
+        items = ''.join(f'<li>{_link("P" + str(part["index"]), part["url"])} '
+                        + (f'<span class="meta">{_format_time(part["start"])}</span> ' if part['start'] is not None else '')
+                        + f'{html.escape(part["title"])}</li>' for part in data['parts'])
+        parts.append(f"<h2>分P</h2><ol>{items}</ol>")
+    if data['topics']:
+        items = ''.join(f'<li>{_link(_format_time(topic["start"]), topic["url"] or "#")} '
+                        f'{html.escape(topic["text"][:60])}</li>' for topic in data['topics'])
+        parts.append(f"<h2>主题</h2><ol>{items}</ol>")
+    if data['lines']:
+        rows = ''.join(f'<div><span class="meta">{_format_time(line["start"])}</span> {html.escape(line["text"])}</div>'
+                       for line in data['lines'])
+        parts.append(f"<details><summary>字幕（{len(data['lines'])} 行）</summary>{rows}</details>")
+    return _page(entry.title, '\n'.join(parts))
+
+
+def _signature(entry: VideoEntry) -> tuple:
+    """产物文件的 (路径, mtime, 大小)，任何一个变化都会使渲染缓存失效"""
+    signature = []
+    for kind in sorted(entry.files):
+        try:
+            stat = os.stat(entry.files[kind])
+            signature.append((kind, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((kind, None, None))
+    return tuple(signature)
+
+
+class RenderCache:
+    """
+    按总字节数淘汰的 LRU 渲染缓存，同一个键的并发渲染只执行一次
+    """
+
+    def __init__(self, max_bytes: int, gzip_min_bytes: int):
+        self.max_bytes = max_bytes
+        self.gzip_min_bytes = gzip_min_bytes
+        self.entries: 'OrderedDict[tuple, Rendered]' = OrderedDict()
+        self.size = 0
+        self.pending: Dict[tuple, asyncio.Future] = {}
+
+    def _build(self, signature: tuple, content_type: str, text: str) -> Rendered:
+        body = text.encode('utf-8')
+        compress = len(body) >= self.gzip_min_bytes and content_type.startswith(COMPRESSIBLE)
+        gzipped = gzip.compress(body, compresslevel=6, mtime=0) if compress else None
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        return Rendered(signature, content_type, body, gzipped, etag)
+
+    async def get(self, key: tuple, signature: tuple, content_type: str, render) -> Rendered:
+        """
+        Args:
+            key: 缓存键
+            signature: 数据来源的签名，与缓存中的不一致时重新渲染
+            content_type: 响应类型
+            render: 在线程池中执行、返回文本的渲染函数
+        """
+        cached = self.entries.get(key)
+        if cached is not None and cached.signature == signature:
+            self.entries.move_to_end(key)
+            return cached
+        pending = self.pending.get((key, signature))
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[(key, signature)] = future
+        try:
+            rendered = await asyncio.to_thread(lambda: self._build(signature, content_type, render()))
+            future.set_result(rendered)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 避免没有其他等待者时提示异常未被获取
+            raise
+        finally:
+            del self.pending[(key, signature)]
+        self._store(key, rendered)
+        return rendered
+
+    def _store(self, key: tuple, rendered: Rendered):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old.body) + len(old.gzipped or b'')
+        self.entries[key] = rendered
+        self.size += len(rendered.body) + len(rendered.gzipped or b'')
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.body) + len(evicted.gzipped or b'')
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    keep_alive: bool
+
+
+class ResultsServer:
+    """
+    downloads 目录的只读 HTTP 服务
+    """
+
+    def __init__(self, root: Optional[str] = None, host: str = WebConfig.addr, port: int = WebConfig.port):
+        self.root = root or get_downloads_dir()
+        self.host = host
+        self.port = port
+        self.entries: List[VideoEntry] = []
+        self.by_id: Dict[str, VideoEntry] = {}
+        self.version = 0
+        self.cache = RenderCache(WebConfig.render_cache_mb * 1024 * 1024, WebConfig.gzip_min_bytes)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._scanner: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.refresh()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, limit=64 * 1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._scanner = asyncio.create_task(self._scan_loop())
+
+    async def stop(self):
+        if self._scanner:
+            self._scanner.cancel()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"结果页面: http://{self.host}:{self.port}/")
+        await self.server.serve_forever()
+
+    async def refresh(self):
+        """重新扫描目录，变化时更新列表版本号"""
+        entries = await asyncio.to_thread(scan_downloads, self.root)
+        if [(e.id, e.mtime, sorted(e.files)) for e in entries] != \
+                [(e.id, e.mtime, sorted(e.files)) for e in self.entries]:
+            self.entries = entries
+            self.by_id = {entry.id: entry for entry in entries}
+            self.version += 1
+
+    async def _scan_loop(self):
+        while True:
+            try:
+                await self.prerender()
+                await asyncio.sleep(WebConfig.scan_interval)
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"扫描 {self.root} 时出错: {e}")
+                await asyncio.sleep(WebConfig.scan_interval)
+
+    async def prerender(self):
+        """预先渲染最新视频的页面和 JSON，列表页点进去时直接命中缓存"""
+        for entry in self.entries[:WebConfig.prerender_count]:
+            for kind in ('', 'json'):
+                await self._render_video(entry, kind)
+
+    async def _render_video(self, entry: VideoEntry, kind: str) -> Optional[Rendered]:
+        signature = _signature(entry)
+        if kind == '':
+            return await self.cache.get((entry.id, kind), signature, 'text/html; charset=utf-8',
+                                        lambda: video_page(entry))
+        if kind == 'json':
+            return await self.cache.get((entry.id, kind), signature, 'application/json; charset=utf-8',
+                                        lambda: json.dumps(video_data(entry), ensure_ascii=False))
+        if kind in ('srt', 'vtt') and 'srt' in entry.files:
+            if kind == 'srt':
+                return await self.cache.get((entry.id, kind), signature, 'application/x-subrip; charset=utf-8',
+                                            lambda: _read_text(entry.files['srt']))
+            return await self.cache.get((entry.id, kind), signature, 'text/vtt; charset=utf-8',
+                                        lambda: srt_to_vtt(_read_text(entry.files['srt'])))
+        return None
+
+    def _listing(self, query: Dict[str, str]) -> Tuple[List[VideoEntry], int, int, int, str, int]:
+        """按 q 筛选并分页，返回当前页的视频、页码、总页数、每页数量、筛选关键词和筛选后的视频总数"""
+        keyword = query.get('q', '').strip().lower()
+        entries = [e for e in self.entries if keyword in e.title.lower()] if keyword else self.entries
+        try:
+            per_page = min(max(int(query.get('per_page', WebConfig.page_size)), 1), WebConfig.max_page_size)
+            page = max(int(query.get('page', 1)), 1)
+        except ValueError:
+            per_page, page = WebConfig.page_size, 1
+        pages = max((len(entries) + per_page - 1) // per_page, 1)
+        return entries[(page - 1) * per_page:page * per_page], page, pages, per_page, keyword, len(entries)
+
+    def _listing_json(self, query: Dict[str, str]) -> str:
+        entries, page, pages, per_page, keyword, total = self._listing(query)
+        return json.dumps({
+            'page': page, 'pages': pages, 'per_page': per_page, 'total': total, 'q': keyword,
+            'videos': [{'id': e.id, 'title': e.title, 'date': e.date, 'mtime': e.mtime, 'files': sorted(e.files),
+                        'url': f"/v/{quote(e.id)}/"} for e in entries],
+        }, ensure_ascii=False)
+
+    def _listing_page(self, query: Dict[str, str]) -> str:
+        entries, page, pages, per_page, keyword, _ = self._listing(query)
+        rows = ''.join(f'<tr><td>{html.escape(e.date)}</td><td><a href="/v/{quote(e.id)}/">{html.escape(e.title)}</a>'
+                       f'</td><td>{"✓" if "summary" in e.files else ""}</td></tr>' for e in entries)
+        q = f"&q={quote(keyword)}" if keyword else ''
+        nav = ''.join([f'<a href="/?page={page - 1}{q}">上一页</a>' if page > 1 else '',
+                       f'<span>{page} / {pages}</span>',
+                       f' <a href="/?page={page + 1}{q}">下一页</a>' if page < pages else ''])
+        body = f"""<h1>视频总结</h1>
+<form><input name="q" value="{html.escape(keyword)}" placeholder="按标题筛选"> <button>筛选</button></form>
+<table><thead><tr><th>日期</th><th>标题</th><th>总结</th></tr></thead><tbody>{rows}</tbody></table>
+<p class="nav">{nav}</p>"""
+        return _page('视频总结', body)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), WebConfig.keep_alive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                if request is None:
+                    await self._send(writer, 400, b'bad request', 'text/plain; charset=utf-8', keep_alive=False)
+                    break
+                try:
+                    await self._dispatch(request, writer)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    print(f"处理 {request.path} 时出错: {e}")
+                    await self._send(writer, 500, b'internal error', 'text/plain; charset=utf-8',
+                                     keep_alive=False)
+                    break
+                if not request.keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        if len(parts) != 3:
+            return None
+        method, target, version = parts
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return Request(method, unquote(url.path), query, headers, keep_alive)
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter):
+        if request.method not in ('GET', 'HEAD'):
+            await self._send(writer, 405, b'method not allowed', 'text/plain; charset=utf-8', request,
+                             extra={'Allow': 'GET, HEAD'})
+            return
+        path = request.path
+        if path in ('/', '/index.html'):
+            rendered = await self.cache.get(('list', 'html', tuple(sorted(request.query.items()))), (self.version,),
+                                            'text/html; charset=utf-8', lambda: self._listing_page(request.query))
+            await self._send_rendered(writer, rendered, request)
+        elif path == '/api/videos':
+            rendered = await self.cache.get(('list', 'json', tuple(sorted(request.query.items()))), (self.version,),
+                                            'application/json; charset=utf-8',
+                                            lambda: self._listing_json(request.query))
+            await self._send_rendered(writer, rendered, request)
+        elif path.startswith('/v/'):
+            rest = path[len('/v/'):]
+            video_id, _, kind = rest.rpartition('/')
+            entry = self.by_id.get(video_id)
+            if entry is None:
+                # 没有结尾斜杠的页面地址
+                entry, kind = self.by_id.get(rest), ''
+            if entry is None:
+                await self._send(writer, 404, b'not found', 'text/plain; charset=utf-8', request)
+            elif kind == 'audio' and 'audio' in entry.files:
+                # 扫描之后音频可能已被归档（换了扩展名）或按存储预算淘汰
+                audio_file = find_audio(entry.files['audio'])
+                if audio_file is None:
+                    await self._send(writer, 404, b'not found', 'text/plain; charset=utf-8', request)
+                else:
+                    await self._send_file(writer, str(audio_file), request)
+            else:
+                rendered = await self._render_video(entry, kind)
+                if rendered is None:
+                    await self._send(writer, 404, b'not found', 'text/plain; charset=utf-8', request)
+                else:
+                    await self._send_rendered(writer, rendered, request)
+        else:
+            await self._send(writer, 404, b'not found', 'text/plain; charset=utf-8', request)
+
+    @staticmethod
+    def _etag_matches(request: Request, etag: str) -> bool:
+        candidates = request.headers.get('if-none-match', '')
+        return candidates.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in candidates.split(',')]
+
+    @staticmethod
+    def _accepts_gzip(request: Request) -> bool:
+        """按 Accept-Encoding 的各项及其 q 值判断，gzip;q=0 表示不接受；没有单独列出 gzip 时看 *"""
+        accepted = {}
+        for item in request.headers.get('accept-encoding', '').split(','):
+            coding, *params = [part.strip() for part in item.split(';')]
+            quality = 1.0
+            for param in params:
+                name, _, value = param.partition('=')
+                if name.strip().lower() == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if coding:
+                accepted[coding.lower()] = quality
+        return accepted.get('gzip', accepted.get('*', 0.0)) > 0
+
+    async def _send_rendered(self, writer: asyncio.StreamWriter, rendered: Rendered, request: Request):
+        extra = {'ETag': rendered.etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if self._etag_matches(request, rendered.etag):
+            await self._send(writer, 304, b'', None, request, extra=extra)
+            return
+        body = rendered.body
+        if rendered.gzipped is not None and self._accepts_gzip(request):
+            body = rendered.gzipped
+            extra['Content-Encoding'] = 'gzip'
+        await self._send(writer, 200, body, rendered.content_type, request, extra=extra)
+
+    async def _send_file(self, writer: asyncio.StreamWriter, path: str, request: Request):
+        """发送音频文件，支持单段 Range 请求，用 sendfile 避免在 Python 中复制数据"""
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            # 查找之后文件又被归档或淘汰
+            await self._send(writer, 404, b'not found', 'text/plain; charset=utf-8', request)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            extra = {'ETag': etag, 'Accept-Ranges': 'bytes', 'Cache-Control': 'no-cache'}
+            if self._etag_matches(request, etag):
+                await self._send(writer, 304, b'', None, request, extra=extra)
+                return
+
+            status, start, end = 200, 0, size - 1
+            range_header = request.headers.get('range')
+            if_range = request.headers.get('if-range')
+            if range_header and (not if_range or if_range == etag):
+                match = _range_pattern.match(range_header.replace(' ', ''))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    else:
+                        start = max(size - int(match.group(2)), 0)
+                    if start >= size or start > end:
+                        extra['Content-Range'] = f'bytes */{size}'
+                        await self._send(writer, 416, b'', None, request, extra=extra)
+                        return
+                    status = 206
+                    extra['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+            length = end - start + 1 if size else 0
+            await self._send(writer, status, None, content_type, request, extra=extra, length=length)
+            if request.method == 'HEAD' or not length:
+                return
+            await asyncio.get_running_loop().sendfile(writer.transport, f, start, length)
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, body: Optional[bytes], content_type: Optional[str],
+                    request: Optional[Request] = None, extra: Optional[Dict[str, str]] = None,
+                    keep_alive: Optional[bool] = None, length: Optional[int] = None):
+        """
+        写出响应头和响应体
+
+        Args:
+            body: 响应体，为None时只写响应头，由调用方继续发送 length 字节
+            length: body 为None时的 Content-Length
+        """
+        if keep_alive is None:
+            keep_alive = request.keep_alive if request else False
+        headers = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        if content_type:
+            headers.append(f"Content-Type: {content_type}")
+        if status != 304:
+            headers.append(f"Content-Length: {len(body) if body is not None else length}")
+        headers.extend(f"{name}: {value}" for name, value in (extra or {}).items())
+        headers.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        if body and not (request and request.method == 'HEAD'):
+            writer.write(body)
+        await writer.drain()
+
+
+app = typer.Typer()
+
+
+@app.command()
+def serve(root: str = typer.Option(None, help='产物目录，默认为 downloads'),
+          host: str = WebConfig.addr, port: int = WebConfig.port):
+    """启动结果展示网页"""
+    asyncio.run(ResultsServer(root, host, port).serve_forever())
+
+
+if __name__ == '__main__':
+    app()